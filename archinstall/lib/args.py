@@ -16,6 +16,7 @@ from pydantic.dataclasses import dataclass as p_dataclass
 from archinstall.lib.crypt import decrypt
 from archinstall.lib.log import debug, error, logger, warn
 from archinstall.lib.menu.util import get_password
+from archinstall.lib.mirror.mirror_cache import DEFAULT_TTL, MIRROR_CACHE_DIR
 from archinstall.lib.models.application import ApplicationConfiguration, ZramConfiguration
 from archinstall.lib.models.authentication import AuthenticationConfiguration
 from archinstall.lib.models.bootloader import Bootloader, BootloaderConfiguration
@@ -61,6 +62,11 @@ class Arguments:
 	skip_wifi_check: bool = False
 	advanced: bool = False
 	verbose: bool = False
+	parallel_initramfs: bool = False
+	prefetch_packages: bool = False
+	prefetch_mirrors: int = 4
+	mirror_cache: Path = MIRROR_CACHE_DIR
+	mirror_cache_ttl: int = DEFAULT_TTL // 3600
 
 	command: SubCommand | None = None
 
@@ -545,6 +551,36 @@ class ArchConfigHandler:
 			default=False,
 			help='Enabled verbose options',
 		)
+		parser.add_argument(
+			'--parallel-initramfs',
+			action='store_true',
+			default=False,
+			help='Build the initramfs presets of all selected kernels in parallel',
+		)
+		parser.add_argument(
+			'--prefetch-packages',
+			action='store_true',
+			default=False,
+			help='Download the packages while the disks are being prepared',
+		)
+		parser.add_argument(
+			'--prefetch-mirrors',
+			type=int,
+			default=4,
+			help='Number of the fastest mirrors the packages are prefetched from at once, 0 leaves the download to pacman',
+		)
+		parser.add_argument(
+			'--mirror-cache',
+			type=Path,
+			default=MIRROR_CACHE_DIR,
+			help='Directory of the cached mirror status and speed measurements, which are also used with --offline',
+		)
+		parser.add_argument(
+			'--mirror-cache-ttl',
+			type=int,
+			default=DEFAULT_TTL // 3600,
+			help='Hours after which the cached mirror status and speed measurements are refreshed',
+		)
 		return parser
 
 	def _parse_args(self) -> Arguments:
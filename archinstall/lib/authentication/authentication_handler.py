@@ -106,7 +106,7 @@ class AuthenticationHandler:
 
 			while worker.is_alive():
 				if pin_inputted is False:
-					if bytes('enter pin for', 'UTF-8') in worker._trace_log.lower():
+					if bytes('enter pin for', 'UTF-8') in worker.trace_log().lower():
 						worker.write(bytes(getpass.getpass(''), 'UTF-8'))
 						pin_inputted = True
 
@@ -0,0 +1,138 @@
+import base64
+import os
+import shlex
+import subprocess
+import uuid
+from pathlib import Path
+from types import TracebackType
+from typing import Self
+
+from archinstall.lib.command import _cmd_history, locate_binary
+from archinstall.lib.exceptions import SysCallError
+from archinstall.lib.log import debug
+
+
+class ChrootSession:
+	"""
+	A long-lived ``arch-chroot`` into the target.
+
+	The API filesystems (/proc, /sys, /dev, /run) are mounted once when the
+	session starts and every command is handed to a shell running inside the
+	chroot, which reports back the output and exit code of each command.
+	The session is re-entrant, it is only torn down once the outermost
+	context exits.
+	"""
+
+	def __init__(self, target: Path) -> None:
+		self.target = target
+		self._process: subprocess.Popen[bytes] | None = None
+		self._depth = 0
+
+	def __enter__(self) -> Self:
+		if self._depth == 0:
+			self.start()
+
+		self._depth += 1
+		return self
+
+	def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> None:
+		self._depth -= 1
+
+		if self._depth == 0:
+			self.close()
+
+	def is_alive(self) -> bool:
+		return self._process is not None and self._process.poll() is None
+
+	def start(self) -> None:
+		if self.is_alive():
+			return
+
+		cmd = [locate_binary('arch-chroot'), '-S', str(self.target), 'bash', '--noprofile', '--norc']
+		_cmd_history(cmd)
+
+		debug(f'Starting chroot session: {self.target}')
+
+		self._process = subprocess.Popen(
+			cmd,
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			env={**os.environ, 'LC_ALL': 'C'},
+		)
+
+	def close(self) -> None:
+		if self._process is None:
+			return
+
+		debug(f'Closing chroot session: {self.target}')
+
+		if self.is_alive() and self._process.stdin:
+			try:
+				self._process.stdin.write(b'exit\n')
+				self._process.stdin.close()
+			except BrokenPipeError:
+				pass
+
+		try:
+			self._process.wait(timeout=30)
+		except subprocess.TimeoutExpired:
+			debug('Chroot session did not exit in time, terminating it')
+			self._process.terminate()
+			self._process.wait()
+
+		self._process = None
+
+	def run(self, cmd: list[str], input_data: bytes | None = None) -> bytes:
+		"""
+		Runs a command inside the chroot and returns its combined stdout and stderr.
+		A non-zero exit code raises a :py:class:`SysCallError` just like :py:class:`SysCommand`.
+		"""
+		if self._process is None or not self.is_alive() or self._process.stdin is None or self._process.stdout is None:
+			raise SysCallError(f'No active chroot session for {self.target}')
+
+		_cmd_history(cmd)
+
+		script = shlex.join(cmd)
+
+		if input_data is not None:
+			encoded = base64.b64encode(input_data).decode()
+			script = f'printf %s {encoded} | base64 -d | {script}'
+		else:
+			# commands must never consume the command stream of the session shell
+			script = f'{script} < /dev/null'
+
+		# the marker is prefixed with a newline to guarantee that
+		# it's on its own line, even if the output does not end with one
+		marker = f'\n__archinstall_{uuid.uuid4().hex}__:'.encode()
+		line = f'{{ {script} ; }} 2>&1; printf "\\n%s:%d\\n" {shlex.quote(marker[1:-1].decode())} "$?"\n'
+
+		self._process.stdin.write(line.encode())
+		self._process.stdin.flush()
+
+		stdout_fd = self._process.stdout.fileno()
+		buffer = bytearray()
+
+		while True:
+			if (index := buffer.find(marker)) >= 0:
+				end = buffer.find(b'\n', index + len(marker))
+				if end >= 0:
+					break
+
+			chunk = os.read(stdout_fd, 8192)
+			if not chunk:
+				raise SysCallError(f'Chroot session for {self.target} terminated unexpectedly', worker_log=bytes(buffer))
+
+			buffer += chunk
+
+		exit_code = int(buffer[index + len(marker) : end])
+		output = bytes(buffer[:index])
+
+		if exit_code != 0:
+			raise SysCallError(
+				f'{cmd} exited with abnormal exit code [{exit_code}]: {output[-500:].decode(errors="backslashreplace")}',
+				exit_code,
+				worker_log=output,
+			)
+
+		return output
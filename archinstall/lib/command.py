@@ -1,20 +1,116 @@
+import asyncio
 import os
+import pty
 import shlex
+import signal
 import stat
 import subprocess
 import sys
+import tempfile
+import threading
 import time
-from collections.abc import Iterator
-from select import EPOLLHUP, EPOLLIN, epoll
+from array import array
+from collections.abc import Coroutine, Iterator
+from select import EPOLLHUP, EPOLLIN, epoll, select
 from shutil import which
 from types import TracebackType
-from typing import Any, Self, override
+from typing import IO, Any, Self, override
+from weakref import WeakKeyDictionary
 
 from archinstall.lib.exceptions import RequirementError, SysCallError
 from archinstall.lib.log import debug, error, logger
 from archinstall.lib.utils.encoding import clear_vt100_escape_codes
 
 
+class TraceLog:
+	"""
+	Append-only buffer holding the output of a command.
+
+	Appending is amortized O(1) and newline offsets are indexed as the data
+	arrives, so searching and iterating lines only has to look at new output.
+	Once the in-memory window is exceeded, the oldest output is spilled to an
+	anonymous temporary file. All positions are absolute offsets into the log.
+	"""
+
+	def __init__(self, window: int = 16 * 1024 * 1024) -> None:
+		self._window = window
+		self._buffer = bytearray()
+		# absolute position of the first byte held in memory
+		self._offset = 0
+		self._spill: IO[bytes] | None = None
+		self._newlines = array('q')
+
+	def __len__(self) -> int:
+		return self._offset + len(self._buffer)
+
+	def __bytes__(self) -> bytes:
+		return self[0 : len(self)]
+
+	def __getitem__(self, key: slice) -> bytes:
+		start, stop, step = key.indices(len(self))
+
+		if step != 1:
+			raise ValueError('TraceLog only supports contiguous slices')
+
+		if start >= stop:
+			return b''
+
+		if start >= self._offset:
+			return bytes(self._buffer[start - self._offset : stop - self._offset])
+
+		assert self._spill is not None
+
+		self._spill.seek(start)
+		data = self._spill.read(min(stop, self._offset) - start)
+
+		if stop > self._offset:
+			data += self._buffer[: stop - self._offset]
+
+		return data
+
+	def append(self, data: bytes) -> None:
+		base = len(self)
+
+		index = data.find(b'\n')
+		while index >= 0:
+			self._newlines.append(base + index)
+			index = data.find(b'\n', index + 1)
+
+		self._buffer += data
+
+		if len(self._buffer) > self._window:
+			self._spill_to_disk()
+
+	def _spill_to_disk(self) -> None:
+		if self._spill is None:
+			self._spill = tempfile.TemporaryFile()
+
+		cut = len(self._buffer) - self._window // 2
+
+		self._spill.seek(0, os.SEEK_END)
+		self._spill.write(self._buffer[:cut])
+		del self._buffer[:cut]
+
+		self._offset += cut
+
+	def find(self, key: bytes, start: int = 0) -> int:
+		if start >= self._offset:
+			index = self._buffer.find(key, start - self._offset)
+			return index + self._offset if index >= 0 else -1
+
+		index = self[start:].find(key)
+		return index + start if index >= 0 else -1
+
+	def last_newline(self) -> int:
+		return self._newlines[-1] if self._newlines else -1
+
+	def line_count(self) -> int:
+		return len(self._newlines)
+
+	def decode(self, encoding: str = 'UTF-8', errors: str = 'strict') -> str:
+		return bytes(self).decode(encoding, errors=errors)
+
+
 class SysCommandWorker:
 	def __init__(
 		self,
@@ -40,10 +136,15 @@ class SysCommandWorker:
 		self.working_directory = working_directory
 
 		self.exit_code: int | None = None
-		self._trace_log = b''
+		self._trace_log = TraceLog()
 		self._trace_log_pos = 0
+		# per search key, the position up to which the log was already searched
+		self._searched: dict[bytes, int] = {}
 		self.poll_object = epoll()
 		self.child_fd: int | None = None
+		# process file descriptor of the child, it becomes readable once the child exits
+		self.pid_fd: int | None = None
+		self._wait_status: int | None = None
 		self.started = False
 		self.ended = False
 		self.remove_vt100_escape_codes_from_lines: bool = remove_vt100_escape_codes_from_lines
@@ -55,35 +156,49 @@ class SysCommandWorker:
 		"""
 		assert isinstance(key, bytes)
 
-		index = self._trace_log.find(key, self._trace_log_pos)
+		# skip over output that has already been searched for this key
+		start = max(self._trace_log_pos, self._searched.get(key, 0))
+
+		index = self._trace_log.find(key, start)
 		if index >= 0:
-			self._trace_log_pos += index + len(key)
+			self._trace_log_pos = index + len(key)
+			self._searched.pop(key, None)
 			return True
 
+		self._searched[key] = max(start, len(self._trace_log) - len(key) + 1)
 		return False
 
 	def __iter__(self, *args: str, **kwargs: dict[str, Any]) -> Iterator[bytes]:
-		last_line = self._trace_log.rfind(b'\n')
+		# only complete lines are returned, unless the process
+		# has ended in which case the remaining output is a line as well
+		if self.ended:
+			last_line = len(self._trace_log)
+		else:
+			last_line = self._trace_log.last_newline()
+
+		if last_line <= self._trace_log_pos:
+			return
+
 		lines = filter(None, self._trace_log[self._trace_log_pos : last_line].splitlines())
+		self._trace_log_pos = last_line
+
 		for line in lines:
 			if self.remove_vt100_escape_codes_from_lines:
 				line = clear_vt100_escape_codes(line)
 
 			yield line + b'\n'
 
-		self._trace_log_pos = last_line
-
 	@override
 	def __repr__(self) -> str:
 		self.make_sure_we_are_executing()
-		return str(self._trace_log)
+		return str(bytes(self._trace_log))
 
 	@override
 	def __str__(self) -> str:
 		try:
 			return self._trace_log.decode('utf-8')
 		except UnicodeDecodeError:
-			return str(self._trace_log)
+			return str(bytes(self._trace_log))
 
 	def __enter__(self) -> Self:
 		return self
@@ -98,6 +213,8 @@ class SysCommandWorker:
 			except Exception:
 				pass
 
+		self._close_pid_fd()
+
 		if self.peek_output:
 			# To make sure any peaked output didn't leave us hanging
 			# on the same line we were on.
@@ -111,7 +228,7 @@ class SysCommandWorker:
 			raise SysCallError(
 				f'{self.cmd} exited with abnormal exit code [{self.exit_code}]: {str(self)[-500:]}',
 				self.exit_code,
-				worker_log=self._trace_log,
+				worker_log=bytes(self._trace_log),
 			)
 
 	def is_alive(self) -> bool:
@@ -145,6 +262,7 @@ class SysCommandWorker:
 		self.make_sure_we_are_executing()
 		# Safety check to ensure 0 < pos < len(tracelog)
 		self._trace_log_pos = min(max(0, pos), len(self._trace_log))
+		self._searched.clear()
 
 	def peak(self, output: str | bytes) -> bool:
 		if self.peek_output:
@@ -161,36 +279,94 @@ class SysCommandWorker:
 
 		return True
 
-	def poll(self) -> None:
+	def poll(self, timeout: float | None = 0.1) -> None:
+		"""
+		Waits up to ``timeout`` seconds for output or for the child to exit.
+		Both the pty and the process file descriptor are registered in the
+		same epoll object, so a ``timeout`` of ``None`` blocks until there
+		is something to handle without ever busy-waiting on the child.
+		"""
 		self.make_sure_we_are_executing()
 
-		if self.child_fd:
-			got_output = False
-			for _fileno, _event in self.poll_object.poll(0.1):
-				try:
-					output = os.read(self.child_fd, 8192)
-					got_output = True
-					self.peak(output)
-					self._trace_log += output
-				except OSError:
-					self.ended = True
-					break
-
-			if self.ended or (not got_output and not _pid_exists(self.pid)):
-				self.ended = True
-				try:
-					wait_status = os.waitpid(self.pid, 0)[1]
-					self.exit_code = os.waitstatus_to_exitcode(wait_status)
-				except ChildProcessError:
-					try:
-						wait_status = os.waitpid(self.child_fd, 0)[1]
-						self.exit_code = os.waitstatus_to_exitcode(wait_status)
-					except ChildProcessError:
-						self.exit_code = 1
+		if not self.child_fd or self.ended:
+			return
 
-	def execute(self) -> bool:
-		import pty
+		if timeout is None and self.pid_fd is None:
+			# without a process file descriptor the exit can't be waited for on the epoll object
+			timeout = 0.1
+
+		exited = False
+
+		for fileno, _event in self.poll_object.poll(timeout):
+			if fileno == self.pid_fd:
+				exited = True
+			elif not self._read_output():
+				exited = True
+
+		if self.pid_fd is None and not exited:
+			# no process file descriptor available, fall back to checking without blocking
+			pid, wait_status = os.waitpid(self.pid, os.WNOHANG)
+			if pid:
+				self._wait_status = wait_status
+				exited = True
+
+		if exited:
+			self._reap()
 
+	def _read_output(self) -> bool:
+		"""
+		Reads a single chunk of output from the pty.
+		Returns False once the pty has been closed by the child.
+		"""
+		assert self.child_fd is not None
+
+		try:
+			output = os.read(self.child_fd, 8192)
+		except OSError:
+			return False
+
+		if not output:
+			return False
+
+		self.peak(output)
+		self._trace_log.append(output)
+		return True
+
+	def _drain_output(self) -> None:
+		assert self.child_fd is not None
+
+		while any(fileno == self.child_fd for fileno, _event in self.poll_object.poll(0)):
+			if not self._read_output():
+				break
+
+	def _reap(self) -> None:
+		# the child may have exited with output still pending in the pty
+		self._drain_output()
+		self.ended = True
+
+		try:
+			if self._wait_status is None:
+				self._wait_status = os.waitpid(self.pid, 0)[1]
+
+			self.exit_code = os.waitstatus_to_exitcode(self._wait_status)
+		except ChildProcessError:
+			self.exit_code = 1
+
+		self._close_pid_fd()
+
+	def _close_pid_fd(self) -> None:
+		if self.pid_fd is None:
+			return
+
+		try:
+			self.poll_object.unregister(self.pid_fd)
+			os.close(self.pid_fd)
+		except OSError:
+			pass
+
+		self.pid_fd = None
+
+	def execute(self) -> bool:
 		if (old_dir := os.getcwd()) != self.working_directory:
 			os.chdir(str(self.working_directory))
 
@@ -218,11 +394,287 @@ class SysCommandWorker:
 		self.started = True
 		self.poll_object.register(self.child_fd, EPOLLIN | EPOLLHUP)
 
+		try:
+			self.pid_fd = os.pidfd_open(self.pid)
+			self.poll_object.register(self.pid_fd, EPOLLIN)
+		except OSError as err:
+			debug(f'pidfd_open() is not available, falling back to polling the child: {err}')
+			self.pid_fd = None
+
 		return True
 
 	def decode(self, encoding: str = 'UTF-8') -> str:
 		return self._trace_log.decode(encoding)
 
+	def trace_log(self) -> bytes:
+		return bytes(self._trace_log)
+
+
+class AsyncSysCommand:
+	"""
+	Runs a command to completion on an asyncio event loop.
+
+	Just like :py:class:`SysCommandWorker` the command is attached to a pty,
+	but the output is read through the event loop, so several commands can
+	run side by side. Independent probes are best run with
+	:py:func:`run_probes`, which limits how many of them run at once.
+
+		lspci, virt = await asyncio.gather(
+			AsyncSysCommand('lspci').run(),
+			AsyncSysCommand('systemd-detect-virt').run(),
+		)
+
+	A non-zero exit code raises a :py:class:`SysCallError`, as does exceeding
+	``timeout``. If the awaiting task is cancelled the command is killed.
+	"""
+
+	def __init__(
+		self,
+		cmd: str | list[str],
+		peek_output: bool | None = False,
+		environment_vars: dict[str, str] | None = None,
+		working_directory: str = './',
+		remove_vt100_escape_codes_from_lines: bool = True,
+		timeout: float | None = None,
+	):
+		if isinstance(cmd, str):
+			cmd = shlex.split(cmd)
+
+		if cmd and not cmd[0].startswith(('/', './')):
+			cmd[0] = locate_binary(cmd[0])
+
+		self.cmd = cmd
+		self.peek_output = peek_output
+		# define the standard locale for command outputs. For now the C ascii one. Can be overridden
+		self.environment_vars = {'LC_ALL': 'C'}
+		if environment_vars:
+			self.environment_vars.update(environment_vars)
+
+		self.working_directory = working_directory
+		self.remove_vt100_escape_codes_from_lines = remove_vt100_escape_codes_from_lines
+		self.timeout = timeout
+
+		self.exit_code: int | None = None
+		self._trace_log = TraceLog()
+
+	def __iter__(self) -> Iterator[bytes]:
+		for line in bytes(self._trace_log).splitlines():
+			if not line:
+				continue
+
+			if self.remove_vt100_escape_codes_from_lines:
+				line = clear_vt100_escape_codes(line)
+
+			yield line + b'\n'
+
+	@override
+	def __str__(self) -> str:
+		try:
+			return self._trace_log.decode('utf-8')
+		except UnicodeDecodeError:
+			return str(bytes(self._trace_log))
+
+	def _on_output(self, output: bytes) -> None:
+		if self.peek_output:
+			try:
+				text = output.decode('UTF-8')
+			except UnicodeDecodeError:
+				pass
+			else:
+				_cmd_output(text)
+				sys.stdout.write(text)
+				sys.stdout.flush()
+
+		self._trace_log.append(output)
+
+	def _drain_output(self, master_fd: int) -> None:
+		# the child may have exited with output still pending in the pty
+		while select([master_fd], [], [], 0)[0]:
+			try:
+				output = os.read(master_fd, 8192)
+			except OSError:
+				break
+
+			if not output:
+				break
+
+			self._on_output(output)
+
+	async def run(self) -> Self:
+		await self._execute()
+
+		if self.exit_code != 0:
+			raise SysCallError(
+				f'{self.cmd} exited with abnormal exit code [{self.exit_code}]: {str(self)[-500:]}',
+				self.exit_code,
+				worker_log=bytes(self._trace_log),
+			)
+
+		return self
+
+	async def _execute(self) -> None:
+		loop = asyncio.get_running_loop()
+		master_fd, slave_fd = pty.openpty()
+
+		_cmd_history(self.cmd)
+
+		try:
+			# a new session detaches the command from the controlling terminal of
+			# the installer, so nothing can accidentally read from the real console.
+			# setsid makes the pty (its stdin) the controlling terminal instead, like
+			# pty.fork() does. A preexec_fn could deadlock with the other threads.
+			process = await asyncio.create_subprocess_exec(
+				locate_binary('setsid'),
+				'--ctty',
+				'--wait',
+				*self.cmd,
+				stdin=slave_fd,
+				stdout=slave_fd,
+				stderr=slave_fd,
+				cwd=self.working_directory,
+				env={**os.environ, **self.environment_vars},
+			)
+		except BaseException:
+			os.close(master_fd)
+			raise
+		finally:
+			os.close(slave_fd)
+
+		def _read() -> None:
+			try:
+				output = os.read(master_fd, 8192)
+			except OSError:
+				output = b''
+
+			if output:
+				self._on_output(output)
+			else:
+				# the pty got closed by the child
+				loop.remove_reader(master_fd)
+
+		loop.add_reader(master_fd, _read)
+
+		try:
+			async with asyncio.timeout(self.timeout):
+				self.exit_code = await process.wait()
+		except TimeoutError:
+			raise SysCallError(
+				f'{self.cmd} did not finish within {self.timeout} seconds: {str(self)[-500:]}',
+				worker_log=bytes(self._trace_log),
+			)
+		finally:
+			if process.returncode is None:
+				# timed out or the awaiting task got cancelled
+				try:
+					os.killpg(process.pid, signal.SIGKILL)
+				except ProcessLookupError:
+					# setsid didn't start the session yet
+					process.kill()
+
+				await asyncio.shield(process.wait())
+
+			loop.remove_reader(master_fd)
+			self._drain_output(master_fd)
+			os.close(master_fd)
+
+	def decode(self, encoding: str = 'UTF-8', errors: str = 'strict') -> str:
+		return self._trace_log.decode(encoding, errors=errors)
+
+	def trace_log(self) -> bytes:
+		return bytes(self._trace_log)
+
+
+class _CommandLimiter:
+	"""
+	Hands out one semaphore per event loop, as asyncio primitives
+	can't be shared between loops.
+	"""
+
+	def __init__(self, limit: int) -> None:
+		self.limit = limit
+		self._semaphores: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = WeakKeyDictionary()
+
+	def semaphore(self) -> asyncio.Semaphore:
+		loop = asyncio.get_running_loop()
+
+		if (semaphore := self._semaphores.get(loop)) is None:
+			semaphore = asyncio.Semaphore(self.limit)
+			self._semaphores[loop] = semaphore
+
+		return semaphore
+
+
+# the probes mostly wait on the system, not on the CPU
+_command_limiter = _CommandLimiter(max(4, os.cpu_count() or 1))
+
+
+def set_command_concurrency(limit: int) -> None:
+	"""
+	Sets how many probes :py:func:`run_probes` runs at the same time per event loop.
+	Only applies to event loops that haven't run any probe yet.
+	"""
+	if limit < 1:
+		raise ValueError('The command concurrency has to be at least 1')
+
+	_command_limiter.limit = limit
+
+
+class _CommandLoop:
+	"""
+	Event loop in a daemon thread which runs the commands of the blocking API.
+	This works the same whether or not the calling thread runs an event loop
+	itself, which is the case for the TUI.
+	"""
+
+	def __init__(self) -> None:
+		self._loop: asyncio.AbstractEventLoop | None = None
+		self._lock = threading.Lock()
+
+	def _event_loop(self) -> asyncio.AbstractEventLoop:
+		with self._lock:
+			if self._loop is None:
+				self._loop = asyncio.new_event_loop()
+				threading.Thread(target=self._loop.run_forever, name='archinstall-commands', daemon=True).start()
+
+			return self._loop
+
+	def run[T](self, coro: Coroutine[Any, Any, T]) -> T:
+		future = asyncio.run_coroutine_threadsafe(coro, self._event_loop())
+
+		try:
+			return future.result()
+		except BaseException:
+			# e.g. a KeyboardInterrupt while waiting, make sure the command gets killed
+			future.cancel()
+			raise
+
+
+_command_loop = _CommandLoop()
+
+
+async def _run_probe(command: AsyncSysCommand) -> AsyncSysCommand:
+	async with _command_limiter.semaphore():
+		return await command.run()
+
+
+def run_probes(commands: list[AsyncSysCommand]) -> list[AsyncSysCommand | SysCallError]:
+	"""
+	Runs independent probes side by side from blocking code and returns them
+	in the same order, a probe that failed as its error. At most as many run
+	at the same time as set with :py:func:`set_command_concurrency`.
+	"""
+
+	async def _gather() -> list[AsyncSysCommand | SysCallError]:
+		results = await asyncio.gather(*(_run_probe(command) for command in commands), return_exceptions=True)
+
+		for result in results:
+			if not isinstance(result, (AsyncSysCommand, SysCallError)):
+				raise result
+
+		return results  # type: ignore[return-value]
+
+	return _command_loop.run(_gather())
+
 
 class SysCommand:
 	def __init__(
@@ -232,17 +684,19 @@ class SysCommand:
 		environment_vars: dict[str, str] | None = None,
 		working_directory: str = './',
 		remove_vt100_escape_codes_from_lines: bool = True,
+		timeout: float | None = None,
 	):
 		self.cmd = cmd
 		self.peek_output = peek_output
 		self.environment_vars = environment_vars
 		self.working_directory = working_directory
 		self.remove_vt100_escape_codes_from_lines = remove_vt100_escape_codes_from_lines
+		self.timeout = timeout
 
-		self.session: SysCommandWorker | None = None
+		self.session: AsyncSysCommand | None = None
 		self.create_session()
 
-	def __enter__(self) -> SysCommandWorker | None:
+	def __enter__(self) -> AsyncSysCommand | None:
 		return self.session
 
 	def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> None:
@@ -273,28 +727,28 @@ class SysCommand:
 
 	def create_session(self) -> bool:
 		"""
-		Initiates a :ref:`SysCommandWorker` session in this class ``.session``.
-		It then proceeds to poll the process until it ends, after which it also
-		clears any printed output if ``.peek_output=True``.
+		Runs the command as an :ref:`AsyncSysCommand` in this class ``.session``
+		and blocks until it ends, after which it also clears any printed output
+		if ``.peek_output=True``.
 		"""
 		if self.session:
 			return True
 
-		with SysCommandWorker(
+		self.session = AsyncSysCommand(
 			self.cmd,
 			peek_output=self.peek_output,
 			environment_vars=self.environment_vars,
 			remove_vt100_escape_codes_from_lines=self.remove_vt100_escape_codes_from_lines,
 			working_directory=self.working_directory,
-		) as session:
-			self.session = session
-
-			while not self.session.ended:
-				self.session.poll()
+			timeout=self.timeout,
+		)
 
-		if self.peek_output:
-			sys.stdout.write('\n')
-			sys.stdout.flush()
+		try:
+			_command_loop.run(self.session.run())
+		finally:
+			if self.peek_output:
+				sys.stdout.write('\n')
+				sys.stdout.flush()
 
 		return True
 
@@ -312,10 +766,12 @@ class SysCommand:
 		if not self.session:
 			raise ValueError('No session available')
 
+		output = bytes(self.session._trace_log)
+
 		if remove_cr:
-			return self.session._trace_log.replace(b'\r\n', b'\n')
+			return output.replace(b'\r\n', b'\n')
 
-		return self.session._trace_log
+		return output
 
 	@property
 	def exit_code(self) -> int | None:
@@ -327,7 +783,7 @@ class SysCommand:
 	@property
 	def trace_log(self) -> bytes | None:
 		if self.session:
-			return self.session._trace_log
+			return bytes(self.session._trace_log)
 		return None
 
 
@@ -352,13 +808,6 @@ def locate_binary(name: str) -> str:
 	raise RequirementError(f'Binary {name} does not exist.')
 
 
-def _pid_exists(pid: int) -> bool:
-	try:
-		return any(subprocess.check_output(['ps', '--no-headers', '-o', 'pid', '-p', str(pid)]).strip())
-	except subprocess.CalledProcessError:
-		return False
-
-
 def _cmd_history(cmd: list[str]) -> None:
 	content = f'{time.time()} {cmd}\n'
 	_append_log('cmd_history.txt', content)
@@ -0,0 +1,450 @@
+import bisect
+import fcntl
+import os
+import struct
+import threading
+import uuid
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from archinstall.lib.exceptions import DiskError
+from archinstall.lib.log import debug
+
+_SUPERBLOCK_OFFSET = 0x10000
+_SUPERBLOCK_SIZE = 4096
+_SUPERBLOCK_MAGIC = b'_BHRfS_M'
+
+# struct btrfs_super_block up to the log root level
+_SUPERBLOCK = struct.Struct('<32s16sQQ8sQQQQQQQQQIIIIIQQQQHBBB')
+_SUPERBLOCK_DEVID_OFFSET = 0xC9
+_SUPERBLOCK_METADATA_UUID_OFFSET = 0x23B
+_SUPERBLOCK_SYS_CHUNK_ARRAY_OFFSET = 0x32B
+_INCOMPAT_METADATA_UUID = 1 << 10
+
+# struct btrfs_header, struct btrfs_disk_key, struct btrfs_item and struct btrfs_key_ptr
+_HEADER = struct.Struct('<32s16sQQ16sQQIB')
+_KEY = struct.Struct('<QBQ')
+_ITEM = struct.Struct('<QBQII')
+_KEY_PTR = struct.Struct('<QBQQQ')
+
+# struct btrfs_chunk and struct btrfs_stripe
+_CHUNK = struct.Struct('<QQQQIIIHH')
+_STRIPE = struct.Struct('<QQ16s')
+
+# struct btrfs_root_ref, followed by the name
+_ROOT_REF = struct.Struct('<QQH')
+# struct btrfs_inode_ref, followed by the name
+_INODE_REF = struct.Struct('<QH')
+# offset of the tree root address in struct btrfs_root_item
+_ROOT_ITEM_BYTENR = struct.Struct('<Q')
+_ROOT_ITEM_BYTENR_OFFSET = 176
+
+_ROOT_TREE_OBJECTID = 1
+_FS_TREE_OBJECTID = 5
+_FIRST_FREE_OBJECTID = 256
+_LAST_FREE_OBJECTID = 2**64 - 256
+_FIRST_CHUNK_TREE_OBJECTID = 256
+
+_INODE_REF_KEY = 12
+_ROOT_ITEM_KEY = 132
+_ROOT_BACKREF_KEY = 144
+_CHUNK_ITEM_KEY = 228
+
+# block group profiles which spread the data over several devices
+_STRIPED_PROFILES = (1 << 3) | (1 << 6) | (1 << 7) | (1 << 8)
+
+# BTRFS_IOC_TREE_SEARCH and BTRFS_IOC_INO_LOOKUP, both take a 4 KiB argument
+_IOC_TREE_SEARCH = 0xD0009411
+_IOC_INO_LOOKUP = 0xD0009412
+_SEARCH_KEY = struct.Struct('<QQQQQQQIIIIQQQQ')
+_SEARCH_HEADER = struct.Struct('<QQQII')
+_INO_LOOKUP = struct.Struct('<QQ')
+_IOC_ARGS_SIZE = 4096
+
+_Key = tuple[int, int, int]
+
+
+@dataclass
+class BtrfsSuperblock:
+	fsid: uuid.UUID
+	metadata_uuid: uuid.UUID
+	generation: int
+	root: int
+	chunk_root: int
+	nodesize: int
+	num_devices: int
+	devid: int
+	sys_chunk_array: bytes
+
+
+@dataclass
+class BtrfsSubvolume:
+	id: int
+	parent_id: int
+	# relative to the top level subvolume, as shown by "btrfs subvolume list"
+	path: Path
+
+
+def read_superblock(dev_path: Path) -> BtrfsSuperblock:
+	try:
+		fd = os.open(dev_path, os.O_RDONLY | os.O_CLOEXEC)
+	except OSError as err:
+		raise DiskError(f'Unable to open {dev_path}: {err}')
+
+	try:
+		data = os.pread(fd, _SUPERBLOCK_SIZE, _SUPERBLOCK_OFFSET)
+	finally:
+		os.close(fd)
+
+	if len(data) < _SUPERBLOCK_SIZE:
+		raise DiskError(f'No btrfs superblock found on {dev_path}')
+
+	fields = _SUPERBLOCK.unpack_from(data)
+	magic = fields[4]
+
+	if magic != _SUPERBLOCK_MAGIC:
+		raise DiskError(f'No btrfs superblock found on {dev_path}')
+
+	fsid = uuid.UUID(bytes=fields[1])
+	incompat_flags = fields[22]
+	sys_chunk_array_size = fields[18]
+
+	if incompat_flags & _INCOMPAT_METADATA_UUID:
+		metadata_uuid = uuid.UUID(bytes=data[_SUPERBLOCK_METADATA_UUID_OFFSET : _SUPERBLOCK_METADATA_UUID_OFFSET + 16])
+	else:
+		metadata_uuid = fsid
+
+	return BtrfsSuperblock(
+		fsid=fsid,
+		metadata_uuid=metadata_uuid,
+		generation=fields[5],
+		root=fields[6],
+		chunk_root=fields[7],
+		nodesize=fields[15],
+		num_devices=fields[13],
+		devid=struct.unpack_from('<Q', data, _SUPERBLOCK_DEVID_OFFSET)[0],
+		sys_chunk_array=data[_SUPERBLOCK_SYS_CHUNK_ARRAY_OFFSET : _SUPERBLOCK_SYS_CHUNK_ARRAY_OFFSET + sys_chunk_array_size],
+	)
+
+
+def _subvolume_paths(
+	backrefs: dict[int, tuple[int, int, str]],
+	dir_path: Callable[[int, int], str],
+) -> list[BtrfsSubvolume]:
+	"""
+	Builds the path of every subvolume from the references to their
+	parents, the name and the directory within the parent they are in
+	"""
+	paths: dict[int, str] = {_FS_TREE_OBJECTID: ''}
+
+	def _path(subvol_id: int, depth: int = 0) -> str | None:
+		if subvol_id in paths:
+			return paths[subvol_id]
+
+		if subvol_id not in backrefs or depth > len(backrefs):
+			return None
+
+		parent_id, dirid, name = backrefs[subvol_id]
+
+		if (parent_path := _path(parent_id, depth + 1)) is None:
+			return None
+
+		parts = [parent_path, dir_path(parent_id, dirid).strip('/'), name]
+		paths[subvol_id] = '/'.join(part for part in parts if part)
+
+		return paths[subvol_id]
+
+	subvolumes = []
+
+	for subvol_id, (parent_id, _, _) in sorted(backrefs.items()):
+		if (path := _path(subvol_id)) is not None:
+			subvolumes.append(BtrfsSubvolume(subvol_id, parent_id, Path(path)))
+
+	return subvolumes
+
+
+class _BtrfsDeviceReader:
+	"""
+	Reads the trees of a btrfs filesystem directly from an unmounted device.
+	Only filesystems on a single device are supported, which covers every
+	block group profile but the striped ones.
+	"""
+
+	def __init__(self, fd: int, superblock: BtrfsSuperblock) -> None:
+		self._fd = fd
+		self._superblock = superblock
+		self._chunks: list[tuple[int, int, int]] = []
+
+		self._load_chunks()
+
+	def _add_chunk(self, logical: int, data: bytes, offset: int = 0) -> int:
+		length, _owner, _stripe_len, chunk_type, _, _, _, num_stripes, _ = _CHUNK.unpack_from(data, offset)
+
+		if chunk_type & _STRIPED_PROFILES:
+			raise DiskError('Striped btrfs block groups are not supported')
+
+		stripes = [_STRIPE.unpack_from(data, offset + _CHUNK.size + i * _STRIPE.size) for i in range(num_stripes)]
+		stripe = next((s for s in stripes if s[0] == self._superblock.devid), None)
+
+		if stripe is None:
+			raise DiskError(f'Btrfs chunk at {logical} is not stored on this device')
+
+		bisect.insort(self._chunks, (logical, length, stripe[1]))
+
+		return _CHUNK.size + num_stripes * _STRIPE.size
+
+	def _load_chunks(self) -> None:
+		# the chunks holding the chunk tree itself are in the superblock
+		sys_chunk_array = self._superblock.sys_chunk_array
+		pos = 0
+
+		while pos + _KEY.size <= len(sys_chunk_array):
+			_, _, logical = _KEY.unpack_from(sys_chunk_array, pos)
+			pos += _KEY.size
+			pos += self._add_chunk(logical, sys_chunk_array, pos)
+
+		chunk_items = self.items(self._superblock.chunk_root, (_FIRST_CHUNK_TREE_OBJECTID, _CHUNK_ITEM_KEY, 0))
+		system_chunks = {chunk[0] for chunk in self._chunks}
+
+		for (objectid, key_type, logical), data in chunk_items:
+			if objectid != _FIRST_CHUNK_TREE_OBJECTID:
+				break
+
+			if key_type == _CHUNK_ITEM_KEY and logical not in system_chunks:
+				self._add_chunk(logical, data)
+
+	def _physical(self, logical: int) -> int:
+		index = bisect.bisect_right(self._chunks, (logical, 2**64, 2**64)) - 1
+
+		if index >= 0:
+			start, length, physical = self._chunks[index]
+
+			if start <= logical < start + length:
+				return physical + logical - start
+
+		raise DiskError(f'Btrfs logical address {logical} is not mapped')
+
+	def _read_node(self, logical: int) -> bytes:
+		nodesize = self._superblock.nodesize
+		node = os.pread(self._fd, nodesize, self._physical(logical))
+
+		if len(node) < nodesize:
+			raise DiskError(f'Short read of btrfs node at {logical}')
+
+		header = _HEADER.unpack_from(node)
+
+		if header[2] != logical or uuid.UUID(bytes=header[1]) != self._superblock.metadata_uuid:
+			raise DiskError(f'Invalid btrfs node at {logical}')
+
+		return node
+
+	def items(self, logical: int, min_key: _Key) -> Iterator[tuple[_Key, bytes]]:
+		"""
+		Yields the items of the tree rooted at ``logical`` in key order,
+		starting with the first item that isn't smaller than ``min_key``
+		"""
+		node = self._read_node(logical)
+		*_, nritems, level = _HEADER.unpack_from(node)
+
+		if level == 0:
+			for i in range(nritems):
+				objectid, key_type, offset, data_offset, data_size = _ITEM.unpack_from(node, _HEADER.size + i * _ITEM.size)
+				key = (objectid, key_type, offset)
+
+				if key >= min_key:
+					start = _HEADER.size + data_offset
+					yield key, node[start : start + data_size]
+		else:
+			ptrs = [_KEY_PTR.unpack_from(node, _HEADER.size + i * _KEY_PTR.size) for i in range(nritems)]
+			keys = [ptr[:3] for ptr in ptrs]
+			# the last child that may contain the key, all following ones follow in order
+			start = max(bisect.bisect_right(keys, min_key) - 1, 0)
+
+			for ptr in ptrs[start:]:
+				yield from self.items(ptr[3], min_key)
+
+	def _inode_path(self, tree_root: int, dirid: int) -> str:
+		parts = []
+		inode = dirid
+
+		while inode != _FIRST_FREE_OBJECTID:
+			ref = next(self.items(tree_root, (inode, _INODE_REF_KEY, 0)), None)
+
+			if ref is None or ref[0][:2] != (inode, _INODE_REF_KEY) or len(parts) > 4096:
+				raise DiskError(f'Unable to resolve the path of btrfs inode {dirid}')
+
+			(_, _, parent_inode), data = ref
+			_, name_len = _INODE_REF.unpack_from(data)
+			parts.append(data[_INODE_REF.size : _INODE_REF.size + name_len].decode(errors='replace'))
+			inode = parent_inode
+
+		return '/'.join(reversed(parts))
+
+	def subvolumes(self) -> list[BtrfsSubvolume]:
+		tree_roots: dict[int, int] = {}
+		backrefs: dict[int, tuple[int, int, str]] = {}
+
+		for (objectid, key_type, offset), data in self.items(self._superblock.root, (0, 0, 0)):
+			if key_type == _ROOT_ITEM_KEY:
+				tree_roots[objectid] = _ROOT_ITEM_BYTENR.unpack_from(data, _ROOT_ITEM_BYTENR_OFFSET)[0]
+			elif key_type == _ROOT_BACKREF_KEY and _FIRST_FREE_OBJECTID <= objectid <= _LAST_FREE_OBJECTID:
+				dirid, _, name_len = _ROOT_REF.unpack_from(data)
+				name = data[_ROOT_REF.size : _ROOT_REF.size + name_len].decode(errors='replace')
+				backrefs[objectid] = (offset, dirid, name)
+
+		return _subvolume_paths(backrefs, lambda tree, dirid: self._inode_path(tree_roots[tree], dirid))
+
+
+def _tree_search(fd: int, tree_id: int, min_key: _Key, max_key: _Key) -> Iterator[tuple[_Key, bytes]]:
+	while True:
+		search_key = _SEARCH_KEY.pack(
+			tree_id,
+			min_key[0],
+			max_key[0],
+			min_key[2],
+			max_key[2],
+			0,
+			2**64 - 1,
+			min_key[1],
+			max_key[1],
+			4096,
+			0,
+			0,
+			0,
+			0,
+			0,
+		)
+		args = bytearray(search_key.ljust(_IOC_ARGS_SIZE, b'\0'))
+		fcntl.ioctl(fd, _IOC_TREE_SEARCH, args)
+
+		nr_items = _SEARCH_KEY.unpack_from(args)[9]
+
+		if nr_items == 0:
+			return
+
+		pos = _SEARCH_KEY.size
+		key = min_key
+
+		for _ in range(nr_items):
+			_, objectid, offset, key_type, length = _SEARCH_HEADER.unpack_from(args, pos)
+			pos += _SEARCH_HEADER.size
+			key = (objectid, key_type, offset)
+
+			yield key, bytes(args[pos : pos + length])
+			pos += length
+
+		# continue right after the last returned key
+		objectid, key_type, offset = key
+
+		if offset < 2**64 - 1:
+			min_key = (objectid, key_type, offset + 1)
+		elif key_type < 255:
+			min_key = (objectid, key_type + 1, 0)
+		elif objectid < 2**64 - 1:
+			min_key = (objectid + 1, 0, 0)
+		else:
+			return
+
+		if min_key > max_key:
+			return
+
+
+def _ino_lookup(fd: int, tree_id: int, dirid: int) -> str:
+	args = bytearray(_INO_LOOKUP.pack(tree_id, dirid).ljust(_IOC_ARGS_SIZE, b'\0'))
+	fcntl.ioctl(fd, _IOC_INO_LOOKUP, args)
+
+	return args[_INO_LOOKUP.size :].split(b'\0', 1)[0].decode(errors='replace')
+
+
+def _mounted_subvolumes(mountpoint: Path) -> list[BtrfsSubvolume]:
+	fd = os.open(mountpoint, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+
+	try:
+		backrefs: dict[int, tuple[int, int, str]] = {}
+		search = _tree_search(
+			fd,
+			_ROOT_TREE_OBJECTID,
+			(_FIRST_FREE_OBJECTID, _ROOT_BACKREF_KEY, 0),
+			(_LAST_FREE_OBJECTID, _ROOT_BACKREF_KEY, 2**64 - 1),
+		)
+
+		for (objectid, key_type, offset), data in search:
+			# the range is compared as a whole key, so other item types are in between
+			if key_type == _ROOT_BACKREF_KEY:
+				dirid, _, name_len = _ROOT_REF.unpack_from(data)
+				name = data[_ROOT_REF.size : _ROOT_REF.size + name_len].decode(errors='replace')
+				backrefs[objectid] = (offset, dirid, name)
+
+		return _subvolume_paths(backrefs, lambda tree, dirid: _ino_lookup(fd, tree, dirid))
+	finally:
+		os.close(fd)
+
+
+def _device_subvolumes(dev_path: Path, superblock: BtrfsSuperblock) -> list[BtrfsSubvolume]:
+	if superblock.num_devices != 1:
+		raise DiskError(f'Btrfs filesystem on {dev_path} spans {superblock.num_devices} devices')
+
+	fd = os.open(dev_path, os.O_RDONLY | os.O_CLOEXEC)
+
+	try:
+		return _BtrfsDeviceReader(fd, superblock).subvolumes()
+	finally:
+		os.close(fd)
+
+
+class _SubvolumeCache:
+	"""
+	Subvolumes of unmounted filesystems by UUID and generation. The generation
+	is increased with every transaction, so entries never become stale.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._subvolumes: dict[uuid.UUID, tuple[int, list[BtrfsSubvolume]]] = {}
+
+	def get(self, superblock: BtrfsSuperblock) -> list[BtrfsSubvolume] | None:
+		with self._lock:
+			generation, subvolumes = self._subvolumes.get(superblock.fsid, (None, []))
+			return list(subvolumes) if generation == superblock.generation else None
+
+	def set(self, superblock: BtrfsSuperblock, subvolumes: list[BtrfsSubvolume]) -> None:
+		with self._lock:
+			self._subvolumes[superblock.fsid] = (superblock.generation, list(subvolumes))
+
+
+_subvolume_cache = _SubvolumeCache()
+
+
+def list_subvolumes(dev_path: Path, mountpoint: Path | None = None) -> list[BtrfsSubvolume]:
+	"""
+	Lists the subvolumes of the btrfs filesystem on ``dev_path`` without mounting it.
+	If the filesystem is mounted the kernel is asked through ioctls on ``mountpoint``,
+	otherwise the trees are read from the device. Raises a DiskError if the
+	filesystem can't be read this way.
+	"""
+	if mountpoint:
+		# the superblock on the device of a mounted filesystem lags behind until the
+		# next transaction commit, so the kernel is asked every time instead of caching
+		try:
+			subvolumes = _mounted_subvolumes(mountpoint)
+		except (OSError, struct.error) as err:
+			raise DiskError(f'Unable to read the btrfs subvolumes of {dev_path}: {err}')
+
+		debug(f'Found {len(subvolumes)} btrfs subvolumes on {dev_path} mounted at {mountpoint}')
+		return subvolumes
+
+	superblock = read_superblock(dev_path)
+
+	if (subvolumes := _subvolume_cache.get(superblock)) is not None:
+		return subvolumes
+
+	try:
+		subvolumes = _device_subvolumes(dev_path, superblock)
+	except (OSError, struct.error, KeyError) as err:
+		raise DiskError(f'Unable to read the btrfs subvolumes of {dev_path}: {err}')
+
+	debug(f'Found {len(subvolumes)} btrfs subvolumes on {dev_path} (generation {superblock.generation})')
+	_subvolume_cache.set(superblock, subvolumes)
+
+	return subvolumes
@@ -1,19 +1,28 @@
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 from parted import Device, Disk, DiskException, FileSystem, Geometry, IOException, Partition, PartitionException, freshDisk, getAllDevices, getDevice, newDisk
 
 from archinstall.lib.command import SysCommand
+from archinstall.lib.disk.btrfs import list_subvolumes
+from archinstall.lib.disk.fs_tuning import DeviceTraits, tune_filesystem
 from archinstall.lib.disk.luks import Luks2, unlock_luks2_dev
+from archinstall.lib.disk.partition_planner import plan_partitions
 from archinstall.lib.disk.utils import (
 	find_lsblk_info,
 	get_all_lsblk_info,
 	get_lsblk_info,
+	get_lsblk_infos,
 	mount,
 	udev_sync,
 	umount,
 )
+from archinstall.lib.disk.wipe import wipe_device
 from archinstall.lib.exceptions import DiskError, SysCallError, UnknownFilesystemFormat
 from archinstall.lib.log import debug, error, info, log
 from archinstall.lib.models.device import (
@@ -21,8 +30,11 @@ from archinstall.lib.models.device import (
 	BDevice,
 	BtrfsMountOption,
 	DeviceModification,
+	DeviceSummary,
 	DiskEncryption,
+	DmCryptPerf,
 	FilesystemType,
+	FsProfile,
 	LsblkInfo,
 	ModificationStatus,
 	PartitionFlag,
@@ -31,6 +43,7 @@ from archinstall.lib.models.device import (
 	PartitionTable,
 	SubvolumeModification,
 	Unit,
+	WipeMode,
 	_BtrfsSubvolumeInfo,
 	_DeviceInfo,
 	_PartitionInfo,
@@ -45,76 +58,122 @@ class DeviceHandler:
 	def __init__(self) -> None:
 		self._devices: dict[Path, BDevice] = {}
 		self._partition_table = PartitionTable.default()
-		self.load_devices()
+		self._loaded = False
+		self._lock = threading.RLock()
 
 	@property
 	def devices(self) -> list[BDevice]:
+		self._ensure_loaded()
 		return list(self._devices.values())
 
 	@property
 	def partition_table(self) -> PartitionTable:
 		return self._partition_table
 
+	def _ensure_loaded(self) -> None:
+		# the devices are probed on first use rather than on import,
+		# which can take a long time with many (e.g. SAN attached) disks
+		with self._lock:
+			if not self._loaded:
+				self.load_devices()
+
+	@staticmethod
+	def _is_listed(lsblk_info: LsblkInfo) -> bool:
+		if lsblk_info.type in ('rom', 'part'):
+			return False
+
+		# exclude archiso loop device
+		return lsblk_info.mountpoint != ARCHISO_MOUNTPOINT
+
+	def summaries(self) -> list[DeviceSummary]:
+		"""
+		Cheap overview of the available devices, e.g. for the disk selection.
+		Only lsblk is queried, the devices themselves are probed once they're
+		requested with :py:meth:`get_device`.
+		"""
+		return [DeviceSummary.from_lsblk(lsblk_info) for lsblk_info in get_all_lsblk_info() if self._is_listed(lsblk_info)]
+
 	def load_devices(self) -> None:
-		block_devices = {}
+		with self._lock:
+			udev_sync()
 
-		udev_sync()
-		all_lsblk_info = get_all_lsblk_info()
-		devices = getAllDevices()
-		devices.extend(self.get_loop_devices())
+			# libparted isn't thread safe, so only lsblk runs in the background
+			# while the devices are enumerated and probed one after another
+			with ThreadPoolExecutor(max_workers=1) as executor:
+				lsblk_infos = executor.submit(get_all_lsblk_info)
+				devices = getAllDevices()
+				devices.extend(self.get_loop_devices())
+				all_lsblk_info = {lsblk_info.path: lsblk_info for lsblk_info in lsblk_infos.result()}
 
-		for device in devices:
-			dev_lsblk_info = find_lsblk_info(device.path, all_lsblk_info)
+			block_devices: dict[Path, BDevice] = {}
 
-			if not dev_lsblk_info:
-				debug(f'Device lsblk info not found: {device.path}')
-				continue
+			for device in devices:
+				dev_lsblk_info = all_lsblk_info.get(Path(device.path))
 
-			if dev_lsblk_info.type == 'rom':
-				continue
+				if not dev_lsblk_info:
+					debug(f'Device lsblk info not found: {device.path}')
+					continue
 
-			# exclude archiso loop device
-			if dev_lsblk_info.mountpoint == ARCHISO_MOUNTPOINT:
-				continue
+				if self._is_listed(dev_lsblk_info) and (block_device := self._probe_device(device, dev_lsblk_info)):
+					block_devices[block_device.device_info.path] = block_device
 
-			try:
-				if dev_lsblk_info.pttype:
-					disk = newDisk(device)
-				else:
-					disk = freshDisk(device, self.partition_table.value)
-			except DiskException as err:
-				debug(f'Unable to get disk from {device.path}: {err}')
-				continue
+			self._devices = block_devices
+			self._loaded = True
 
-			device_info = _DeviceInfo.from_disk(disk)
-			partition_infos = []
+	def _load_device(self, path: Path) -> BDevice | None:
+		try:
+			dev_lsblk_info = get_lsblk_info(path)
+		except DiskError:
+			debug(f'Device lsblk info not found: {path}')
+			return None
 
-			for partition in disk.partitions:
-				lsblk_info = find_lsblk_info(partition.path, dev_lsblk_info.children)
+		if not self._is_listed(dev_lsblk_info):
+			return None
 
-				if not lsblk_info:
-					debug(f'Partition lsblk info not found: {partition.path}')
-					continue
+		try:
+			device = getDevice(str(path))
+		except IOException as err:
+			debug(f'Unable to open device {path}: {err}')
+			return None
 
-				fs_type = self._determine_fs_type(partition, lsblk_info)
-				subvol_infos = []
+		return self._probe_device(device, dev_lsblk_info)
 
-				if fs_type == FilesystemType.BTRFS:
-					subvol_infos = self.get_btrfs_info(partition.path, lsblk_info)
+	def _probe_device(self, device: Device, dev_lsblk_info: LsblkInfo) -> BDevice | None:
+		try:
+			if dev_lsblk_info.pttype:
+				disk = newDisk(device)
+			else:
+				disk = freshDisk(device, self.partition_table.value)
+		except DiskException as err:
+			debug(f'Unable to get disk from {device.path}: {err}')
+			return None
+
+		device_info = _DeviceInfo.from_disk(disk)
+		partition_infos = []
+
+		for partition in disk.partitions:
+			lsblk_info = find_lsblk_info(partition.path, dev_lsblk_info.children)
 
-				partition_infos.append(
-					_PartitionInfo.from_partition(
-						partition,
-						lsblk_info,
-						fs_type,
-						subvol_infos,
-					),
-				)
+			if not lsblk_info:
+				debug(f'Partition lsblk info not found: {partition.path}')
+				continue
+
+			fs_type = self._determine_fs_type(partition, lsblk_info)
+			btrfs_loader = None
 
-			block_device = BDevice(disk, device_info, partition_infos)
-			block_devices[block_device.device_info.path] = block_device
+			if fs_type == FilesystemType.BTRFS:
+				btrfs_loader = partial(self.get_btrfs_info, Path(partition.path))
 
-		self._devices = block_devices
+			partition_infos.append(
+				_PartitionInfo.from_partition(
+					partition,
+					lsblk_info,
+					fs_type,
+					btrfs_loader=btrfs_loader,
+				),
+			)
+
+		return BDevice(disk, device_info, partition_infos)
 
 	@staticmethod
 	def get_loop_devices() -> list[Device]:
@@ -159,7 +218,13 @@ class DeviceHandler:
 		return None
 
 	def get_device(self, path: Path) -> BDevice | None:
-		return self._devices.get(path, None)
+		with self._lock:
+			if (device := self._devices.get(path, None)) is None and not self._loaded:
+				# only probe the requested device until all of them are needed
+				if device := self._load_device(path):
+					self._devices[path] = device
+
+			return device
 
 	def get_device_by_partition_path(self, partition_path: Path) -> BDevice | None:
 		partition = self.find_partition(partition_path)
@@ -169,6 +234,8 @@ class DeviceHandler:
 		return None
 
 	def find_partition(self, path: Path) -> _PartitionInfo | None:
+		self._ensure_loaded()
+
 		for device in self._devices.values():
 			part = next(filter(lambda x: str(x.path) == str(path), device.partition_infos), None)
 			if part is not None:
@@ -187,6 +254,20 @@ class DeviceHandler:
 		if not lsblk_info:
 			lsblk_info = get_lsblk_info(dev_path)
 
+		# It is assumed that lsblk will contain the fields as
+		# "mountpoints": ["/mnt/archinstall/log", "/mnt/archinstall/home", "/mnt/archinstall", ...]
+		# "fsroots": ["/@log", "/@home", "/@"...]
+		# we'll thereby map the fsroot, which are the mounted filesystem roots
+		# to the corresponding mountpoints
+		btrfs_subvol_info = dict(zip(lsblk_info.fsroots, lsblk_info.mountpoints))
+
+		try:
+			subvolumes = list_subvolumes(dev_path, lsblk_info.mountpoints[0] if lsblk_info.mountpoints else None)
+		except DiskError as err:
+			debug(f'Falling back to listing the btrfs subvolumes of {dev_path} with a mount: {err}')
+		else:
+			return [_BtrfsSubvolumeInfo(subvol.path, btrfs_subvol_info.get('/' / subvol.path, None)) for subvol in subvolumes]
+
 		subvol_infos: list[_BtrfsSubvolumeInfo] = []
 
 		if not lsblk_info.mountpoint:
@@ -210,13 +291,6 @@ class DeviceHandler:
 			debug(f'Failed to read btrfs subvolume information: {err}')
 			return subvol_infos
 
-		# It is assumed that lsblk will contain the fields as
-		# "mountpoints": ["/mnt/archinstall/log", "/mnt/archinstall/home", "/mnt/archinstall", ...]
-		# "fsroots": ["/@log", "/@home", "/@"...]
-		# we'll thereby map the fsroot, which are the mounted filesystem roots
-		# to the corresponding mountpoints
-		btrfs_subvol_info = dict(zip(lsblk_info.fsroots, lsblk_info.mountpoints))
-
 		# ID 256 gen 16 top level 5 path @
 		for line in result.splitlines():
 			# expected output format:
@@ -235,7 +309,12 @@ class DeviceHandler:
 		fs_type: FilesystemType,
 		path: Path,
 		additional_parted_options: list[str] = [],
-	) -> None:
+		profile: FsProfile = FsProfile.DEFAULT,
+	) -> list[str]:
+		"""
+		Creates the filesystem with the options of the profile tuned to the
+		device, returns the mount options matching them
+		"""
 		mkfs_type = fs_type.value
 		command = None
 		options = []
@@ -262,7 +341,8 @@ class DeviceHandler:
 		if not command:
 			command = f'mkfs.{mkfs_type}'
 
-		cmd = [command, *options, *additional_parted_options, str(path)]
+		tuning = tune_filesystem(fs_type, DeviceTraits.detect(path), profile)
+		cmd = [command, *options, *tuning.mkfs_options, *additional_parted_options, str(path)]
 
 		debug('Formatting filesystem:', ' '.join(cmd))
 
@@ -273,6 +353,8 @@ class DeviceHandler:
 			error(msg)
 			raise DiskError(msg) from err
 
+		return tuning.mount_options
+
 	def encrypt(
 		self,
 		dev_path: Path,
@@ -280,16 +362,19 @@ class DeviceHandler:
 		enc_password: Password | None,
 		lock_after_create: bool = True,
 		iter_time: int = DEFAULT_ITER_TIME,
+		perf: DmCryptPerf | None = None,
 	) -> Luks2:
 		luks_handler = Luks2(
 			dev_path,
 			mapper_name=mapper_name,
 			password=enc_password,
+			perf=perf,
 		)
 
+		started = time.time()
 		key_file = luks_handler.encrypt(iter_time=iter_time)
 
-		udev_sync()
+		udev_sync([dev_path], since=started)
 
 		luks_handler.unlock(key_file=key_file)
 
@@ -308,7 +393,8 @@ class DeviceHandler:
 		mapper_name: str | None,
 		fs_type: FilesystemType,
 		enc_conf: DiskEncryption,
-	) -> None:
+		profile: FsProfile = FsProfile.DEFAULT,
+	) -> list[str]:
 		if not enc_conf.encryption_password:
 			raise ValueError('No encryption password provided')
 
@@ -316,11 +402,13 @@ class DeviceHandler:
 			dev_path,
 			mapper_name=mapper_name,
 			password=enc_conf.encryption_password,
+			perf=enc_conf.perf,
 		)
 
+		started = time.time()
 		key_file = luks_handler.encrypt(iter_time=enc_conf.iter_time)
 
-		udev_sync()
+		udev_sync([dev_path], since=started)
 
 		luks_handler.unlock(key_file=key_file)
 
@@ -328,11 +416,13 @@ class DeviceHandler:
 			raise DiskError('Failed to unlock luks device')
 
 		info(f'luks2 formatting mapper dev: {luks_handler.mapper_dev}')
-		self.format(fs_type, luks_handler.mapper_dev)
+		mount_options = self.format(fs_type, luks_handler.mapper_dev, profile=profile)
 
 		info(f'luks2 locking device: {dev_path}')
 		luks_handler.lock()
 
+		return mount_options
+
 	def _setup_partition(
 		self,
 		part_mod: PartitionModification,
@@ -402,8 +492,20 @@ class DeviceHandler:
 		part_mod.dev_path = Path(partition.path)
 
 	def fetch_part_info(self, path: Path) -> LsblkInfo:
-		lsblk_info = get_lsblk_info(path)
+		return self.fetch_part_infos([path])[path]
 
+	def fetch_part_infos(self, paths: list[Path]) -> dict[Path, LsblkInfo]:
+		"""
+		Fetches the information of several freshly formatted partitions with a single lsblk call.
+		"""
+		lsblk_infos = get_lsblk_infos(paths)
+
+		for path, lsblk_info in lsblk_infos.items():
+			self._validate_part_info(path, lsblk_info)
+
+		return lsblk_infos
+
+	def _validate_part_info(self, path: Path, lsblk_info: LsblkInfo) -> None:
 		if not lsblk_info.partn:
 			debug(f'Unable to determine new partition number: {path}\n{lsblk_info}')
 			raise DiskError(f'Unable to determine new partition number: {path}')
@@ -418,8 +520,6 @@ class DeviceHandler:
 
 		debug(f'partition information found: {lsblk_info.model_dump_json()}')
 
-		return lsblk_info
-
 	def create_lvm_btrfs_subvolumes(
 		self,
 		path: Path,
@@ -467,6 +567,7 @@ class DeviceHandler:
 				part_mod.safe_dev_path,
 				part_mod.mapper_name,
 				enc_conf.encryption_password,
+				enc_conf.perf,
 			)
 
 			if not luks_handler.mapper_dev:
@@ -519,41 +620,68 @@ class DeviceHandler:
 		Create a partition table on the block device and create all partitions.
 		"""
 		partition_table = partition_table or self.partition_table
+		started = time.time()
 
 		# WARNING: the entire device will be wiped and all data lost
 		if modification.wipe:
 			if partition_table.is_mbr() and len(modification.partitions) > 3:
 				raise DiskError('Too many partitions on disk, MBR disks can only have 3 primary partitions')
 
-			self.wipe_dev(modification.device)
-			disk = freshDisk(modification.device.disk.device, partition_table.value)
+			self.wipe_dev(modification.device, modification.wipe_mode, modification.verify_wipe)
 		else:
 			info(f'Use existing device: {modification.device_path}')
-			disk = modification.device.disk
 
 		info(f'Creating partitions: {modification.device_path}')
 
 		# don't touch existing partitions
 		filtered_part = [p for p in modification.partitions if not p.exists()]
 
-		for part_mod in filtered_part:
-			# if the entire disk got nuked then we don't have to delete
-			# any existing partitions anymore because they're all gone already
-			requires_delete = modification.wipe is False
-			self._setup_partition(part_mod, modification.device, disk, requires_delete=requires_delete)
+		# the whole table is computed up front and written at once
+		plan = plan_partitions(modification, partition_table)
 
-		disk.commit()
+		if plan is not None:
+			try:
+				plan.validate()
+			except DiskError as err:
+				# libparted may still be able to create the partitions, e.g. by adjusting them to the alignment
+				debug(f'Unable to plan the partitions of {modification.device_path}: {err}')
+				plan = None
+
+		if plan is not None:
+			plan.write()
+		else:
+			debug(f'Creating the partitions of {modification.device_path} with libparted')
+			self._partition_parted(modification, partition_table, filtered_part)
 
 		# Wipe filesystem/LVM signatures from newly created partitions
 		# to prevent "signature detected" errors
 		for part_mod in filtered_part:
 			if part_mod.dev_path:
 				debug(f'Wiping signatures from: {part_mod.dev_path}')
-				SysCommand(f'wipefs --all {part_mod.dev_path}')
+				self._wipe(part_mod.dev_path)
 
 		# Sync with udev after wiping signatures
 		if filtered_part:
-			udev_sync()
+			udev_sync([modification.device_path, *(p.dev_path for p in filtered_part if p.dev_path)], since=started)
+
+	def _partition_parted(
+		self,
+		modification: DeviceModification,
+		partition_table: PartitionTable,
+		partitions: list[PartitionModification],
+	) -> None:
+		if modification.wipe:
+			disk = freshDisk(modification.device.disk.device, partition_table.value)
+		else:
+			disk = modification.device.disk
+
+		for part_mod in partitions:
+			# if the entire disk got nuked then we don't have to delete
+			# any existing partitions anymore because they're all gone already
+			requires_delete = modification.wipe is False
+			self._setup_partition(part_mod, modification.device, disk, requires_delete=requires_delete)
+
+		disk.commit()
 
 	def detect_pre_mounted_mods(self, base_mountpoint: Path) -> list[DeviceModification]:
 		part_mods: dict[Path, list[PartitionModification]] = {}
@@ -596,16 +724,20 @@ class DeviceHandler:
 			else:
 				error(f'"{command}" failed to run (continuing anyway): {err}')
 
-	def _wipe(self, dev_path: Path) -> None:
+	def _wipe(self, dev_path: Path, verify: bool = False) -> None:
 		"""
 		Wipe a device (partition or otherwise) of meta-data, be it file system, LVM, etc.
 		@param dev_path:	Device path of the partition to be wiped.
 		@type dev_path:		str
 		"""
-		with open(dev_path, 'wb') as p:
-			p.write(bytearray(1024))
+		wipe_device(dev_path, WipeMode.SIGNATURES, verify)
 
-	def wipe_dev(self, block_device: BDevice) -> None:
+	def wipe_dev(
+		self,
+		block_device: BDevice,
+		mode: WipeMode = WipeMode.SIGNATURES,
+		verify: bool = False,
+	) -> None:
 		"""
 		Wipe the block device of meta-data, be it file system, LVM, etc.
 		This is not intended to be secure, but rather to ensure that
@@ -618,9 +750,11 @@ class DeviceHandler:
 			if luks.isLuks():
 				luks.erase()
 
-			self._wipe(partition.path)
+			# zeroing the entire device takes care of the partitions as well
+			if mode != WipeMode.ZERO:
+				self._wipe(partition.path, verify)
 
-		self._wipe(block_device.device_info.path)
+		wipe_device(block_device.device_info.path, mode, verify)
 
 
 device_handler = DeviceHandler()
@@ -5,7 +5,7 @@ from typing import override
 from archinstall.lib.disk.device_handler import device_handler
 from archinstall.lib.disk.encryption_menu import DiskEncryptionMenu
 from archinstall.lib.disk.partitioning_menu import manual_partitioning
-from archinstall.lib.log import debug
+from archinstall.lib.log import debug, warn
 from archinstall.lib.menu.abstract_menu import AbstractSubMenu
 from archinstall.lib.menu.helpers import Confirmation, Notify, Selection, Table
 from archinstall.lib.menu.util import prompt_dir
@@ -15,6 +15,7 @@ from archinstall.lib.models.device import (
 	BtrfsMountOption,
 	BtrfsOptions,
 	DeviceModification,
+	DeviceSummary,
 	DiskEncryption,
 	DiskLayoutConfiguration,
 	DiskLayoutType,
@@ -34,7 +35,7 @@ from archinstall.lib.models.device import (
 	SnapshotType,
 	SubvolumeModification,
 	Unit,
-	_DeviceInfo,
+	WipeMode,
 )
 from archinstall.lib.translationhandler import tr
 from archinstall.lib.utils.format import as_table
@@ -226,6 +227,9 @@ class DiskLayoutConfigurationMenu(AbstractSubMenu[DiskMenuConfig]):
 
 				output_partition += f'{mod.device_path}: {mod.device.device_info.model}\n'
 				output_partition += '{}: {}\n'.format(tr('Wipe'), mod.wipe)
+
+				if mod.wipe and mod.wipe_mode != WipeMode.SIGNATURES:
+					output_partition += '{}: {}\n'.format(tr('Wipe mode'), mod.wipe_mode.value)
 				output_partition += partition_table + '\n'
 
 				# create btrfs table
@@ -284,6 +288,10 @@ class DiskLayoutConfigurationMenu(AbstractSubMenu[DiskMenuConfig]):
 			if enc_type != EncryptionType.NO_ENCRYPTION:
 				output += tr('Iteration time') + f': {enc_config.iter_time or DEFAULT_ITER_TIME}ms\n'
 
+				if enc_config.perf:
+					options = enc_config.perf.open_args() + enc_config.perf.format_args()
+					output += tr('dm-crypt options') + f': {" ".join(options) or tr("None")}\n'
+
 			if enc_config.partitions:
 				output += f'Partitions: {len(enc_config.partitions)} selected\n'
 			elif enc_config.lvm_volumes:
@@ -299,7 +307,7 @@ class DiskLayoutConfigurationMenu(AbstractSubMenu[DiskMenuConfig]):
 
 async def select_devices(preset: list[BDevice] | None = []) -> list[BDevice] | None:
 	def _preview_device_selection(item: MenuItem) -> str | None:
-		device: _DeviceInfo = item.value  # type: ignore[assignment]
+		device: DeviceSummary = item.value  # type: ignore[assignment]
 		dev = device_handler.get_device(device.path)
 
 		if dev and dev.partition_infos:
@@ -309,23 +317,25 @@ async def select_devices(preset: list[BDevice] | None = []) -> list[BDevice] | N
 	if preset is None:
 		preset = []
 
-	devices = device_handler.devices
+	# the devices are only probed once they're previewed or selected
+	summaries = device_handler.summaries()
 
 	items = [
 		MenuItem(
-			str(d.device_info.path),
-			d.device_info,
+			str(d.path),
+			d,
 			preview_action=_preview_device_selection,
 		)
-		for d in devices
+		for d in summaries
 	]
 
-	presets = [p.device_info for p in preset]
+	preset_paths = [p.device_info.path for p in preset]
+	presets = [d for d in summaries if d.path in preset_paths]
 
 	group = MenuItemGroup(items)
 	group.set_selected_by_value(presets)
 
-	result = await Table[_DeviceInfo](
+	result = await Table[DeviceSummary](
 		header=tr('Select disks for the installation'),
 		group=group,
 		presets=presets,
@@ -341,12 +351,13 @@ async def select_devices(preset: list[BDevice] | None = []) -> list[BDevice] | N
 		case ResultType.Skip:
 			return None
 		case ResultType.Selection:
-			selected_device_info = result.get_values()
 			selected_devices = []
 
-			for device in devices:
-				if device.device_info in selected_device_info:
+			for summary in result.get_values():
+				if device := device_handler.get_device(summary.path):
 					selected_devices.append(device)
+				else:
+					warn(f'Unable to read the partition table of {summary.path}, skipping it')
 
 			return selected_devices
 
@@ -109,10 +109,10 @@ class Fido2:
 
 		while worker.is_alive():
 			if pw_inputted is False:
-				if bytes(f'please enter current passphrase for disk {dev_path}', 'UTF-8') in worker._trace_log.lower():
+				if bytes(f'please enter current passphrase for disk {dev_path}', 'UTF-8') in worker.trace_log().lower():
 					worker.write(bytes(password.plaintext, 'UTF-8'))
 					pw_inputted = True
 			elif pin_inputted is False:
-				if bytes('please enter security token pin', 'UTF-8') in worker._trace_log.lower():
+				if bytes('please enter security token pin', 'UTF-8') in worker.trace_log().lower():
 					worker.write(bytes(getpass.getpass(' '), 'UTF-8'))
 					pin_inputted = True
@@ -1,8 +1,11 @@
 import math
 import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from archinstall.lib.disk.device_handler import device_handler
+from archinstall.lib.disk.fs_tuning import merge_mount_options
 from archinstall.lib.disk.luks import Luks2
 from archinstall.lib.disk.lvm import (
 	lvm_group_info,
@@ -56,19 +59,18 @@ class FilesystemHandler:
 		for mod in device_mods:
 			device_handler.partition(mod)
 
-		udev_sync()
+		udev_sync([mod.device_path for mod in device_mods])
 
 		if self._disk_config.lvm_config:
-			for mod in device_mods:
-				if boot_part := mod.get_boot_partition():
-					debug(f'Formatting boot partition: {boot_part.dev_path}')
-					self._format_partitions([boot_part])
+			boot_parts = [boot_part for mod in device_mods if (boot_part := mod.get_boot_partition())]
+			debug(f'Formatting boot partitions: {[part.dev_path for part in boot_parts]}')
+			self._format_partitions(boot_parts)
 
 			self.perform_lvm_operations()
 		else:
-			for mod in device_mods:
-				self._format_partitions(mod.partitions)
+			self._format_partitions([part for mod in device_mods for part in mod.partitions])
 
+			for mod in device_mods:
 				for part_mod in mod.partitions:
 					if part_mod.fs_type == FilesystemType.BTRFS and part_mod.is_create_or_modify():
 						device_handler.create_btrfs_volumes(part_mod, enc_conf=self._enc_config)
@@ -80,34 +82,58 @@ class FilesystemHandler:
 		"""
 		Format can be given an overriding path, for instance /dev/null to test
 		the formatting functionality and in essence the support for the given filesystem.
+
+		Partitions on different devices are formatted concurrently, the partitions
+		of a single device one after another so they don't compete for the same disk.
 		"""
 
 		# don't touch existing partitions
 		create_or_modify_parts = [p for p in partitions if p.is_create_or_modify()]
 
+		if not create_or_modify_parts:
+			return
+
 		self._validate_partitions(create_or_modify_parts)
 
+		parts_by_device: dict[Path, list[PartitionModification]] = {}
 		for part_mod in create_or_modify_parts:
-			# partition will be encrypted
-			if self._enc_config is not None and part_mod in self._enc_config.partitions:
-				device_handler.format_encrypted(
-					part_mod.safe_dev_path,
-					part_mod.mapper_name,
-					part_mod.safe_fs_type,
-					self._enc_config,
-				)
-			else:
-				device_handler.format(part_mod.safe_fs_type, part_mod.safe_dev_path)
+			parts_by_device.setdefault(_parent_device(part_mod.safe_dev_path), []).append(part_mod)
+
+		def _format_device(parts: list[PartitionModification]) -> None:
+			for part_mod in parts:
+				self._format_partition(part_mod)
 
-			# synchronize with udev before using lsblk
-			udev_sync()
+		started = time.time()
+		_run_concurrently(_format_device, list(parts_by_device.values()))
 
-			lsblk_info = device_handler.fetch_part_info(part_mod.safe_dev_path)
+		# synchronize with udev once before using lsblk
+		udev_sync([part_mod.safe_dev_path for part_mod in create_or_modify_parts], since=started)
+
+		lsblk_infos = device_handler.fetch_part_infos([part_mod.safe_dev_path for part_mod in create_or_modify_parts])
+
+		for part_mod in create_or_modify_parts:
+			lsblk_info = lsblk_infos[part_mod.safe_dev_path]
 
 			part_mod.partn = lsblk_info.partn
 			part_mod.partuuid = lsblk_info.partuuid
 			part_mod.uuid = lsblk_info.uuid
 
+	def _format_partition(self, part_mod: PartitionModification) -> None:
+		# partition will be encrypted
+		if self._enc_config is not None and part_mod in self._enc_config.partitions:
+			mount_options = device_handler.format_encrypted(
+				part_mod.safe_dev_path,
+				part_mod.mapper_name,
+				part_mod.safe_fs_type,
+				self._enc_config,
+				part_mod.fs_profile,
+			)
+		else:
+			mount_options = device_handler.format(part_mod.safe_fs_type, part_mod.safe_dev_path, profile=part_mod.fs_profile)
+
+		# the options are mounted with and end up in the fstab
+		part_mod.mount_options = merge_mount_options(part_mod.mount_options, mount_options)
+
 	def _validate_partitions(self, partitions: list[PartitionModification]) -> None:
 		checks = {
 			# verify that all partitions have a path set (which implies that they have been created)
@@ -203,13 +229,10 @@ class FilesystemHandler:
 				debug(f'vg: {vg.name}, vol: {lv.name}, offset: {offset}')
 				lvm_vol_create(vg.name, lv, offset)
 
-				while True:
-					debug('Fetching LVM volume info')
-					lv_info = lvm_vol_info(lv.name)
-					if lv_info is not None:
-						break
+				debug('Fetching LVM volume info')
 
-					time.sleep(1)
+				if lvm_vol_info(lv.name) is None:
+					raise ValueError(f'Unable to fetch LV info of {lv.name}')
 
 			self._lvm_vol_handle_e2scrub(vg)
 
@@ -218,18 +241,27 @@ class FilesystemHandler:
 		lvm_config: LvmConfiguration,
 		enc_vols: dict[LvmVolume, Luks2] = {},
 	) -> None:
+		vol_paths: dict[LvmVolume, Path] = {}
+
 		for vol in lvm_config.get_all_volumes():
 			if enc_vol := enc_vols.get(vol, None):
 				if not enc_vol.mapper_dev:
 					raise ValueError('No mapper device defined')
-				path = enc_vol.mapper_dev
+				vol_paths[vol] = enc_vol.mapper_dev
 			else:
-				path = vol.safe_dev_path
+				vol_paths[vol] = vol.safe_dev_path
 
-			# wait a bit otherwise the mkfs will fail as it can't
-			# find the mapper device yet
-			device_handler.format(vol.fs_type, path)
+		# logical volumes never overlap, so they can be formatted side by side
+		started = time.time()
+		tuned_options = _run_concurrently(lambda vol: device_handler.format(vol.fs_type, vol_paths[vol]), list(vol_paths))
 
+		# the same as for partitions, the options are mounted with and end up in the fstab
+		for vol, mount_options in zip(vol_paths, tuned_options):
+			vol.mount_options = merge_mount_options(vol.mount_options, mount_options)
+
+		udev_sync(list(vol_paths.values()), since=started)
+
+		for vol, path in vol_paths.items():
 			if vol.fs_type == FilesystemType.BTRFS:
 				device_handler.create_lvm_btrfs_subvolumes(path, vol.btrfs_subvols, vol.mount_options)
 
@@ -277,6 +309,7 @@ class FilesystemHandler:
 					enc_config.encryption_password,
 					lock_after_create,
 					iter_time=enc_config.iter_time,
+					perf=enc_config.perf,
 				)
 
 				enc_vols[vol] = luks_handler
@@ -308,6 +341,7 @@ class FilesystemHandler:
 						enc_config.encryption_password,
 						lock_after_create=lock_after_create,
 						iter_time=enc_config.iter_time,
+						perf=enc_config.perf,
 					)
 
 					enc_mods[part_mod] = luks_handler
@@ -325,3 +359,30 @@ class FilesystemHandler:
 				largest_vol.safe_dev_path,
 				Size(256, Unit.MiB, SectorSize.default()),
 			)
+
+
+def _parent_device(dev_path: Path) -> Path:
+	"""
+	Returns the device a partition belongs to, e.g. /dev/nvme0n1 for /dev/nvme0n1p2.
+	"""
+	sys_path = Path('/sys/class/block') / dev_path.resolve().name
+
+	if (sys_path / 'partition').exists():
+		return Path('/dev') / sys_path.resolve().parent.name
+
+	return dev_path
+
+
+def _run_concurrently[T, R](func: Callable[[T], R], items: list[T]) -> list[R]:
+	"""
+	Calls ``func`` for all items concurrently and waits for all of them,
+	so nothing is left running when the first error gets raised.
+	Returns the results in the order of the items.
+	"""
+	if len(items) <= 1:
+		return [func(item) for item in items]
+
+	with ThreadPoolExecutor(max_workers=len(items)) as executor:
+		futures = [executor.submit(func, item) for item in items]
+
+	return [future.result() for future in futures]
@@ -0,0 +1,206 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Self
+
+from archinstall.lib.disk.utils import get_lsblk_info, queue_limit
+from archinstall.lib.exceptions import DiskError
+from archinstall.lib.log import debug
+from archinstall.lib.models.device import FilesystemType, FsProfile, Unit
+
+_KiB = 1024
+_GiB = 1024 * 1024 * _KiB
+
+# the block size of ext4 and XFS
+_FS_BLOCK_SIZE = 4 * _KiB
+# a minimum_io_size below this is the physical sector size, not a RAID chunk
+_MIN_CHUNK_SIZE = 16 * _KiB
+# initializing the inode tables at mkfs time is cheap up to this size on rotational disks
+_EAGER_INIT_MAX_SIZE = 64 * _GiB
+
+
+@dataclass(frozen=True)
+class DeviceTraits:
+	rotational: bool = True
+	transport: str | None = None
+	sector_size: int = 512
+	size: int = 0
+	discard: bool = False
+	# the RAID geometry in bytes, 0 if the device isn't striped
+	chunk_size: int = 0
+	stripe_size: int = 0
+
+	@property
+	def solid_state(self) -> bool:
+		return not self.rotational or self.transport == 'nvme'
+
+	@property
+	def data_disks(self) -> int:
+		if self.chunk_size and self.stripe_size:
+			return self.stripe_size // self.chunk_size
+		return 0
+
+	@classmethod
+	def detect(cls, dev_path: Path) -> Self:
+		"""
+		Reads the characteristics of a device from lsblk and the queue limits in
+		sysfs. md and dm (LVM, dm-crypt) devices report the RAID geometry as the
+		minimum and optimal I/O size, which stack through the device mapper.
+		"""
+		try:
+			lsblk_info = get_lsblk_info(dev_path)
+		except DiskError as err:
+			debug(f'Unable to detect the characteristics of {dev_path}: {err}')
+			return cls()
+
+		io_min = queue_limit(dev_path, 'minimum_io_size') or 0
+		io_opt = queue_limit(dev_path, 'optimal_io_size') or 0
+
+		if io_min < _MIN_CHUNK_SIZE or io_opt <= io_min or io_opt % io_min:
+			io_min = io_opt = 0
+
+		return cls(
+			rotational=lsblk_info.rota,
+			transport=lsblk_info.tran,
+			sector_size=lsblk_info.log_sec,
+			size=lsblk_info.size.convert(Unit.B).value,
+			discard=(queue_limit(dev_path, 'discard_max_bytes') or 0) > 0,
+			chunk_size=io_min,
+			stripe_size=io_opt,
+		)
+
+
+@dataclass
+class FsTuning:
+	mkfs_options: list[str] = field(default_factory=list)
+	mount_options: list[str] = field(default_factory=list)
+
+
+def _compress_level(traits: DeviceTraits) -> int:
+	# fast drives are slowed down by higher levels, slow disks gain from them
+	return 1 if traits.solid_state else 3
+
+
+def _tune_ext4(traits: DeviceTraits, profile: FsProfile) -> FsTuning:
+	tuning = FsTuning()
+	extended: list[str] = []
+
+	if traits.data_disks:
+		stride = traits.chunk_size // _FS_BLOCK_SIZE
+		extended += [f'stride={stride}', f'stripe_width={stride * traits.data_disks}']
+
+	if profile != FsProfile.DEFAULT:
+		tuning.mount_options.append('noatime')
+
+		# otherwise the tables are zeroed in the background after the
+		# first mount, which competes with the installation for the disk
+		if traits.solid_state or traits.size <= _EAGER_INIT_MAX_SIZE:
+			extended += ['lazy_itable_init=0', 'lazy_journal_init=0']
+
+	if profile == FsProfile.LATENCY:
+		# fsync only writes the changed inodes instead of a full journal commit
+		tuning.mkfs_options += ['-O', 'fast_commit']
+
+	if extended:
+		tuning.mkfs_options += ['-E', ','.join(extended)]
+
+	return tuning
+
+
+def _tune_xfs(traits: DeviceTraits, profile: FsProfile) -> FsTuning:
+	tuning = FsTuning()
+
+	if traits.data_disks:
+		tuning.mkfs_options += ['-d', f'su={traits.chunk_size // _KiB}k,sw={traits.data_disks}']
+
+	if profile != FsProfile.DEFAULT:
+		tuning.mount_options.append('noatime')
+
+	if profile == FsProfile.THROUGHPUT:
+		# fewer and larger log writes
+		tuning.mount_options += ['logbufs=8', 'logbsize=256k']
+
+	return tuning
+
+
+def _tune_btrfs(traits: DeviceTraits, profile: FsProfile) -> FsTuning:
+	tuning = FsTuning()
+
+	if profile == FsProfile.DEFAULT:
+		return tuning
+
+	tuning.mount_options.append('noatime')
+
+	# larger metadata nodes mean fewer seeks on rotational disks
+	if profile == FsProfile.THROUGHPUT and not traits.solid_state:
+		tuning.mkfs_options += ['--nodesize', '32768']
+
+	# SSDs may deduplicate the metadata copies internally, so the second copy
+	# only costs writes. Dropping it gives up its redundancy for speed, so
+	# the other profiles keep the duplicated metadata of mkfs.btrfs
+	if profile == FsProfile.THROUGHPUT and traits.solid_state:
+		tuning.mkfs_options += ['--metadata', 'single']
+
+	if profile == FsProfile.THROUGHPUT:
+		tuning.mount_options.append(f'compress=zstd:{_compress_level(traits)}')
+
+	if traits.solid_state and traits.discard:
+		tuning.mount_options.append('discard=async')
+
+	return tuning
+
+
+def _tune_f2fs(traits: DeviceTraits, profile: FsProfile) -> FsTuning:
+	tuning = FsTuning()
+
+	if profile == FsProfile.DEFAULT:
+		return tuning
+
+	tuning.mount_options.append('noatime')
+
+	match profile:
+		case FsProfile.THROUGHPUT:
+			# requires extra_attr, which is always enabled
+			tuning.mkfs_options += ['-O', 'compression']
+			# without compress_extension only files flagged with chattr +c are compressed
+			tuning.mount_options += [
+				f'compress_algorithm=zstd:{_compress_level(traits)}',
+				'compress_chksum',
+				'compress_extension=*',
+			]
+		case FsProfile.LATENCY:
+			# garbage collection in the background instead of the write path
+			tuning.mount_options += ['atgc', 'gc_merge']
+
+	return tuning
+
+
+def tune_filesystem(fs_type: FilesystemType, traits: DeviceTraits, profile: FsProfile = FsProfile.DEFAULT) -> FsTuning:
+	"""
+	Selects the mkfs and mount options of a filesystem for the device and the profile
+	"""
+	match fs_type:
+		case FilesystemType.EXT4:
+			return _tune_ext4(traits, profile)
+		case FilesystemType.XFS:
+			return _tune_xfs(traits, profile)
+		case FilesystemType.BTRFS:
+			return _tune_btrfs(traits, profile)
+		case FilesystemType.F2FS:
+			return _tune_f2fs(traits, profile)
+		case _:
+			return FsTuning()
+
+
+def _option_key(option: str) -> str:
+	key = option.split('=', 1)[0].split(':', 1)[0]
+
+	# nodatacow disables the compression
+	return 'compress' if key == 'nodatacow' else key
+
+
+def merge_mount_options(options: list[str], tuned: list[str]) -> list[str]:
+	"""
+	Adds the tuned options which the configured ones don't already set
+	"""
+	keys = {_option_key(option) for option in options}
+	return options + [option for option in tuned if _option_key(option) not in keys]
@@ -1,17 +1,168 @@
+import os
+import re
 import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from subprocess import CalledProcessError
 from types import TracebackType
 
 from archinstall.lib.command import SysCommand, SysCommandWorker, run
-from archinstall.lib.disk.utils import get_lsblk_info, umount
+from archinstall.lib.disk.utils import get_lsblk_info, udev_sync, umount
 from archinstall.lib.exceptions import DiskError, SysCallError
+from archinstall.lib.hardware import SysInfo
 from archinstall.lib.log import debug, info
-from archinstall.lib.models.device import DEFAULT_ITER_TIME
+from archinstall.lib.models.device import DEFAULT_ITER_TIME, DmCryptPerf
 from archinstall.lib.models.users import Password
 from archinstall.lib.utils.util import generate_password
 
+# upper limits of the argon2id costs, the same as the cryptsetup defaults
+_PBKDF_MAX_MEMORY = 1024 * 1024  # KiB
+_PBKDF_MIN_MEMORY = 64 * 1024  # KiB
+_PBKDF_MAX_PARALLEL = 4
+# the key file is random and not guessable, so its slot gets the cost of the
+# cryptsetup default (2 seconds) instead of the one of the passphrase slot
+_KEYFILE_ITER_TIME = 2000
+
+
+@dataclass(frozen=True)
+class PbkdfCosts:
+	iterations: int
+	memory: int  # KiB
+	parallel: int
+
+	def args(self) -> list[str]:
+		return [
+			'--pbkdf-force-iterations',
+			str(self.iterations),
+			'--pbkdf-memory',
+			str(self.memory),
+			'--pbkdf-parallel',
+			str(self.parallel),
+		]
+
+
+class _PbkdfMemory:
+	"""
+	The argon2id key derivations running at the same time share half of the
+	available memory, the live system runs from memory and e.g. the package
+	cache fills its tmpfs. A derivation waits while the others leave it too
+	little, one of them always runs.
+	"""
+
+	def __init__(self) -> None:
+		self._condition = threading.Condition()
+		self._reserved = 0  # KiB
+
+	def reserve(self, memory: int | None = None) -> int:
+		"""
+		Reserves the memory cost in KiB of a derivation and returns it, the cost
+		of a new key slot is chosen from what's left. Has to be released again.
+		"""
+		with self._condition:
+			while True:
+				# read every time, the memory of running derivations isn't reserved until it's allocated
+				free = SysInfo.mem_available() // 2 - self._reserved
+				needed = memory or max(_PBKDF_MIN_MEMORY, min(_PBKDF_MAX_MEMORY, free))
+
+				if needed <= free or not self._reserved:
+					self._reserved += needed
+					return needed
+
+				self._condition.wait(timeout=1)
+
+	def release(self, memory: int) -> None:
+		with self._condition:
+			self._reserved -= memory
+			self._condition.notify_all()
+
+
+pbkdf_memory = _PbkdfMemory()
+
+
+def _pbkdf_parallel() -> int:
+	return max(1, min(_PBKDF_MAX_PARALLEL, os.cpu_count() or 1))
+
+
+class _PbkdfBenchmark:
+	"""
+	Every luksFormat and luksAddKey benchmarks the machine to find the number of
+	argon2id iterations that take the requested time. The benchmark is instead run
+	once per iteration time and the result is passed to all of them.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._costs: dict[tuple[int, int, int], PbkdfCosts | None] = {}
+
+	def costs(self, iter_time: int, memory: int) -> PbkdfCosts | None:
+		parallel = _pbkdf_parallel()
+		key = (iter_time, memory, parallel)
+
+		with self._lock:
+			if key not in self._costs:
+				self._costs[key] = self._benchmark(iter_time, memory, parallel)
+
+			return self._costs[key]
+
+	@staticmethod
+	def _benchmark(iter_time: int, memory: int, parallel: int) -> PbkdfCosts | None:
+		cmd = [
+			'cryptsetup',
+			'benchmark',
+			'--pbkdf',
+			'argon2id',
+			'--iter-time',
+			str(iter_time),
+			'--pbkdf-memory',
+			str(memory),
+			'--pbkdf-parallel',
+			str(parallel),
+		]
+
+		try:
+			output = SysCommand(cmd).decode()
+		except SysCallError as err:
+			debug(f'PBKDF benchmark failed: {err}')
+			return None
+
+		# argon2id      4 iterations, 1048576 memory, 4 parallel threads (CPUs) for 256-bit key (requested 2000 ms time)
+		if match := re.search(r'argon2id\s+(\d+) iterations, (\d+) memory, (\d+) parallel', output):
+			costs = PbkdfCosts(int(match[1]), int(match[2]), int(match[3]))
+			debug(f'PBKDF benchmark for {iter_time}ms: {costs}')
+			return costs
+
+		debug(f'Unable to parse the PBKDF benchmark: {output}')
+		return None
+
+
+pbkdf_benchmark = _PbkdfBenchmark()
+
+
+def dm_crypt_perf(dev_path: Path, perf: DmCryptPerf | None = None) -> DmCryptPerf:
+	"""
+	Returns the configured dm-crypt options, or the ones selected for the device
+	"""
+	if perf is not None:
+		return perf
+
+	try:
+		return DmCryptPerf.from_lsblk(get_lsblk_info(dev_path))
+	except DiskError as err:
+		debug(f'Unable to select dm-crypt options for {dev_path}: {err}')
+		return DmCryptPerf()
+
+
+def _device_size(dev_path: Path) -> int:
+	fd = os.open(dev_path, os.O_RDONLY | os.O_CLOEXEC)
+
+	try:
+		return os.lseek(fd, 0, os.SEEK_END)
+	finally:
+		os.close(fd)
+
 
 @dataclass
 class Luks2:
@@ -20,6 +171,7 @@ class Luks2:
 	password: Password | None = None
 	key_file: Path | None = None
 	auto_unmount: bool = False
+	perf: DmCryptPerf | None = None
 
 	@property
 	def mapper_dev(self) -> Path | None:
@@ -56,6 +208,25 @@ class Luks2:
 		else:
 			return bytes(self.password.plaintext, 'UTF-8')
 
+	def _perf(self) -> DmCryptPerf:
+		return dm_crypt_perf(self.luks_dev_path, self.perf)
+
+	def _format_args(self) -> list[str]:
+		perf = self._perf()
+
+		# luksFormat refuses devices which aren't a multiple of the sector size
+		if perf.sector_size:
+			try:
+				size = _device_size(self.luks_dev_path)
+			except OSError:
+				size = 0
+
+			if size % perf.sector_size:
+				debug(f'{self.luks_dev_path} is not aligned to {perf.sector_size} byte sectors, using the default sector size')
+				return []
+
+		return perf.format_args()
+
 	def _get_passphrase_args(
 		self,
 		key_file: Path | None = None,
@@ -77,34 +248,36 @@ class Luks2:
 		debug(f'Luks2 encrypting: {self.luks_dev_path}')
 
 		key_file_arg, passphrase = self._get_passphrase_args(key_file)
-
-		cmd = [
-			'cryptsetup',
-			'--batch-mode',
-			'--verbose',
-			'--type',
-			'luks2',
-			'--pbkdf',
-			'argon2id',
-			'--hash',
-			hash_type,
-			'--key-size',
-			str(key_size),
-			'--iter-time',
-			str(iter_time),
-			*key_file_arg,
-			'--use-urandom',
-			'luksFormat',
-			str(self.luks_dev_path),
-		]
-
-		debug(f'cryptsetup format: {shlex.join(cmd)}')
+		memory = pbkdf_memory.reserve()
 
 		try:
+			cmd = [
+				'cryptsetup',
+				'--batch-mode',
+				'--verbose',
+				'--type',
+				'luks2',
+				'--pbkdf',
+				'argon2id',
+				'--hash',
+				hash_type,
+				'--key-size',
+				str(key_size),
+				*self._format_args(),
+				*self._pbkdf_args(iter_time, memory),
+				*key_file_arg,
+				'--use-urandom',
+				'luksFormat',
+				str(self.luks_dev_path),
+			]
+
+			debug(f'cryptsetup format: {shlex.join(cmd)}')
 			result = run(cmd, input_data=passphrase)
 		except CalledProcessError as err:
 			output = err.stdout.decode().rstrip()
 			raise DiskError(f'Could not encrypt volume "{self.luks_dev_path}": {output}')
+		finally:
+			pbkdf_memory.release(memory)
 
 		debug(f'cryptsetup luksFormat output: {result.stdout.decode().rstrip()}')
 
@@ -112,6 +285,33 @@ class Luks2:
 
 		return key_file
 
+	@staticmethod
+	def _pbkdf_args(iter_time: int, memory: int) -> list[str]:
+		if costs := pbkdf_benchmark.costs(iter_time, memory):
+			return costs.args()
+
+		# let cryptsetup benchmark, but within the same memory limits
+		return [
+			'--iter-time',
+			str(iter_time),
+			'--pbkdf-memory',
+			str(memory),
+			'--pbkdf-parallel',
+			str(_pbkdf_parallel()),
+		]
+
+	def _keyslot_memory(self) -> int | None:
+		"""
+		The largest argon2id memory cost in KiB of the key slots, an unlock may try all of them
+		"""
+		try:
+			output = SysCommand(['cryptsetup', 'luksDump', str(self.luks_dev_path)]).decode()
+		except SysCallError as err:
+			debug(f'Unable to read the key slots of {self.luks_dev_path}: {err}')
+			return None
+
+		return max((int(memory) for memory in re.findall(r'^\s*Memory:\s+(\d+)', output, re.MULTILINE)), default=None)
+
 	def _get_luks_uuid(self) -> str:
 		command = f'cryptsetup luksUUID {self.luks_dev_path}'
 
@@ -139,24 +339,39 @@ class Luks2:
 
 		key_file_arg, passphrase = self._get_passphrase_args(key_file)
 
+		# the options are stored in the header, so they also
+		# apply to any later activation of the device
+		if perf_args := self._perf().open_args():
+			perf_args.append('--persistent')
+
 		cmd = [
 			'cryptsetup',
 			'open',
 			str(self.luks_dev_path),
 			str(self.mapper_name),
 			*key_file_arg,
+			*perf_args,
 			'--type',
 			'luks2',
 		]
 
+		memory = pbkdf_memory.reserve(self._keyslot_memory())
+		started = time.time()
+
 		try:
 			result = run(cmd, input_data=passphrase)
 		except CalledProcessError as err:
 			output = err.stdout.decode().rstrip()
 			raise DiskError(f'Could not unlock luks2 device "{self.luks_dev_path}": {output}')
+		finally:
+			pbkdf_memory.release(memory)
 
 		debug(f'cryptsetup open output: {result.stdout.decode().rstrip()}')
 
+		# the mapper symlink is created by udev
+		if self.mapper_dev:
+			udev_sync([self.mapper_dev], since=started)
+
 		if not self.is_unlocked():
 			raise DiskError(f'Failed to open luks2 device: {self.luks_dev_path}')
 
@@ -206,7 +421,7 @@ class Luks2:
 		key_file.chmod(0o400)
 
 		self._add_key(key_file)
-		self._crypttab(crypttab_path, kf_path, options=['luks', 'key-slot=1'])
+		self._crypttab(crypttab_path, kf_path, options=['luks', 'key-slot=1', *self._perf().crypttab_options()])
 
 	def create_crypttab_entry(self, target_path: Path) -> None:
 		"""
@@ -218,19 +433,25 @@ class Luks2:
 
 		crypttab_path = target_path / 'etc/crypttab'
 		crypttab_path.parent.mkdir(parents=True, exist_ok=True)
-		self._crypttab(crypttab_path, Path('none'), options=['luks'])
+		self._crypttab(crypttab_path, Path('none'), options=['luks', *self._perf().crypttab_options()])
 
-	def _add_key(self, key_file: Path) -> None:
+	def _add_key(self, key_file: Path, iter_time: int = _KEYFILE_ITER_TIME) -> None:
 		debug(f'Adding additional key-file {key_file}')
 
-		command = f'cryptsetup -q -v luksAddKey {self.luks_dev_path} {key_file}'
-		worker = SysCommandWorker(command)
-		pw_injected = False
+		memory = pbkdf_memory.reserve()
 
-		while worker.is_alive():
-			if b'Enter any existing passphrase' in worker and pw_injected is False:
-				worker.write(self._password_bytes())
-				pw_injected = True
+		try:
+			pbkdf_args = ' '.join(self._pbkdf_args(iter_time, memory))
+			command = f'cryptsetup -q -v luksAddKey --pbkdf argon2id {pbkdf_args} {self.luks_dev_path} {key_file}'
+			worker = SysCommandWorker(command)
+			pw_injected = False
+
+			while worker.is_alive():
+				if b'Enter any existing passphrase' in worker and pw_injected is False:
+					worker.write(self._password_bytes())
+					pw_injected = True
+		finally:
+			pbkdf_memory.release(memory)
 
 		if worker.exit_code != 0:
 			raise DiskError(f'Could not add encryption key {key_file} to {self.luks_dev_path}: {worker.decode()}')
@@ -254,10 +475,34 @@ def unlock_luks2_dev(
 	dev_path: Path,
 	mapper_name: str,
 	enc_password: Password | None,
+	perf: DmCryptPerf | None = None,
 ) -> Luks2:
-	luks_handler = Luks2(dev_path, mapper_name=mapper_name, password=enc_password)
+	luks_handler = Luks2(dev_path, mapper_name=mapper_name, password=enc_password, perf=perf)
 
 	if not luks_handler.is_unlocked():
 		luks_handler.unlock()
 
 	return luks_handler
+
+
+def unlock_luks2_devs(
+	devs: list[tuple[Path, str]],
+	enc_password: Password | None,
+	perf: DmCryptPerf | None = None,
+) -> list[Luks2]:
+	"""
+	Unlocks several devices at once. Every unlock spends most of its time in
+	the memory hard key derivation, so as many run concurrently as the CPUs
+	allow. The derivations share the memory through pbkdf_memory, an unlock
+	waits while there isn't enough for its key slots.
+	"""
+	if not devs:
+		return []
+
+	by_cpu = (os.cpu_count() or 1) // _pbkdf_parallel()
+	workers = max(1, min(len(devs), by_cpu))
+
+	debug(f'Unlocking {len(devs)} luks2 devices, {workers} at a time')
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		return list(executor.map(lambda dev: unlock_luks2_dev(dev[0], dev[1], enc_password, perf), devs))
@@ -1,10 +1,12 @@
 import json
+import threading
 import time
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Literal, overload
 
 from archinstall.lib.command import SysCommand, SysCommandWorker
+from archinstall.lib.disk.udev import wait_for, wait_for_paths
 from archinstall.lib.disk.utils import udev_sync
 from archinstall.lib.exceptions import SysCallError
 from archinstall.lib.log import debug
@@ -19,11 +21,38 @@ from archinstall.lib.models.device import (
 	Unit,
 )
 
+_REPORT_FIELDS = {
+	'vg': 'vg_name,vg_uuid,vg_size,vg_exported',
+	'pv': 'pv_name,pv_uuid,vg_name',
+	'lv': 'lv_name,lv_uuid,vg_name,lv_size',
+	'pvseg': 'pv_uuid,lv_uuid',
+}
 
-def _lvm_info(
-	cmd: str,
-	info_type: Literal['lv', 'vg', 'pvseg'],
-) -> LvmVolumeInfo | LvmGroupInfo | LvmPVInfo | None:
+
+def _size(value: str) -> Size:
+	# sizes are reported as e.g. "1073741824B"
+	return Size(int(value.rstrip('B')), Unit.B, SectorSize.default())
+
+
+@dataclass
+class LvmReport:
+	vgs: list[dict[str, str]] = field(default_factory=list)
+	pvs: list[dict[str, str]] = field(default_factory=list)
+	lvs: list[dict[str, str]] = field(default_factory=list)
+	pvsegs: list[dict[str, str]] = field(default_factory=list)
+
+	def vg(self, vg_name: str) -> dict[str, str] | None:
+		return next((vg for vg in self.vgs if vg['vg_name'] == vg_name), None)
+
+	def lv(self, lv_name: str, vg_name: str | None = None) -> dict[str, str] | None:
+		return next((lv for lv in self.lvs if lv['lv_name'] == lv_name and vg_name in (None, lv['vg_name'])), None)
+
+	def pv_of_lv(self, lv_uuid: str) -> dict[str, str] | None:
+		pv_uuid = next((seg['pv_uuid'] for seg in self.pvsegs if seg['lv_uuid'] == lv_uuid), None)
+		return next((pv for pv in self.pvs if pv['pv_uuid'] == pv_uuid), None)
+
+
+def _lvm_json(cmd: list[str]) -> list[dict[str, list[dict[str, str]]]]:
 	raw_info = SysCommand(cmd).decode().split('\n')
 
 	# for whatever reason the output sometimes contains
@@ -32,82 +61,115 @@ def _lvm_info(
 
 	debug(f'LVM info: {data}')
 
-	reports = json.loads(data)
+	return json.loads(data)['report']
+
+
+def _fetch_lvm_report() -> LvmReport:
+	"""
+	Reads all VGs, PVs, LVs and PV segments, with "lvm fullreport" in a
+	single call or with one call per type on LVM versions without it
+	"""
+	report = LvmReport()
+	cmd = ['lvm', 'fullreport', '--reportformat', 'json', '--units', 'B']
+
+	for report_type, fields in _REPORT_FIELDS.items():
+		cmd += ['--configreport', report_type, '-o', fields]
 
-	for report in reports['report']:
-		if len(report[info_type]) != 1:
-			raise ValueError('Report does not contain any entry')
+	try:
+		reports = _lvm_json(cmd)
+	except SysCallError as err:
+		debug(f'lvm fullreport failed, querying each type separately: {err}')
+
+		reports = [
+			*_lvm_json(['vgs', '--reportformat', 'json', '--units', 'B', '-o', _REPORT_FIELDS['vg']]),
+			*_lvm_json(['pvs', '--reportformat', 'json', '--units', 'B', '-o', _REPORT_FIELDS['pv']]),
+			*_lvm_json(['lvs', '--reportformat', 'json', '--units', 'B', '-o', _REPORT_FIELDS['lv']]),
+			*_lvm_json(['pvs', '--segments', '--reportformat', 'json', '-o', _REPORT_FIELDS['pvseg']]),
+		]
+
+	# fullreport returns one report per VG, PVs without a VG end up in an extra one
+	for entry in reports:
+		report.vgs += entry.get('vg', [])
+		report.pvs += entry.get('pv', [])
+		report.lvs += entry.get('lv', [])
+		report.pvsegs += entry.get('pvseg', [])
+
+	return report
+
+
+class _LvmReportCache:
+	"""
+	The LVM state is read once and reused until LVM is modified, so a series of
+	queries between two modifications (a transaction) only calls LVM once. All
+	functions of this module that modify LVM invalidate the cache.
+	"""
 
-		entry = report[info_type][0]
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._report: LvmReport | None = None
 
-		match info_type:
-			case 'pvseg':
-				return LvmPVInfo(
-					pv_name=Path(entry['pv_name']),
-					lv_name=entry['lv_name'],
-					vg_name=entry['vg_name'],
-				)
-			case 'lv':
-				return LvmVolumeInfo(
-					lv_name=entry['lv_name'],
-					vg_name=entry['vg_name'],
-					lv_size=Size(int(entry['lv_size'][:-1]), Unit.B, SectorSize.default()),
-				)
-			case 'vg':
-				return LvmGroupInfo(
-					vg_uuid=entry['vg_uuid'],
-					vg_size=Size(int(entry['vg_size'][:-1]), Unit.B, SectorSize.default()),
-				)
+	def get(self) -> LvmReport:
+		with self._lock:
+			if self._report is None:
+				self._report = _fetch_lvm_report()
 
-	return None
+			return self._report
 
+	def invalidate(self) -> None:
+		with self._lock:
+			self._report = None
 
-@overload
-def _lvm_info_with_retry(cmd: str, info_type: Literal['lv']) -> LvmVolumeInfo | None: ...
 
+_lvm_report = _LvmReportCache()
 
-@overload
-def _lvm_info_with_retry(cmd: str, info_type: Literal['vg']) -> LvmGroupInfo | None: ...
 
+def _lvm_query[T](lookup: Callable[[LvmReport], T | None], timeout: float = 30) -> T | None:
+	"""
+	Looks up information in the LVM report. If it's not there yet, e.g. right after
+	creating a volume, the lookup is retried whenever udev reports a change.
+	"""
+	result = lookup(_lvm_report.get())
 
-@overload
-def _lvm_info_with_retry(cmd: str, info_type: Literal['pvseg']) -> LvmPVInfo | None: ...
+	if result is not None:
+		return result
 
+	def _found() -> bool:
+		nonlocal result
+		_lvm_report.invalidate()
+		result = lookup(_lvm_report.get())
+		return result is not None
 
-def _lvm_info_with_retry(
-	cmd: str,
-	info_type: Literal['lv', 'vg', 'pvseg'],
-) -> LvmVolumeInfo | LvmGroupInfo | LvmPVInfo | None:
-	# Retry for up to 5 mins
-	max_retries = 100
-	for attempt in range(max_retries):
-		try:
-			return _lvm_info(cmd, info_type)
-		except ValueError:
-			if attempt < max_retries - 1:
-				debug(f'LVM info query failed (attempt {attempt + 1}/{max_retries}), retrying in 3 seconds...')
-				time.sleep(3)
+	if wait_for({'lvm': _found}, timeout):
+		debug(f'LVM info query did not succeed within {timeout}s')
 
-	debug(f'LVM info query failed after {max_retries} attempts')
-	return None
+	return result
 
 
 def lvm_vol_info(lv_name: str) -> LvmVolumeInfo | None:
-	cmd = f'lvs --reportformat json --unit B -S lv_name={lv_name}'
+	def _lookup(report: LvmReport) -> LvmVolumeInfo | None:
+		if lv := report.lv(lv_name):
+			return LvmVolumeInfo(lv_name=lv['lv_name'], vg_name=lv['vg_name'], lv_size=_size(lv['lv_size']))
+		return None
 
-	return _lvm_info_with_retry(cmd, 'lv')
+	return _lvm_query(_lookup)
 
 
 def lvm_group_info(vg_name: str) -> LvmGroupInfo | None:
-	cmd = f'vgs --reportformat json --unit B -o vg_name,vg_uuid,vg_size -S vg_name={vg_name}'
+	def _lookup(report: LvmReport) -> LvmGroupInfo | None:
+		if vg := report.vg(vg_name):
+			return LvmGroupInfo(vg_uuid=vg['vg_uuid'], vg_size=_size(vg['vg_size']))
+		return None
 
-	return _lvm_info_with_retry(cmd, 'vg')
+	return _lvm_query(_lookup)
 
 
 def lvm_pvseg_info(vg_name: str, lv_name: str) -> LvmPVInfo | None:
-	cmd = f'pvs --segments -o+lv_name,vg_name -S vg_name={vg_name},lv_name={lv_name} --reportformat json '
+	def _lookup(report: LvmReport) -> LvmPVInfo | None:
+		if (lv := report.lv(lv_name, vg_name)) and (pv := report.pv_of_lv(lv['lv_uuid'])):
+			return LvmPVInfo(pv_name=Path(pv['pv_name']), lv_name=lv_name, vg_name=vg_name)
+		return None
 
-	return _lvm_info_with_retry(cmd, 'pvseg')
+	return _lvm_query(_lookup)
 
 
 def lvm_vol_change(vol: LvmVolume, activate: bool) -> None:
@@ -116,6 +178,7 @@ def lvm_vol_change(vol: LvmVolume, activate: bool) -> None:
 
 	debug(f'lvchange volume: {cmd}')
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 
 def lvm_export_vg(vg: LvmVolumeGroup) -> None:
@@ -123,27 +186,29 @@ def lvm_export_vg(vg: LvmVolumeGroup) -> None:
 
 	debug(f'vgexport: {cmd}')
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 
 def lvm_import_vg(vg: LvmVolumeGroup) -> None:
 	# Check if the VG is actually exported before trying to import it
-	check_cmd = f'vgs --noheadings -o vg_exported {vg.name}'
-
 	try:
-		result = SysCommand(check_cmd)
-		is_exported = result.decode().strip() == 'exported'
+		vg_info = _lvm_report.get().vg(vg.name)
 	except SysCallError:
+		vg_info = None
+
+	if vg_info is None:
 		# VG might not exist yet, skip import
 		debug(f'Volume group {vg.name} not found, skipping import')
 		return
 
-	if not is_exported:
+	if vg_info['vg_exported'] != 'exported':
 		debug(f'Volume group {vg.name} is already active (not exported), skipping import')
 		return
 
 	cmd = f'vgimport {vg.name}'
 	debug(f'vgimport: {cmd}')
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 
 def lvm_vol_reduce(vol_path: Path, amount: Size) -> None:
@@ -152,18 +217,21 @@ def lvm_vol_reduce(vol_path: Path, amount: Size) -> None:
 
 	debug(f'Reducing LVM volume size: {cmd}')
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 
 def lvm_pv_create(pvs: Iterable[Path]) -> None:
 	pvs_str = ' '.join(str(pv) for pv in pvs)
-	# Signatures are already wiped by wipefs, -f is just for safety
+	# Signatures are already wiped after partitioning, -f is just for safety
 	cmd = f'pvcreate -f --yes {pvs_str}'
 	# note flags used in scripting
 	debug(f'Creating LVM PVS: {cmd}')
+	started = time.time()
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 	# Sync with udev to ensure the PVs are visible
-	udev_sync()
+	udev_sync(list(pvs), since=started)
 
 
 def lvm_vg_create(pvs: Iterable[Path], vg_name: str) -> None:
@@ -171,10 +239,12 @@ def lvm_vg_create(pvs: Iterable[Path], vg_name: str) -> None:
 	cmd = f'vgcreate --yes --force {vg_name} {pvs_str}'
 
 	debug(f'Creating LVM group: {cmd}')
+	started = time.time()
 	SysCommand(cmd)
+	_lvm_report.invalidate()
 
 	# Sync with udev to ensure the VG is visible
-	udev_sync()
+	udev_sync(list(pvs), since=started)
 
 
 def lvm_vol_create(vg_name: str, volume: LvmVolume, offset: Size | None = None) -> None:
@@ -192,5 +262,14 @@ def lvm_vol_create(vg_name: str, volume: LvmVolume, offset: Size | None = None)
 	worker.poll()
 	worker.write(b'y\n', line_ending=False)
 
+	while worker.is_alive():
+		worker.poll(None)
+
+	_lvm_report.invalidate()
+
 	volume.vg_name = vg_name
 	volume.dev_path = Path(f'/dev/{vg_name}/{volume.name}')
+
+	# the device node of the volume is created by udev
+	if missing := wait_for_paths([volume.dev_path]):
+		debug(f'LVM volume device did not show up: {missing}')
@@ -0,0 +1,355 @@
+import json
+import shlex
+from dataclasses import dataclass, field
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import NotRequired, TypedDict
+
+from archinstall.lib.command import SysCommand, run
+from archinstall.lib.exceptions import DiskError, SysCallError
+from archinstall.lib.log import debug
+from archinstall.lib.models.device import (
+	DeviceModification,
+	FilesystemType,
+	ModificationStatus,
+	PartitionFlag,
+	PartitionGUID,
+	PartitionModification,
+	PartitionTable,
+	PartitionType,
+)
+
+# partitions are aligned to 1 MiB, the same as the optimal alignment of libparted
+_ALIGNMENT = 1024 * 1024
+# the GPT partition entry array holds 128 entries of 128 bytes
+_GPT_ENTRIES_SIZE = 128 * 128
+_MBR_MAX_PARTITIONS = 4
+
+# MBR partition type codes
+_MBR_LINUX = '83'
+_MBR_SWAP = '82'
+_MBR_ESP = 'ef'
+_MBR_XBOOTLDR = 'ea'
+_MBR_NTFS = '7'
+_MBR_FAT = {
+	FilesystemType.FAT12: '1',
+	FilesystemType.FAT16: '6',
+	FilesystemType.FAT32: 'c',
+}
+
+# the names of the partition table labels in sfdisk
+_SFDISK_LABELS = {
+	PartitionTable.GPT: 'gpt',
+	PartitionTable.MBR: 'dos',
+}
+
+
+class _SfdiskPartition(TypedDict):
+	node: str
+	start: int
+	size: int
+	type: str
+	bootable: NotRequired[bool]
+	uuid: NotRequired[str]
+	name: NotRequired[str]
+	attrs: NotRequired[str]
+
+
+class _SfdiskTable(TypedDict):
+	label: str
+	id: NotRequired[str]
+	sectorsize: NotRequired[int]
+	partitions: NotRequired[list[_SfdiskPartition]]
+
+
+def _partition_path(dev_path: Path, number: int) -> Path:
+	# e.g. /dev/sda1, but /dev/nvme0n1p1 and /dev/mmcblk0p1
+	separator = 'p' if dev_path.name[-1].isdigit() else ''
+	return dev_path.with_name(f'{dev_path.name}{separator}{number}')
+
+
+@dataclass
+class PlannedPartition:
+	number: int
+	# in sectors
+	start: int
+	size: int
+	# a GPT type GUID or an MBR type code
+	type: str
+	bootable: bool = False
+	uuid: str | None = None
+	name: str | None = None
+	attrs: str | None = None
+	# None for existing partitions which are kept as they are
+	part_mod: PartitionModification | None = field(default=None, repr=False)
+
+	@property
+	def end(self) -> int:
+		return self.start + self.size
+
+	def script_line(self, dev_path: Path) -> str:
+		fields = [f'start={self.start}', f'size={self.size}', f'type={self.type}']
+
+		if self.uuid:
+			fields.append(f'uuid={self.uuid}')
+		if self.name:
+			fields.append(f'name={json.dumps(self.name)}')
+		if self.attrs:
+			fields.append(f'attrs={json.dumps(self.attrs)}')
+		if self.bootable:
+			fields.append('bootable')
+
+		return f'{_partition_path(dev_path, self.number)} : {", ".join(fields)}'
+
+
+@dataclass
+class PartitionPlan:
+	"""
+	The complete partition table of a device, computed in sectors and written
+	at once with a single sfdisk call instead of adding the partitions one by
+	one through libparted. sfdisk informs the kernel about the changed
+	partitions, with BLKPG if the device is in use.
+	"""
+
+	dev_path: Path
+	table: PartitionTable
+	sector_size: int
+	total_sectors: int
+	partitions: list[PlannedPartition] = field(default_factory=list)
+	# the disk identifier of an existing partition table, which is kept
+	label_id: str | None = None
+
+	@property
+	def _gpt_entries_sectors(self) -> int:
+		return -(-_GPT_ENTRIES_SIZE // self.sector_size)
+
+	@property
+	def first_usable(self) -> int:
+		if self.table.is_gpt():
+			# protective MBR, GPT header and the partition entries
+			return 2 + self._gpt_entries_sectors
+		return 1
+
+	@property
+	def last_usable(self) -> int:
+		if self.table.is_gpt():
+			# the backup partition entries and GPT header
+			return self.total_sectors - 2 - self._gpt_entries_sectors
+		return self.total_sectors - 1
+
+	def validate(self) -> None:
+		"""
+		Checks all partitions in one pass over the partitions sorted by their start
+		"""
+		if self.table.is_mbr() and len(self.partitions) > _MBR_MAX_PARTITIONS:
+			raise DiskError(f'Too many partitions on {self.dev_path}, MBR disks can only have {_MBR_MAX_PARTITIONS} primary partitions')
+
+		numbers = [part.number for part in self.partitions]
+
+		if len(numbers) != len(set(numbers)):
+			raise DiskError(f'Duplicate partition numbers on {self.dev_path}: {numbers}')
+
+		previous: PlannedPartition | None = None
+
+		for part in sorted(self.partitions, key=lambda p: p.start):
+			if part.size <= 0:
+				raise DiskError(f'Partition {part.number} on {self.dev_path} has no size')
+
+			if part.start < self.first_usable or part.end - 1 > self.last_usable:
+				raise DiskError(
+					f'Partition {part.number} on {self.dev_path} (sectors {part.start}-{part.end - 1}) '
+					f'is outside of the usable sectors {self.first_usable}-{self.last_usable}'
+				)
+
+			if previous and part.start < previous.end:
+				raise DiskError(f'Partitions {previous.number} and {part.number} on {self.dev_path} overlap')
+
+			previous = part
+
+	def script(self) -> str:
+		lines = [f'label: {_SFDISK_LABELS[self.table]}']
+
+		if self.label_id:
+			lines.append(f'label-id: {self.label_id}')
+
+		lines += ['unit: sectors', '']
+		lines += [part.script_line(self.dev_path) for part in sorted(self.partitions, key=lambda p: p.number)]
+
+		return '\n'.join(lines) + '\n'
+
+	def write(self) -> None:
+		self.validate()
+
+		script = self.script()
+		# the lock keeps udev from probing the device while it is being written
+		cmd = ['sfdisk', '--lock', '--wipe', 'never', '--wipe-partitions', 'never', str(self.dev_path)]
+
+		debug(f'Writing partition table: {shlex.join(cmd)}\n{script}')
+
+		try:
+			result = run(cmd, input_data=script.encode())
+		except CalledProcessError as err:
+			output = err.stdout.decode().rstrip()
+			raise DiskError(f'Could not write the partition table of {self.dev_path}: {output}')
+
+		debug(f'sfdisk output: {result.stdout.decode().rstrip()}')
+
+		for part in self.partitions:
+			if part.part_mod is not None:
+				part.part_mod.dev_path = _partition_path(self.dev_path, part.number)
+				part.part_mod.partn = part.number
+
+
+def _read_table(dev_path: Path) -> _SfdiskTable | None:
+	try:
+		output = SysCommand(['sfdisk', '--json', str(dev_path)]).decode()
+	except SysCallError as err:
+		debug(f'Unable to read the partition table of {dev_path}: {err}')
+		return None
+
+	table: _SfdiskTable | None = json.loads(output).get('partitiontable')
+	return table
+
+
+def _gpt_type(part_mod: PartitionModification) -> str:
+	flags = part_mod.flags
+
+	if PartitionFlag.ESP in flags or PartitionFlag.BOOT in flags:
+		return PartitionGUID.EFI_SYSTEM.value
+	if PartitionFlag.XBOOTLDR in flags:
+		return PartitionGUID.XBOOTLDR.value
+	if PartitionFlag.SWAP in flags or part_mod.is_swap():
+		return PartitionGUID.LINUX_SWAP.value
+	if part_mod.is_root():
+		return PartitionGUID.LINUX_ROOT_X86_64.value
+	if PartitionFlag.LINUX_HOME in flags or part_mod.is_home():
+		return PartitionGUID.LINUX_HOME.value
+	if part_mod.fs_type and (part_mod.fs_type.is_fat() or part_mod.fs_type == FilesystemType.NTFS):
+		return PartitionGUID.BASIC_DATA.value
+
+	return PartitionGUID.LINUX_FILESYSTEM.value
+
+
+def _mbr_type(part_mod: PartitionModification) -> str:
+	flags = part_mod.flags
+
+	if PartitionFlag.ESP in flags:
+		return _MBR_ESP
+	if PartitionFlag.XBOOTLDR in flags:
+		return _MBR_XBOOTLDR
+	if PartitionFlag.SWAP in flags or part_mod.is_swap():
+		return _MBR_SWAP
+	if part_mod.fs_type and part_mod.fs_type in _MBR_FAT:
+		return _MBR_FAT[part_mod.fs_type]
+	if part_mod.fs_type == FilesystemType.NTFS:
+		return _MBR_NTFS
+
+	return _MBR_LINUX
+
+
+def _existing_partitions(table: _SfdiskTable, dev_path: Path) -> list[PlannedPartition]:
+	partitions: list[PlannedPartition] = []
+	prefix = _partition_path(dev_path, 0).name[:-1]
+
+	for entry in table.get('partitions', []):
+		partitions.append(
+			PlannedPartition(
+				number=int(Path(entry['node']).name.removeprefix(prefix)),
+				start=entry['start'],
+				size=entry['size'],
+				type=entry['type'],
+				bootable=entry.get('bootable', False),
+				uuid=entry.get('uuid'),
+				name=entry.get('name'),
+				attrs=entry.get('attrs'),
+			)
+		)
+
+	return partitions
+
+
+def plan_partitions(modification: DeviceModification, partition_table: PartitionTable) -> PartitionPlan | None:
+	"""
+	Computes the partition table of a device after the modification.
+	Returns None for layouts which can only be created with libparted,
+	e.g. logical partitions or a device without a partition table.
+	"""
+	device_info = modification.device.device_info
+	dev_path = device_info.path
+	sector_size = device_info.sector_size
+	alignment = max(_ALIGNMENT // sector_size.normalize(), 1)
+
+	plan = PartitionPlan(
+		dev_path=dev_path,
+		table=partition_table,
+		sector_size=sector_size.normalize(),
+		total_sectors=device_info.total_size.sectors(sector_size),
+	)
+
+	if any(part_mod.type == PartitionType._UNKNOWN for part_mod in modification.partitions):
+		debug(f'Unsupported partition types on {dev_path}')
+		return None
+
+	if not modification.wipe:
+		if (table := _read_table(dev_path)) is None:
+			return None
+
+		match table.get('label'):
+			case 'gpt':
+				plan.table = PartitionTable.GPT
+			case 'dos':
+				plan.table = PartitionTable.MBR
+			case label:
+				debug(f'Unsupported partition table on {dev_path}: {label}')
+				return None
+
+		if table.get('sectorsize', plan.sector_size) != plan.sector_size:
+			return None
+
+		plan.label_id = table.get('id')
+		existing = _existing_partitions(table, dev_path)
+
+		# the extended and logical partitions of MBR are left to libparted
+		if plan.table.is_mbr() and any(part.number > _MBR_MAX_PARTITIONS for part in existing):
+			debug(f'Logical partitions on {dev_path}')
+			return None
+
+		# partitions which get deleted or recreated
+		removed = {part_mod.safe_dev_path for part_mod in modification.partitions if part_mod.status in (ModificationStatus.MODIFY, ModificationStatus.DELETE)}
+		plan.partitions = [part for part in existing if _partition_path(dev_path, part.number) not in removed]
+
+	numbers = {part.number for part in plan.partitions}
+	next_number = 1
+
+	for part_mod in modification.partitions:
+		if part_mod.exists() or part_mod.is_delete():
+			continue
+
+		# recreated partitions keep their number
+		if not modification.wipe and part_mod.is_modify() and part_mod.partn:
+			number = part_mod.partn
+		else:
+			while next_number in numbers:
+				next_number += 1
+			number = next_number
+
+		numbers.add(number)
+
+		start = part_mod.start.sectors(sector_size)
+		# round up to the next aligned sector, the partition is shrunk by
+		# the shift so it still ends where it was meant to end
+		aligned_start = -(-start // alignment) * alignment
+		size = part_mod.length.sectors(sector_size) - (aligned_start - start)
+
+		plan.partitions.append(
+			PlannedPartition(
+				number=number,
+				start=aligned_start,
+				size=size,
+				type=_gpt_type(part_mod) if plan.table.is_gpt() else _mbr_type(part_mod),
+				bootable=plan.table.is_mbr() and PartitionFlag.BOOT in part_mod.flags,
+				part_mod=part_mod,
+			)
+		)
+
+	return plan
@@ -10,6 +10,7 @@ from archinstall.lib.models.device import (
 	BtrfsMountOption,
 	DeviceModification,
 	FilesystemType,
+	FsProfile,
 	ModificationStatus,
 	PartitionFlag,
 	PartitionModification,
@@ -97,6 +98,7 @@ class PartitioningList(ListManager[DiskSegment]):
 		self._actions.update(
 			{
 				'set_filesystem': tr('Change filesystem'),
+				'set_fs_profile': tr('Set filesystem profile'),
 				'btrfs_mark_compressed': tr('Mark/Unmark as compressed'),  # btrfs only
 				'btrfs_mark_nodatacow': tr('Mark/Unmark as nodatacow'),  # btrfs only
 				'btrfs_set_subvolumes': tr('Set subvolumes'),  # btrfs only
@@ -241,6 +243,7 @@ class PartitioningList(ListManager[DiskSegment]):
 				# how do we know it was the original one?
 				not_filter += [
 					self._actions['set_filesystem'],
+					self._actions['set_fs_profile'],
 					self._actions['mark_bootable'],
 				]
 				if self._using_gpt:
@@ -254,6 +257,9 @@ class PartitioningList(ListManager[DiskSegment]):
 					self._actions['btrfs_set_subvolumes'],
 				]
 
+			if selection.segment.is_swap() or (selection.segment.fs_type and selection.segment.fs_type.is_fat()):
+				not_filter += [self._actions['set_fs_profile']]
+
 			# non btrfs partitions shouldn't get btrfs options
 			if selection.segment.fs_type != FilesystemType.BTRFS:
 				not_filter += [
@@ -334,6 +340,9 @@ class PartitioningList(ListManager[DiskSegment]):
 					# btrfs subvolumes will define mountpoints
 					if fs_type == FilesystemType.BTRFS:
 						partition.mountpoint = None
+				case 'set_fs_profile':
+					if (profile := await self._prompt_fs_profile(partition.fs_profile)) is not None:
+						partition.fs_profile = profile
 				case 'btrfs_mark_compressed':
 					self._toggle_mount_option(partition, BtrfsMountOption.compress)
 				case 'btrfs_mark_nodatacow':
@@ -433,6 +442,26 @@ class PartitioningList(ListManager[DiskSegment]):
 			case _:
 				raise ValueError('Unhandled result type')
 
+	async def _prompt_fs_profile(self, preset: FsProfile) -> FsProfile | None:
+		header = tr('The filesystem and mount options are tuned to the device for the selected profile') + '\n'
+		items = [MenuItem(profile.display_msg(), value=profile) for profile in FsProfile]
+		group = MenuItemGroup(items, sort_items=False)
+		group.set_focus_by_value(preset)
+
+		result = await Selection[FsProfile](
+			group,
+			header=header,
+			allow_skip=True,
+		).show()
+
+		match result.type_:
+			case ResultType.Selection:
+				return result.get_value()
+			case ResultType.Skip:
+				return None
+			case _:
+				raise ValueError('Unhandled result type')
+
 	def _validate_value(
 		self,
 		sector_size: SectorSize,
@@ -0,0 +1,229 @@
+import select
+import socket
+import struct
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import TracebackType
+from typing import Self
+
+# netlink protocol of the kernel uevents and the multicast groups on it
+_NETLINK_KOBJECT_UEVENT = 15
+_GROUP_KERNEL = 1
+_GROUP_UDEV = 2
+
+# struct udev_monitor_netlink_header from libudev
+_UDEV_HEADER_PREFIX = b'libudev\0'
+_UDEV_HEADER_MAGIC = 0xFEEDCAFE
+_UDEV_HEADER = struct.Struct('=8sIIII')
+
+
+def parse_uevent(data: bytes) -> dict[str, str] | None:
+	"""
+	Parses a message received on the uevent netlink socket, either one sent
+	by udev after it processed an event or a raw event sent by the kernel.
+	Returns None for anything that isn't a valid event.
+	"""
+	if data.startswith(_UDEV_HEADER_PREFIX):
+		if len(data) < _UDEV_HEADER.size:
+			return None
+
+		_prefix, magic, _header_size, properties_off, properties_len = _UDEV_HEADER.unpack_from(data)
+
+		# the magic is the only field sent in network byte order
+		if socket.ntohl(magic) != _UDEV_HEADER_MAGIC:
+			return None
+
+		properties = data[properties_off : properties_off + properties_len]
+	else:
+		# kernel events are prefixed with "<action>@<devpath>"
+		header, _, properties = data.partition(b'\0')
+
+		if b'@' not in header:
+			return None
+
+	event: dict[str, str] = {}
+
+	for entry in properties.split(b'\0'):
+		key, sep, value = entry.partition(b'=')
+
+		if sep:
+			event[key.decode(errors='replace')] = value.decode(errors='replace')
+
+	return event if 'ACTION' in event and 'DEVPATH' in event else None
+
+
+class UdevMonitor:
+	"""
+	Receives device events without blocking. By default only events which udev
+	finished processing are received, at which point the udev database (and so
+	lsblk) reflects the change.
+	"""
+
+	def __init__(self, subsystem: str | None = None, kernel: bool = False) -> None:
+		self.subsystem = subsystem
+		self._socket = socket.socket(
+			socket.AF_NETLINK,
+			socket.SOCK_RAW | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+			_NETLINK_KOBJECT_UEVENT,
+		)
+
+		try:
+			self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+			# a port id of 0 lets the kernel assign one
+			self._socket.bind((0, _GROUP_KERNEL if kernel else _GROUP_UDEV))
+		except OSError:
+			self._socket.close()
+			raise
+
+	def __enter__(self) -> Self:
+		return self
+
+	def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> None:
+		self.close()
+
+	def fileno(self) -> int:
+		return self._socket.fileno()
+
+	def wait(self, timeout: float) -> list[dict[str, str]] | None:
+		"""
+		Waits up to ``timeout`` seconds for events and returns them
+		"""
+		select.select([self._socket], [], [], max(timeout, 0))
+		return self.read_events()
+
+	def read_events(self) -> list[dict[str, str]] | None:
+		"""
+		Returns all pending events, or None if events got lost because
+		they weren't read fast enough.
+		"""
+		events = []
+
+		while True:
+			try:
+				data = self._socket.recv(64 * 1024)
+			except BlockingIOError:
+				return events
+			except OSError:
+				# ENOBUFS, the receive buffer overflowed
+				return None
+
+			if (event := parse_uevent(data)) is None:
+				continue
+
+			if self.subsystem and event.get('SUBSYSTEM') != self.subsystem:
+				continue
+
+			events.append(event)
+
+	def close(self) -> None:
+		self._socket.close()
+
+
+class MountMonitor:
+	"""
+	Tells whether the mount table changed since the last check,
+	the kernel signals this on the mountinfo file.
+	"""
+
+	def __init__(self, mountinfo: Path = Path('/proc/self/mountinfo')) -> None:
+		self._file = mountinfo.open('rb')
+		self._poll = select.poll()
+		self._poll.register(self._file, select.POLLPRI | select.POLLERR)
+
+	def changed(self) -> bool:
+		if not self._poll.poll(0):
+			return False
+
+		# the file has to be read again to re-arm the notification
+		self._file.seek(0)
+		self._file.read()
+		return True
+
+	def close(self) -> None:
+		self._file.close()
+
+
+def wait_for(conditions: dict[str, Callable[[], bool]], timeout: float = 10) -> list[str]:
+	"""
+	Waits until all conditions are met, e.g. a device node or a symlink like
+	/dev/disk/by-uuid/<uuid> exists or a udev property got a certain value.
+	The conditions are checked again after every udev event.
+
+	Returns the names of the conditions that weren't met within the timeout.
+	"""
+	try:
+		monitor: UdevMonitor | None = UdevMonitor()
+	except OSError:
+		monitor = None
+
+	deadline = time.monotonic() + timeout
+	pending = dict(conditions)
+
+	try:
+		while True:
+			pending = {name: condition for name, condition in pending.items() if not condition()}
+
+			if not pending or (remaining := deadline - time.monotonic()) <= 0:
+				return list(pending)
+
+			# without events the conditions are polled, otherwise
+			# they're checked from time to time just to be safe
+			if monitor:
+				monitor.wait(min(remaining, 1))
+			else:
+				time.sleep(min(remaining, 0.1))
+	finally:
+		if monitor:
+			monitor.close()
+
+
+def wait_for_paths(paths: list[Path], timeout: float = 10) -> list[Path]:
+	"""
+	Waits until the given device nodes or symlinks exist,
+	returns the paths that didn't show up within the timeout
+	"""
+	missing = wait_for({str(path): path.exists for path in paths}, timeout)
+	return [Path(path) for path in missing]
+
+
+def udev_property(dev_path: Path, name: str) -> str | None:
+	"""
+	Reads a property of a device from the udev database
+	"""
+	try:
+		dev = Path('/sys/class/block', dev_path.resolve().name, 'dev').read_text().strip()
+		data = Path('/run/udev/data', f'b{dev}').read_text()
+	except OSError:
+		return None
+
+	for line in data.splitlines():
+		if line.startswith(f'E:{name}='):
+			return line.split('=', 1)[1]
+
+	return None
+
+
+def udev_processed(dev_path: Path, since: float = 0) -> bool:
+	"""
+	Tells whether udev processed the current state of a device: its node
+	exists and its udev database entry was written after ``since``. The entry
+	of a partition has to match its offset and the one of a device mapper
+	device its name, so an entry left by an earlier device doesn't count.
+	"""
+	try:
+		sysfs = Path('/sys/class/block', dev_path.resolve(strict=True).name)
+		dev = (sysfs / 'dev').read_text().strip()
+
+		if Path('/run/udev/data', f'b{dev}').stat().st_mtime < since:
+			return False
+
+		if (sysfs / 'partition').exists():
+			return udev_property(dev_path, 'ID_PART_ENTRY_OFFSET') == (sysfs / 'start').read_text().strip()
+
+		if (sysfs / 'dm').exists():
+			return udev_property(dev_path, 'DM_NAME') == (sysfs / 'dm' / 'name').read_text().strip()
+	except OSError:
+		return False
+
+	return True
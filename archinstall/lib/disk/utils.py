@@ -1,8 +1,11 @@
+import threading
+from functools import partial
 from pathlib import Path
 
 from pydantic import BaseModel
 
 from archinstall.lib.command import SysCommand
+from archinstall.lib.disk.udev import MountMonitor, UdevMonitor, udev_processed, wait_for
 from archinstall.lib.exceptions import DiskError, SysCallError
 from archinstall.lib.log import debug, info, warn
 from archinstall.lib.models.device import LsblkInfo
@@ -13,7 +16,7 @@ class LsblkOutput(BaseModel):
 
 
 def _fetch_lsblk_info(
-	dev_path: Path | str | None = None,
+	dev_path: Path | str | list[Path] | None = None,
 	reverse: bool = False,
 	full_dev_path: bool = False,
 ) -> LsblkOutput:
@@ -25,7 +28,9 @@ def _fetch_lsblk_info(
 	if full_dev_path:
 		cmd.append('--paths')
 
-	if dev_path:
+	if isinstance(dev_path, list):
+		cmd += [str(path) for path in dev_path]
+	elif dev_path:
 		cmd.append(str(dev_path))
 
 	try:
@@ -44,11 +49,198 @@ def _fetch_lsblk_info(
 	return LsblkOutput.model_validate_json(output)
 
 
+class _LsblkCache:
+	"""
+	The lsblk output of all block devices, indexed by path, UUID, PARTUUID,
+	mountpoint and parent name.
+
+	Instead of calling lsblk for every lookup, the cache follows the events of
+	udev and on the next lookup only re-reads the disks which received one.
+	Changes to the mount table are not announced through udev, those cause a
+	full refresh. If the udev events can't be received, e.g. without
+	permissions, every lookup reads the topology again.
+
+	fsavail and fsuse% are not kept up to date, use :py:func:`get_lsblk_output` for those.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.RLock()
+		self._devices: list[LsblkInfo] | None = None
+		self._dirty_disks: set[str] = set()
+		self._started = False
+		self._udev: UdevMonitor | None = None
+		self._mounts: MountMonitor | None = None
+
+		self._by_path: dict[Path, LsblkInfo] = {}
+		self._by_uuid: dict[str, list[LsblkInfo]] = {}
+		self._by_partuuid: dict[str, LsblkInfo] = {}
+		self._by_mountpoint: dict[Path, list[LsblkInfo]] = {}
+		self._by_pkname: dict[str, list[LsblkInfo]] = {}
+
+	def _start(self) -> None:
+		self._started = True
+
+		try:
+			# the monitors have to exist before the first read, so no change can get lost in between
+			self._udev = UdevMonitor(subsystem='block')
+			self._mounts = MountMonitor()
+		except OSError as err:
+			debug(f'Unable to monitor block device changes, not caching lsblk: {err}')
+
+			if self._udev:
+				self._udev.close()
+				self._udev = None
+
+	def _process_events(self) -> None:
+		if not self._started:
+			self._start()
+
+		if self._udev is None or self._mounts is None:
+			self._devices = None
+			return
+
+		if self._mounts.changed():
+			self._devices = None
+
+		if (events := self._udev.read_events()) is None:
+			debug('Lost udev events, refreshing all block devices')
+			self._devices = None
+			return
+
+		for event in events:
+			devpath = Path(event['DEVPATH'])
+			disk = devpath.parent.name if event.get('DEVTYPE') == 'partition' else devpath.name
+
+			# stacked devices (device mapper, raid) show up below all of their parents
+			if disk.startswith(('dm-', 'md')):
+				self._devices = None
+			else:
+				self._dirty_disks.add(disk)
+
+	def _refresh(self) -> None:
+		self._process_events()
+
+		if self._devices is not None and not self._dirty_disks:
+			return
+
+		if self._devices is not None:
+			try:
+				self._devices = self._refresh_disks(self._devices, self._dirty_disks)
+			except DiskError as err:
+				debug(f'Partial lsblk refresh failed, refreshing all block devices: {err}')
+				self._devices = None
+
+		if self._devices is None:
+			self._devices = _fetch_lsblk_info().blockdevices
+
+		self._dirty_disks = set()
+		self._build_indexes()
+
+	def _refresh_disks(self, devices: list[LsblkInfo], disks: set[str]) -> list[LsblkInfo]:
+		existing = sorted(disk for disk in disks if Path('/sys/class/block', disk).exists())
+		fetched = {lsblk_info.name: lsblk_info for lsblk_info in _fetch_lsblk_info([Path('/dev', disk) for disk in existing]).blockdevices} if existing else {}
+
+		refreshed = []
+
+		for device in devices:
+			if device.name not in disks:
+				refreshed.append(device)
+			elif device.name in fetched:
+				refreshed.append(fetched.pop(device.name))
+
+		# newly added disks
+		return refreshed + list(fetched.values())
+
+	def _build_indexes(self) -> None:
+		self._by_path = {}
+		self._by_uuid = {}
+		self._by_partuuid = {}
+		self._by_mountpoint = {}
+		self._by_pkname = {}
+
+		def _index(infos: list[LsblkInfo]) -> None:
+			for lsblk_info in infos:
+				self._by_path.setdefault(lsblk_info.path, lsblk_info)
+				# e.g. /dev/dm-0 for /dev/mapper/root
+				self._by_path.setdefault(lsblk_info.path.resolve(), lsblk_info)
+
+				if lsblk_info.uuid:
+					self._by_uuid.setdefault(lsblk_info.uuid, []).append(lsblk_info)
+
+				if lsblk_info.partuuid:
+					self._by_partuuid.setdefault(lsblk_info.partuuid, lsblk_info)
+
+				for mountpoint in lsblk_info.mountpoints:
+					self._by_mountpoint.setdefault(mountpoint, []).append(lsblk_info)
+
+				if lsblk_info.pkname:
+					self._by_pkname.setdefault(lsblk_info.pkname, []).append(lsblk_info)
+
+				_index(lsblk_info.children)
+
+		assert self._devices is not None
+		_index(self._devices)
+
+	def all(self) -> list[LsblkInfo]:
+		with self._lock:
+			self._refresh()
+			assert self._devices is not None
+			return list(self._devices)
+
+	def by_path(self, path: Path) -> LsblkInfo | None:
+		with self._lock:
+			self._refresh()
+			return self._by_path.get(path) or self._by_path.get(path.resolve())
+
+	def by_uuid(self, uuid: str) -> list[LsblkInfo]:
+		with self._lock:
+			self._refresh()
+			return list(self._by_uuid.get(uuid, []))
+
+	def by_partuuid(self, partuuid: str) -> LsblkInfo | None:
+		with self._lock:
+			self._refresh()
+			return self._by_partuuid.get(partuuid)
+
+	def by_mountpoint(self, mountpoint: Path, as_prefix: bool = False) -> list[LsblkInfo]:
+		with self._lock:
+			self._refresh()
+
+			if not as_prefix:
+				return list(self._by_mountpoint.get(mountpoint, []))
+
+			devices: list[LsblkInfo] = []
+
+			for path, mounted in self._by_mountpoint.items():
+				if str(path).startswith(str(mountpoint)):
+					devices += [lsblk_info for lsblk_info in mounted if lsblk_info not in devices]
+
+			return devices
+
+	def by_pkname(self, pkname: str) -> list[LsblkInfo]:
+		with self._lock:
+			self._refresh()
+			return list(self._by_pkname.get(pkname, []))
+
+
+_lsblk_cache = _LsblkCache()
+
+
 def get_lsblk_info(
 	dev_path: Path | str,
 	reverse: bool = False,
 	full_dev_path: bool = False,
 ) -> LsblkInfo:
+	# the cache only holds the regular tree with kernel names
+	if not reverse and not full_dev_path:
+		path = Path(dev_path)
+
+		if lsblk_info := _lsblk_cache.by_path(path):
+			return lsblk_info
+
+		if mounted := _lsblk_cache.by_mountpoint(path):
+			return mounted[0]
+
 	infos = _fetch_lsblk_info(dev_path, reverse=reverse, full_dev_path=full_dev_path)
 
 	if infos.blockdevices:
@@ -57,8 +249,39 @@ def get_lsblk_info(
 	raise DiskError(f'lsblk failed to retrieve information for "{dev_path}"')
 
 
+def get_lsblk_infos(dev_paths: list[Path]) -> dict[Path, LsblkInfo]:
+	"""
+	Fetches the information of several devices, anything that's not
+	cached is read with a single lsblk call.
+	"""
+	lsblk_infos: dict[Path, LsblkInfo] = {}
+
+	for path in dev_paths:
+		if lsblk_info := _lsblk_cache.by_path(path):
+			lsblk_infos[path] = lsblk_info
+
+	if missing := [path for path in dev_paths if path not in lsblk_infos]:
+		infos = _fetch_lsblk_info(missing).blockdevices
+
+		if len(infos) != len(missing):
+			raise DiskError(f'lsblk failed to retrieve information for all of {missing}')
+
+		# lsblk reports the devices in the order they were requested
+		lsblk_infos.update(zip(missing, infos))
+
+	return {path: lsblk_infos[path] for path in dev_paths}
+
+
+def get_lsblk_by_uuid(uuid: str) -> list[LsblkInfo]:
+	return _lsblk_cache.by_uuid(uuid)
+
+
+def get_lsblk_by_partuuid(partuuid: str) -> LsblkInfo | None:
+	return _lsblk_cache.by_partuuid(partuuid)
+
+
 def get_all_lsblk_info() -> list[LsblkInfo]:
-	return _fetch_lsblk_info().blockdevices
+	return _lsblk_cache.all()
 
 
 def get_lsblk_output() -> LsblkOutput:
@@ -80,24 +303,7 @@ def find_lsblk_info(
 
 
 def get_lsblk_by_mountpoint(mountpoint: Path, as_prefix: bool = False) -> list[LsblkInfo]:
-	def _check(infos: list[LsblkInfo]) -> list[LsblkInfo]:
-		devices = []
-		for entry in infos:
-			if as_prefix:
-				matches = [m for m in entry.mountpoints if str(m).startswith(str(mountpoint))]
-				if matches:
-					devices += [entry]
-			elif mountpoint in entry.mountpoints:
-				devices += [entry]
-
-			if len(entry.children) > 0:
-				if len(match := _check(entry.children)) > 0:
-					devices += match
-
-		return devices
-
-	all_info = get_all_lsblk_info()
-	return _check(all_info)
+	return _lsblk_cache.by_mountpoint(mountpoint, as_prefix)
 
 
 def disk_layouts() -> str:
@@ -115,6 +321,23 @@ def get_parent_device_path(dev_path: Path) -> Path:
 	return Path(f'/dev/{lsblk.pkname}')
 
 
+def queue_limit(dev_path: Path, name: str) -> int | None:
+	"""
+	Reads a limit of the request queue of a device from sysfs, e.g. the
+	discard granularity or the RAID chunk size (minimum_io_size)
+	"""
+	sysfs = Path('/sys/class/block') / dev_path.resolve().name
+
+	# partitions don't have a queue of their own, it belongs to the disk
+	if not (sysfs / 'queue').exists():
+		sysfs = sysfs.resolve().parent
+
+	try:
+		return int((sysfs / 'queue' / name).read_text())
+	except OSError, ValueError:
+		return None
+
+
 def get_unique_path_for_device(dev_path: Path) -> Path | None:
 	paths = Path('/dev/disk/by-id').glob('*')
 	linked_targets = {p.resolve(): p for p in paths}
@@ -129,11 +352,26 @@ def get_unique_path_for_device(dev_path: Path) -> Path | None:
 	return None
 
 
-def udev_sync() -> None:
-	try:
-		SysCommand('udevadm settle')
-	except SysCallError as err:
-		debug(f'Failed to synchronize with udev: {err}')
+def udev_sync(dev_paths: list[Path] | None = None, timeout: float = 10, since: float = 0) -> None:
+	"""
+	Waits for udev to process the pending events. If devices are given only
+	they are waited for, until udev processed their current state after
+	``since`` (see udev_processed()). The devices are waited for side by side,
+	each for at most ``timeout`` seconds. Without devices the whole event
+	queue is waited for.
+	"""
+	if dev_paths is None:
+		try:
+			SysCommand('udevadm settle')
+		except SysCallError as err:
+			debug(f'Failed to synchronize with udev: {err}')
+
+		return
+
+	conditions = {str(dev_path): partial(udev_processed, dev_path, since) for dev_path in dev_paths}
+
+	if unsettled := wait_for(conditions, timeout):
+		debug(f'udev did not process the devices within {timeout}s: {unsettled}')
 
 
 def mount(
@@ -0,0 +1,285 @@
+import fcntl
+import mmap
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+from archinstall.lib.disk.utils import queue_limit
+from archinstall.lib.exceptions import DiskError
+from archinstall.lib.log import debug, info, warn
+from archinstall.lib.models.device import WipeMode
+
+# BLKSSZGET, BLKDISCARD and BLKZEROOUT from linux/fs.h
+_BLKSSZGET = 0x1268
+_BLKDISCARD = 0x1277
+_BLKZEROOUT = 0x127F
+
+_KiB = 1024
+_MiB = 1024 * _KiB
+_GiB = 1024 * _MiB
+
+# Covers the partition tables (MBR, primary GPT), the LUKS headers, the MD
+# superblocks 1.1 and 1.2, the LVM label, the bcache superblock, the ZFS labels
+# 0 and 1 and the superblocks of all filesystems, including the primary one
+# of btrfs at 64 KiB
+_HEAD_SIZE = 1 * _MiB
+# Covers the backup GPT, the MD superblocks 0.90 and 1.0, the ZFS labels
+# 2 and 3 and the metadata of most hardware RAID formats (DDF, Intel IMSM)
+_TAIL_SIZE = 1 * _MiB
+# the mirrors of the btrfs superblock
+_BTRFS_MIRRORS = (64 * _MiB, 256 * _GiB, 1024**5)
+_BTRFS_SUPERBLOCK_SIZE = 4 * _KiB
+
+# the size of the individual writes, reads and ioctls
+_BATCH_SIZE = 8 * _MiB
+_IOCTL_BATCH_SIZE = 1 * _GiB
+_PROGRESS_INTERVAL = 10
+
+
+@dataclass
+class WipeReport:
+	path: Path
+	mode: WipeMode
+	# bytes that were zeroed or discarded
+	size: int
+	elapsed: float
+	verified: bool = False
+
+	@property
+	def throughput(self) -> float:
+		"""
+		MiB per second
+		"""
+		return self.size / _MiB / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _discard_supported(dev_path: Path) -> bool:
+	return (queue_limit(dev_path, 'discard_max_bytes') or 0) > 0
+
+
+class DeviceWiper:
+	"""
+	Wipes the metadata or the entire content of a device or partition.
+
+	The locations of all known signatures at the start and the end of the
+	device are zeroed, which unlike the first few KiB alone also removes the
+	backup GPT, RAID and LVM superblocks and the btrfs superblock mirrors.
+	Larger areas are discarded or zeroed by the kernel with BLKDISCARD and
+	BLKZEROOUT, which uses the offloads of the device where available, and
+	written directly (O_DIRECT) in large aligned batches otherwise.
+
+	with DeviceWiper(Path('/dev/sda')) as wiper:
+		wiper.wipe(WipeMode.ZERO, verify=True)
+	"""
+
+	def __init__(self, dev_path: Path) -> None:
+		self.dev_path = dev_path
+		self._fd = -1
+		self._direct = False
+		self._buffer: mmap.mmap | None = None
+		self.size = 0
+		self.sector_size = 512
+
+	def __enter__(self) -> Self:
+		flags = os.O_RDWR | os.O_CLOEXEC
+
+		try:
+			self._fd = os.open(self.dev_path, flags | os.O_DIRECT)
+			self._direct = True
+		except OSError:
+			# not every device or filesystem supports direct I/O
+			try:
+				self._fd = os.open(self.dev_path, flags)
+			except OSError as err:
+				raise DiskError(f'Unable to open {self.dev_path} for wiping: {err}')
+
+		self.size = os.lseek(self._fd, 0, os.SEEK_END)
+
+		try:
+			self.sector_size = int.from_bytes(fcntl.ioctl(self._fd, _BLKSSZGET, bytes(4)), 'little')
+		except OSError:
+			pass
+
+		# anonymous mappings are page aligned, as required for direct I/O
+		self._buffer = mmap.mmap(-1, _BATCH_SIZE)
+
+		return self
+
+	def __exit__(self, *args: object) -> None:
+		if self._buffer is not None:
+			self._buffer.close()
+			self._buffer = None
+
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+	def _align(self, offset: int) -> int:
+		return offset - offset % self.sector_size
+
+	def signature_ranges(self) -> list[tuple[int, int]]:
+		"""
+		Returns the sorted and merged (offset, length) ranges that can contain metadata
+		"""
+		ranges = [(0, _HEAD_SIZE), (self._align(self.size - _TAIL_SIZE), _TAIL_SIZE)]
+		ranges += [(offset, _BTRFS_SUPERBLOCK_SIZE) for offset in _BTRFS_MIRRORS]
+
+		merged: list[tuple[int, int]] = []
+
+		for start, length in sorted(ranges):
+			start = max(start, 0)
+			end = min(start + length, self.size)
+
+			if start >= end:
+				continue
+
+			if merged and start <= merged[-1][0] + merged[-1][1]:
+				prev_start, prev_length = merged[-1]
+				merged[-1] = (prev_start, max(prev_start + prev_length, end) - prev_start)
+			else:
+				merged.append((start, end - start))
+
+		return merged
+
+	def _buffered(self) -> None:
+		# unaligned I/O can only go through the page cache
+		if self._direct:
+			fcntl.fcntl(self._fd, fcntl.F_SETFL, fcntl.fcntl(self._fd, fcntl.F_GETFL) & ~os.O_DIRECT)
+			self._direct = False
+
+	def _ioctl_range(self, request: int, offset: int, length: int) -> None:
+		fcntl.ioctl(self._fd, request, offset.to_bytes(8, 'little') + length.to_bytes(8, 'little'))
+
+	def _write_zeros(self, offset: int, length: int) -> None:
+		assert self._buffer is not None
+		self._buffer[:] = bytes(_BATCH_SIZE)
+		end = offset + length
+
+		while offset < end:
+			size = min(_BATCH_SIZE, end - offset)
+
+			if size % self.sector_size or offset % self.sector_size:
+				self._buffered()
+
+			if self._direct:
+				written = os.pwritev(self._fd, [memoryview(self._buffer)[:size]], offset)
+			else:
+				written = os.pwrite(self._fd, bytes(size), offset)
+
+			offset += written
+
+		if not self._direct:
+			os.fsync(self._fd)
+
+	def _zero(self, offset: int, length: int, progress: bool = False) -> None:
+		"""
+		Zeroes a range, preferably with BLKZEROOUT which avoids transferring the zeros
+		"""
+		end = offset + length
+		start_time = last_report = time.monotonic()
+
+		while offset < end:
+			size = min(_IOCTL_BATCH_SIZE, end - offset)
+
+			try:
+				self._ioctl_range(_BLKZEROOUT, offset, size)
+			except OSError:
+				# e.g. regular files or unaligned ranges
+				self._write_zeros(offset, size)
+
+			offset += size
+
+			if progress and (now := time.monotonic()) - last_report >= _PROGRESS_INTERVAL:
+				last_report = now
+				done = 100 * (offset - (end - length)) / length
+				speed = (offset - (end - length)) / _MiB / (now - start_time)
+				info(f'Zeroing {self.dev_path}: {done:.0f}% ({speed:.0f} MiB/s)')
+
+	def _discard(self) -> bool:
+		if not _discard_supported(self.dev_path):
+			return False
+
+		offset = 0
+
+		try:
+			while offset < self.size:
+				size = min(_IOCTL_BATCH_SIZE, self.size - offset)
+				self._ioctl_range(_BLKDISCARD, offset, size)
+				offset += size
+		except OSError as err:
+			debug(f'Discarding {self.dev_path} failed: {err}')
+			return False
+
+		return True
+
+	def _verify(self, ranges: list[tuple[int, int]]) -> None:
+		assert self._buffer is not None
+		zeros = bytes(_BATCH_SIZE)
+
+		for offset, length in ranges:
+			end = offset + length
+
+			while offset < end:
+				size = min(_BATCH_SIZE, end - offset)
+
+				if size % self.sector_size or offset % self.sector_size:
+					self._buffered()
+
+				if self._direct:
+					read = os.preadv(self._fd, [memoryview(self._buffer)[:size]], offset)
+					data = memoryview(self._buffer)[:read]
+				else:
+					data = memoryview(os.pread(self._fd, size, offset))
+
+				if data != memoryview(zeros)[: len(data)]:
+					raise DiskError(f'Verification of the wipe of {self.dev_path} failed at offset {offset}')
+
+				offset += size
+
+	def wipe(self, mode: WipeMode = WipeMode.SIGNATURES, verify: bool = False) -> WipeReport:
+		start = time.monotonic()
+		ranges = self.signature_ranges()
+
+		match mode:
+			case WipeMode.ZERO:
+				self._zero(0, self.size, progress=True)
+				ranges = [(0, self.size)] if self.size else []
+			case WipeMode.DISCARD:
+				if not self._discard():
+					warn(f'{self.dev_path} does not support discarding, only its signatures will be wiped')
+					mode = WipeMode.SIGNATURES
+
+				# reading discarded blocks doesn't necessarily return zeros
+				for offset, length in ranges:
+					self._zero(offset, length)
+			case WipeMode.SIGNATURES:
+				for offset, length in ranges:
+					self._zero(offset, length)
+
+		wiped = self.size if mode != WipeMode.SIGNATURES else sum(length for _, length in ranges)
+		report = WipeReport(self.dev_path, mode, wiped, time.monotonic() - start)
+
+		if verify:
+			self._verify(ranges)
+			report.verified = True
+
+		return report
+
+
+def wipe_device(dev_path: Path, mode: WipeMode = WipeMode.SIGNATURES, verify: bool = False) -> WipeReport:
+	with DeviceWiper(dev_path) as wiper:
+		report = wiper.wipe(mode, verify)
+
+	message = f'Wiped {dev_path} ({report.mode.value}): {report.size / _MiB:.1f} MiB in {report.elapsed:.2f}s ({report.throughput:.0f} MiB/s)'
+
+	if report.verified:
+		message += ', verified'
+
+	if mode == WipeMode.SIGNATURES:
+		debug(message)
+	else:
+		info(message)
+
+	return report
@@ -27,7 +27,7 @@ from archinstall.lib.models.packages import Repository
 from archinstall.lib.models.pacman import PacmanConfiguration
 from archinstall.lib.models.profile import ProfileConfiguration
 from archinstall.lib.network.network_menu import select_network
-from archinstall.lib.packages.packages import list_available_packages, select_additional_packages
+from archinstall.lib.packages.packages import load_package_index, select_additional_packages
 from archinstall.lib.pacman.config import PacmanConfig
 from archinstall.lib.pacman.pacman_menu import PacmanMenu
 from archinstall.lib.translationhandler import Language, tr, translation_handler
@@ -603,7 +603,7 @@ class GlobalMenu(AbstractMenu[None]):
 
 		if mirror_configuration and mirror_configuration.optional_repositories:
 			# reset the package list cache in case the repository selection has changed
-			list_available_packages.cache_clear()
+			load_package_index.cache_clear()
 
 			# enable the repositories in the config
 			pacman_config = PacmanConfig(None)
@@ -1,10 +1,11 @@
 import os
+from collections.abc import Iterable
 from enum import Enum
 from functools import cached_property
 from pathlib import Path
 from typing import Self
 
-from archinstall.lib.command import SysCommand
+from archinstall.lib.command import AsyncSysCommand, SysCommand, run_probes
 from archinstall.lib.exceptions import SysCallError
 from archinstall.lib.log import debug
 from archinstall.lib.networking import enrich_iface_types, list_interfaces
@@ -177,16 +178,7 @@ class _SysInfo:
 		"""
 		Returns system memory information
 		"""
-		mem_info_path = Path('/proc/meminfo')
-		mem_info: dict[str, int] = {}
-
-		with mem_info_path.open() as file:
-			for line in file:
-				key, value = line.strip().split(':')
-				num = value.split()[0]
-				mem_info[key] = int(num)
-
-		return mem_info
+		return _read_mem_info()
 
 	def mem_info_by_key(self, key: str) -> int:
 		return self.mem_info[key]
@@ -211,12 +203,54 @@ class _SysInfo:
 		"""
 		Returns detected graphics devices (cached)
 		"""
-		cards: dict[str, str] = {}
-		for line in SysCommand('lspci'):
-			if b' VGA ' in line or b' 3D ' in line:
-				_, identifier = line.split(b': ', 1)
-				cards[identifier.strip().decode('UTF-8')] = str(line)
-		return cards
+		return _graphics_devices(SysCommand('lspci'))
+
+	@cached_property
+	def virtualization(self) -> str | None:
+		try:
+			return str(SysCommand('systemd-detect-virt')).strip('\r\n')
+		except SysCallError as err:
+			debug(f'Could not detect virtual system: {err}')
+
+		return None
+
+	def probe(self) -> None:
+		"""
+		Runs the probes which spawn a process side by side and caches their
+		results, instead of running them one after another on first use
+		"""
+		lspci, virt = run_probes([AsyncSysCommand('lspci'), AsyncSysCommand('systemd-detect-virt')])
+
+		if isinstance(lspci, AsyncSysCommand):
+			self.__dict__['graphics_devices'] = _graphics_devices(lspci)
+
+		if isinstance(virt, AsyncSysCommand):
+			self.__dict__['virtualization'] = str(virt).strip('\r\n')
+		else:
+			debug(f'Could not detect virtual system: {virt}')
+			self.__dict__['virtualization'] = None
+
+
+def _read_mem_info() -> dict[str, int]:
+	mem_info_path = Path('/proc/meminfo')
+	mem_info: dict[str, int] = {}
+
+	with mem_info_path.open() as file:
+		for line in file:
+			key, value = line.strip().split(':')
+			num = value.split()[0]
+			mem_info[key] = int(num)
+
+	return mem_info
+
+
+def _graphics_devices(lspci: Iterable[bytes]) -> dict[str, str]:
+	cards: dict[str, str] = {}
+	for line in lspci:
+		if b' VGA ' in line or b' 3D ' in line:
+			_, identifier = line.split(b': ', 1)
+			cards[identifier.strip().decode('UTF-8')] = str(line)
+	return cards
 
 
 _sys_info = _SysInfo()
@@ -280,34 +314,32 @@ class SysInfo:
 
 	@staticmethod
 	def mem_available() -> int:
-		return _sys_info.mem_info_by_key('MemAvailable')
+		# read every time, e.g. the package cache fills the tmpfs of the live system
+		return _read_mem_info()['MemAvailable']
 
 	@staticmethod
 	def mem_free() -> int:
-		return _sys_info.mem_info_by_key('MemFree')
+		return _read_mem_info()['MemFree']
 
 	@staticmethod
 	def mem_total() -> int:
 		return _sys_info.mem_info_by_key('MemTotal')
 
 	@staticmethod
-	def virtualization() -> str | None:
-		try:
-			return str(SysCommand('systemd-detect-virt')).strip('\r\n')
-		except SysCallError as err:
-			debug(f'Could not detect virtual system: {err}')
+	def probe() -> None:
+		_sys_info.probe()
 
-		return None
+	@staticmethod
+	def virtualization() -> str | None:
+		return _sys_info.virtualization
 
 	@staticmethod
 	def is_vm() -> bool:
-		try:
-			result = SysCommand('systemd-detect-virt')
-			return b'none' not in b''.join(result).lower()
-		except SysCallError as err:
-			debug(f'System is not running in a VM: {err}')
+		# systemd-detect-virt fails when it doesn't detect a virtual system
+		if (virtualization := _sys_info.virtualization) is None:
+			return False
 
-		return False
+		return 'none' not in virtualization.lower()
 
 	@staticmethod
 	def requires_sof_fw() -> bool:
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import platform
 import re
@@ -13,9 +14,10 @@ from typing import Any, Self
 
 from archinstall.lib.boot import Boot
 from archinstall.lib.bootloader.utils import validate_bootloader_layout
+from archinstall.lib.chroot import ChrootSession
 from archinstall.lib.command import SysCommand, run
 from archinstall.lib.disk.fido import Fido2
-from archinstall.lib.disk.luks import Luks2, unlock_luks2_dev
+from archinstall.lib.disk.luks import Luks2, dm_crypt_perf, unlock_luks2_devs
 from archinstall.lib.disk.lvm import lvm_import_vg, lvm_pvseg_info, lvm_vol_change
 from archinstall.lib.disk.utils import (
 	get_lsblk_by_mountpoint,
@@ -36,8 +38,10 @@ from archinstall.lib.models.bootloader import Bootloader, BootloaderConfiguratio
 from archinstall.lib.models.device import (
 	DiskEncryption,
 	DiskLayoutConfiguration,
+	DmCryptPerf,
 	EncryptionType,
 	FilesystemType,
+	LsblkInfo,
 	LvmVolume,
 	PartitionModification,
 	SectorSize,
@@ -56,8 +60,10 @@ from archinstall.lib.models.users import User
 from archinstall.lib.packages.packages import installed_package
 from archinstall.lib.pacman.config import PacmanConfig
 from archinstall.lib.pacman.pacman import Pacman
+from archinstall.lib.pacman.prefetch import PackagePrefetcher
 from archinstall.lib.pathnames import MIRRORLIST, PACMAN_CONF
 from archinstall.lib.plugins import plugins
+from archinstall.lib.services import ServiceWaiter
 from archinstall.lib.translationhandler import tr
 
 # Any package that the Installer() is responsible for (optional and the default ones)
@@ -66,7 +72,8 @@ from archinstall.lib.translationhandler import tr
 # pacman picks the first initramfs provider from the host's pacman.conf, which on non-Arch
 # hosts (EndeavourOS prefers dracut, etc.) breaks the installer's mkinitcpio() and
 # _config_uki() methods that assume mkinitcpio is present in the chroot.
-__packages__ = ['base', 'sudo', 'linux-firmware', 'mkinitcpio'] + [k.value for k in Kernel]
+__base_packages__ = ['base', 'sudo', 'linux-firmware', 'mkinitcpio']
+__packages__ = __base_packages__ + [k.value for k in Kernel]
 
 # Additional packages that are installed if the user is running the Live ISO with accessibility tools enabled
 __accessibility_packages__ = ['brltty', 'espeakup', 'alsa-utils']
@@ -80,12 +87,15 @@ class Installer:
 		base_packages: list[str] = [],
 		kernels: list[str] | None = None,
 		silent: bool = False,
+		parallel_initramfs: bool = False,
 	):
 		"""
 		`Installer()` is the wrapper for most basic installation steps.
 		It also wraps :py:func:`~archinstall.Installer.pacstrap` among other things.
+
+		:param parallel_initramfs: Build the mkinitcpio presets of all kernels concurrently
 		"""
-		self._base_packages = base_packages or __packages__[:4]
+		self._base_packages = base_packages or list(__base_packages__)
 		self.kernels = kernels or [DEFAULT_KERNEL.value]
 		self._disk_config = disk_config
 
@@ -129,15 +139,27 @@ class Installer:
 		self._kernel_params: list[str] = []
 		self._fstab_entries: list[str] = []
 
+		# initramfs builds are coalesced, see request_initramfs() and build_initramfs()
+		self._parallel_initramfs = parallel_initramfs
+		self._initramfs_pending = False
+		self._initramfs_checksum: str | None = None
+
 		self._zram_enabled = False
 		self._disable_fstrim = False
 
 		self.pacman = Pacman(self.target, silent)
 
+		# A persistent chroot which is reused by all chroot commands while active:
+		#   with installation.chroot:
+		#       ...
+		self.chroot = ChrootSession(self.target)
+
 	def __enter__(self) -> Self:
 		return self
 
 	def __exit__(self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None) -> bool | None:
+		self.chroot.close()
+
 		if exc_type is not None:
 			error(str(exc_value))
 
@@ -151,6 +173,9 @@ class Installer:
 			# Return None to propagate the exception
 			return None
 
+		if not self.build_initramfs():
+			error('Error generating initramfs (continuing anyway)')
+
 		info(tr('Syncing the system...'))
 		os.sync()
 
@@ -179,57 +204,25 @@ class Installer:
 		if mod not in self._modules:
 			self._modules.append(mod)
 
-	def _verify_service_stop(self, offline: bool, skip_ntp: bool, skip_wkd: bool) -> None:
+	def _verify_service_stop(
+		self,
+		offline: bool,
+		skip_ntp: bool,
+		skip_wkd: bool,
+		service_waiter: ServiceWaiter | None = None,
+	) -> None:
 		"""
 		Certain services might be running that affects the system during installation.
 		One such service is "reflector.service" which updates /etc/pacman.d/mirrorlist
 		We need to wait for it before we continue since we opted in to use a custom mirror/region.
-		"""
-
-		if not skip_ntp:
-			info(tr('Waiting for time sync (timedatectl show) to complete.'))
-
-			started_wait = time.monotonic()
-			notified = False
-			while True:
-				if not notified and time.monotonic() - started_wait > 5:
-					notified = True
-					warn(tr('Time synchronization not completing, while you wait - check the docs for workarounds: https://archinstall.readthedocs.io/'))
-
-				time_val = SysCommand('timedatectl show --property=NTPSynchronized --value').decode()
-				if time_val and time_val.strip() == 'yes':
-					break
-				time.sleep(1)
-		else:
-			info(tr('Skipping waiting for automatic time sync (this can cause issues if time is out of sync during installation)'))
-
-		if not offline:
-			info('Waiting for automatic mirror selection (reflector) to complete.')
-			for _ in range(60):
-				if self._service_state('reflector') in ('dead', 'failed', 'exited'):
-					break
-				time.sleep(1)
-			else:
-				warn('Reflector did not complete within 60 seconds, continuing anyway...')
-		else:
-			info('Skipped reflector...')
-
-		# info('Waiting for pacman-init.service to complete.')
-		# while self._service_state('pacman-init') not in ('dead', 'failed', 'exited'):
-		# time.sleep(1)
 
-		if not skip_wkd:
-			info(tr('Waiting for Arch Linux keyring sync (archlinux-keyring-wkd-sync) to complete.'))
-			# Wait for the timer to kick in
-			while self._service_started('archlinux-keyring-wkd-sync.timer') is None:
-				time.sleep(1)
-
-			# Wait for the service to enter a finished state
-			while self._service_state('archlinux-keyring-wkd-sync.service') not in ('dead', 'failed', 'exited'):
-				time.sleep(1)
+		A waiter that was started earlier on, e.g. before the disks were prepared,
+		is reused so that only the remainder of the waits blocks the installation.
+		"""
+		if service_waiter is None or not service_waiter.matches(offline, skip_ntp, skip_wkd):
+			service_waiter = ServiceWaiter(offline, skip_ntp, skip_wkd)
 
-			if self._service_state('archlinux-keyring-wkd-sync.service') == 'failed':
-				warn('archlinux-keyring-wkd-sync failed, keyring may need reinit during pacman sync')
+		service_waiter.wait()
 
 	def _verify_boot_part(self) -> None:
 		"""
@@ -254,9 +247,10 @@ class Installer:
 		offline: bool = False,
 		skip_ntp: bool = False,
 		skip_wkd: bool = False,
+		service_waiter: ServiceWaiter | None = None,
 	) -> None:
 		# self._verify_boot_part()
-		self._verify_service_stop(offline, skip_ntp, skip_wkd)
+		self._verify_service_stop(offline, skip_ntp, skip_wkd, service_waiter)
 
 	def mount_ordered_layout(self) -> None:
 		debug('Mounting ordered layout')
@@ -334,15 +328,14 @@ class Installer:
 		self,
 		partitions: list[PartitionModification],
 	) -> dict[PartitionModification, Luks2]:
-		return {
-			part_mod: unlock_luks2_dev(
-				part_mod.dev_path,
-				part_mod.mapper_name,
-				self._disk_encryption.encryption_password,
-			)
-			for part_mod in partitions
-			if part_mod.mapper_name and part_mod.dev_path
-		}
+		part_mods = [part_mod for part_mod in partitions if part_mod.mapper_name and part_mod.dev_path]
+		luks_handlers = unlock_luks2_devs(
+			[(part_mod.safe_dev_path, part_mod.mapper_name) for part_mod in part_mods if part_mod.mapper_name],
+			self._disk_encryption.encryption_password,
+			self._disk_encryption.perf,
+		)
+
+		return dict(zip(part_mods, luks_handlers))
 
 	def _import_lvm(self) -> None:
 		lvm_config = self._disk_config.lvm_config
@@ -361,15 +354,14 @@ class Installer:
 		self,
 		lvm_volumes: list[LvmVolume],
 	) -> dict[LvmVolume, Luks2]:
-		return {
-			vol: unlock_luks2_dev(
-				vol.dev_path,
-				vol.mapper_name,
-				self._disk_encryption.encryption_password,
-			)
-			for vol in lvm_volumes
-			if vol.mapper_name and vol.dev_path
-		}
+		vols = [vol for vol in lvm_volumes if vol.mapper_name and vol.dev_path]
+		luks_handlers = unlock_luks2_devs(
+			[(vol.safe_dev_path, vol.mapper_name) for vol in vols if vol.mapper_name],
+			self._disk_encryption.encryption_password,
+			self._disk_encryption.perf,
+		)
+
+		return dict(zip(vols, luks_handlers))
 
 	def _mount_partition(self, part_mod: PartitionModification) -> None:
 		if not part_mod.dev_path:
@@ -468,6 +460,7 @@ class Installer:
 				part_mod.safe_dev_path,
 				mapper_name=part_mod.mapper_name,
 				password=self._disk_encryption.encryption_password,
+				perf=self._disk_encryption.perf,
 			)
 
 			if gen_enc_file and not part_mod.is_root():
@@ -497,6 +490,7 @@ class Installer:
 				vol.safe_dev_path,
 				mapper_name=vol.mapper_name,
 				password=self._disk_encryption.encryption_password,
+				perf=self._disk_encryption.perf,
 			)
 
 			if gen_enc_file and not vol.is_root():
@@ -674,7 +668,7 @@ class Installer:
 			return False
 
 		try:
-			self.arch_chroot('locale-gen')
+			self._chroot_run('locale-gen')
 		except SysCallError as e:
 			error(f'Failed to run locale-gen on target: {e}')
 			return False
@@ -695,7 +689,7 @@ class Installer:
 
 		if (Path('/usr') / 'share' / 'zoneinfo' / zone).exists():
 			(Path(self.target) / 'etc' / 'localtime').unlink(missing_ok=True)
-			self.arch_chroot(f'ln -s /usr/share/zoneinfo/{zone} /etc/localtime')
+			self._chroot_run('ln', '-s', f'/usr/share/zoneinfo/{zone}', '/etc/localtime')
 			return True
 
 		else:
@@ -756,6 +750,19 @@ class Installer:
 	def _chroot_argv(self, *args: str) -> list[str]:
 		return ['arch-chroot', '-S', str(self.target), *args]
 
+	def _chroot_run(self, *args: str, input_data: bytes | None = None) -> bytes:
+		"""
+		Runs a command inside the target, reusing the persistent chroot
+		session if one is active and falling back to a one-off arch-chroot otherwise.
+		"""
+		if self.chroot.is_alive():
+			return self.chroot.run(list(args), input_data=input_data)
+
+		try:
+			return run(self._chroot_argv(*args), input_data=input_data).stdout
+		except CalledProcessError as err:
+			raise SysCallError(str(err), err.returncode, worker_log=err.stdout or b'')
+
 	def drop_to_shell(self) -> None:
 		subprocess.check_call(f'arch-chroot {self.target}', shell=True)
 
@@ -835,13 +842,7 @@ class Installer:
 
 		return True
 
-	def mkinitcpio(self, flags: list[str]) -> bool:
-		for plugin in plugins.values():
-			if hasattr(plugin, 'on_mkinitcpio'):
-				# Allow plugins to override the usage of mkinitcpio altogether.
-				if plugin.on_mkinitcpio(self):
-					return True
-
+	def _write_mkinitcpio_conf(self) -> None:
 		with open(f'{self.target}/etc/mkinitcpio.conf', 'r+') as mkinit:
 			content = mkinit.read()
 			content = re.sub('\nMODULES=(.*)', f'\nMODULES=({" ".join(self._modules)})', content)
@@ -861,14 +862,87 @@ class Installer:
 			mkinit.truncate()
 			mkinit.write(content)
 
+	def _initramfs_config_checksum(self) -> str:
+		"""
+		Checksum over all files that end up shaping the generated initramfs images
+		"""
+		etc = self.target / 'etc'
+		files = [
+			etc / 'mkinitcpio.conf',
+			*sorted((etc / 'mkinitcpio.conf.d').glob('*.conf')),
+			*sorted((etc / 'mkinitcpio.d').glob('*.preset')),
+			etc / 'vconsole.conf',
+			etc / 'crypttab.initramfs',
+			etc / 'kernel/cmdline',
+		]
+
+		checksum = hashlib.sha256()
+
+		for file in files:
+			checksum.update(str(file).encode())
+
+			if file.is_file():
+				checksum.update(file.read_bytes())
+
+		return checksum.hexdigest()
+
+	def _parallel_presets_cmd(self) -> str:
+		jobs = ' '.join(f'mkinitcpio -p {shlex.quote(kernel)} & pids="$pids $!";' for kernel in self.kernels)
+		script = f'pids=""; {jobs} rc=0; for pid in $pids; do wait $pid || rc=1; done; exit $rc'
+		return f'bash -c {shlex.quote(script)}'
+
+	def mkinitcpio(self, flags: list[str]) -> bool:
+		for plugin in plugins.values():
+			if hasattr(plugin, 'on_mkinitcpio'):
+				# Allow plugins to override the usage of mkinitcpio altogether.
+				if plugin.on_mkinitcpio(self):
+					return True
+
+		self._write_mkinitcpio_conf()
+
+		if flags == ['-P'] and self._parallel_initramfs and len(self.kernels) > 1:
+			command = self._parallel_presets_cmd()
+		else:
+			command = f'mkinitcpio {" ".join(flags)}'
+
 		try:
-			self.arch_chroot(f'mkinitcpio {" ".join(flags)}', peek_output=True)
-			return True
+			self.arch_chroot(command, peek_output=True)
 		except SysCallError as e:
 			if e.worker_log:
 				log(e.worker_log.decode())
 			return False
 
+		if flags == ['-P']:
+			self._initramfs_checksum = self._initramfs_config_checksum()
+
+		return True
+
+	def request_initramfs(self) -> None:
+		"""
+		Schedules a rebuild of all initramfs presets. Requests are coalesced and
+		the images are only generated once by :py:func:`build_initramfs`, which
+		runs at the latest when leaving the installer context.
+		"""
+		self._initramfs_pending = True
+
+	def build_initramfs(self) -> bool:
+		"""
+		Builds the initramfs images if a build was requested and the mkinitcpio
+		configuration differs from the one of the last build.
+		"""
+		if not self._initramfs_pending:
+			return True
+
+		self._initramfs_pending = False
+
+		self._write_mkinitcpio_conf()
+
+		if self._initramfs_checksum == self._initramfs_config_checksum():
+			debug('initramfs configuration unchanged since the last build, skipping mkinitcpio')
+			return True
+
+		return self.mkinitcpio(['-P'])
+
 	def _get_microcode(self) -> Path | None:
 		if not SysInfo.is_vm():
 			if vendor := SysInfo.cpu_vendor():
@@ -890,7 +964,7 @@ class Installer:
 	def _prepare_encrypt(self, before: str = 'filesystems') -> None:
 		if self._disk_encryption.hsm_device:
 			# Required by mkinitcpio to add support for fido2-device options
-			self.pacman.strap('libfido2')
+			self.plan_packages('libfido2')
 
 			if 'sd-encrypt' not in self._hooks:
 				self._hooks.insert(self._hooks.index(before), 'sd-encrypt')
@@ -908,7 +982,7 @@ class Installer:
 	) -> None:
 		if self._disk_config.lvm_config:
 			lvm = 'lvm2'
-			self.add_additional_packages(lvm)
+			self.plan_packages(lvm)
 			self._hooks.insert(self._hooks.index('filesystems') - 1, lvm)
 
 			for vg in self._disk_config.lvm_config.vol_groups:
@@ -975,8 +1049,8 @@ class Installer:
 			self.set_locale(locale_config)
 			self.set_keyboard_language(locale_config.kb_layout)
 
-		if mkinitcpio and not self.mkinitcpio(['-P']):
-			error('Error generating initramfs (continuing anyway)')
+		if mkinitcpio:
+			self.request_initramfs()
 
 		self._helper_flags['base'] = True
 
@@ -1091,13 +1165,37 @@ class Installer:
 		override_conf.write_text(config_content)
 		override_conf.chmod(0o644)
 
-	def _get_luks_uuid_from_mapper_dev(self, mapper_dev_path: Path) -> str:
+	def _get_luks_info_from_mapper_dev(self, mapper_dev_path: Path) -> LsblkInfo:
 		lsblk_info = get_lsblk_info(mapper_dev_path, reverse=True, full_dev_path=True)
 
 		if not lsblk_info.children or not lsblk_info.children[0].uuid:
 			raise ValueError('Unable to determine UUID of luks superblock')
 
-		return lsblk_info.children[0].uuid
+		return lsblk_info.children[0]
+
+	def _get_luks_uuid_from_mapper_dev(self, mapper_dev_path: Path) -> str:
+		uuid = self._get_luks_info_from_mapper_dev(mapper_dev_path).uuid
+		assert uuid is not None
+		return uuid
+
+	def _dm_crypt_perf(self, luks_dev_path: Path) -> DmCryptPerf:
+		return dm_crypt_perf(luks_dev_path, self._disk_encryption.perf)
+
+	def _cryptdevice_param(self, device: str, mapper_name: str, luks_dev_path: Path) -> str:
+		param = f'cryptdevice={device}:{mapper_name}'
+
+		if options := self._dm_crypt_perf(luks_dev_path).cryptdevice_options():
+			param += ':' + ','.join(options)
+
+		return param
+
+	def _rd_luks_options_params(self, luks_dev_path: Path, options: list[str] | None = None) -> list[str]:
+		options = [*(options or []), *self._dm_crypt_perf(luks_dev_path).crypttab_options()]
+
+		if options:
+			return [f'rd.luks.options={",".join(options)}']
+
+		return []
 
 	def _get_kernel_params_partition(
 		self,
@@ -1117,13 +1215,16 @@ class Installer:
 				kernel_parameters.append(f'rd.luks.name={root_partition.uuid}=root')
 				# Note: tpm2-device and fido2-device don't play along very well:
 				# https://github.com/archlinux/archinstall/pull/1196#issuecomment-1129715645
-				kernel_parameters.append('rd.luks.options=fido2-device=auto,password-echo=no')
+				kernel_parameters += self._rd_luks_options_params(
+					root_partition.safe_dev_path,
+					['fido2-device=auto', 'password-echo=no'],
+				)
 			elif partuuid:
 				debug(f'Root partition is an encrypted device, identifying by PARTUUID: {root_partition.partuuid}')
-				kernel_parameters.append(f'cryptdevice=PARTUUID={root_partition.partuuid}:root')
+				kernel_parameters.append(self._cryptdevice_param(f'PARTUUID={root_partition.partuuid}', 'root', root_partition.safe_dev_path))
 			else:
 				debug(f'Root partition is an encrypted device, identifying by UUID: {root_partition.uuid}')
-				kernel_parameters.append(f'cryptdevice=UUID={root_partition.uuid}:root')
+				kernel_parameters.append(self._cryptdevice_param(f'UUID={root_partition.uuid}', 'root', root_partition.safe_dev_path))
 
 			if id_root:
 				kernel_parameters.append('root=/dev/mapper/root')
@@ -1153,23 +1254,26 @@ class Installer:
 				if not pv_seg_info:
 					raise ValueError(f'Unable to determine PV segment info for {lvm.vg_name}/{lvm.name}')
 
-				uuid = self._get_luks_uuid_from_mapper_dev(pv_seg_info.pv_name)
+				luks_info = self._get_luks_info_from_mapper_dev(pv_seg_info.pv_name)
+				uuid = luks_info.uuid
 
 				if self._disk_encryption.hsm_device:
 					debug(f'LvmOnLuks, encrypted root partition, HSM, identifying by UUID: {uuid}')
 					kernel_parameters.append(f'rd.luks.name={uuid}=cryptlvm root={lvm.safe_dev_path}')
+					kernel_parameters += self._rd_luks_options_params(luks_info.path)
 				else:
 					debug(f'LvmOnLuks, encrypted root partition, identifying by UUID: {uuid}')
-					kernel_parameters.append(f'cryptdevice=UUID={uuid}:cryptlvm root={lvm.safe_dev_path}')
+					kernel_parameters.append(f'{self._cryptdevice_param(f"UUID={uuid}", "cryptlvm", luks_info.path)} root={lvm.safe_dev_path}')
 			case EncryptionType.LUKS_ON_LVM:
 				uuid = self._get_luks_uuid_from_mapper_dev(lvm.mapper_path)
 
 				if self._disk_encryption.hsm_device:
 					debug(f'LuksOnLvm, encrypted root partition, HSM, identifying by UUID: {uuid}')
 					kernel_parameters.append(f'rd.luks.name={uuid}=root root=/dev/mapper/root')
+					kernel_parameters += self._rd_luks_options_params(lvm.safe_dev_path)
 				else:
 					debug(f'LuksOnLvm, encrypted root partition, identifying by UUID: {uuid}')
-					kernel_parameters.append(f'cryptdevice=UUID={uuid}:root root=/dev/mapper/root')
+					kernel_parameters.append(f'{self._cryptdevice_param(f"UUID={uuid}", "root", lvm.safe_dev_path)} root=/dev/mapper/root')
 			case EncryptionType.NO_ENCRYPTION:
 				debug(f'Identifying root lvm by mapper device: {lvm.dev_path}')
 				kernel_parameters.append(f'root={lvm.safe_dev_path}')
@@ -1281,15 +1385,15 @@ class Installer:
 			# as a container environment since v257 and skips them silently.
 			# https://github.com/systemd/systemd/issues/36174
 			if systemd_version >= '258':
-				self.arch_chroot(f'bootctl --variables=yes {" ".join(bootctl_options)} install')
+				self._chroot_run('bootctl', '--variables=yes', *bootctl_options, 'install')
 			else:
-				self.arch_chroot(f'bootctl {" ".join(bootctl_options)} install')
+				self._chroot_run('bootctl', *bootctl_options, 'install')
 		except SysCallError:
 			if systemd_version >= '258':
 				# Fallback, try creating the boot loader without touching the EFI variables
-				self.arch_chroot(f'bootctl --variables=no {" ".join(bootctl_options)} install')
+				self._chroot_run('bootctl', '--variables=no', *bootctl_options, 'install')
 			else:
-				self.arch_chroot(f'bootctl --no-variables {" ".join(bootctl_options)} install')
+				self._chroot_run('bootctl', '--no-variables', *bootctl_options, 'install')
 
 		# Loader configuration is stored in ESP/loader:
 		# https://man.archlinux.org/man/loader.conf.5
@@ -1433,10 +1537,12 @@ class Installer:
 
 			grub_default.write_text(config)
 
+		# grub-mkconfig only generates initrd entries for images that exist
+		if not self.build_initramfs():
+			error('Error generating initramfs (continuing anyway)')
+
 		try:
-			self.arch_chroot(
-				f'grub-mkconfig -o {boot_dir}/grub/grub.cfg',
-			)
+			self._chroot_run('grub-mkconfig', '-o', f'{boot_dir}/grub/grub.cfg')
 		except SysCallError as err:
 			raise DiskError(f'Could not configure GRUB: {err}')
 
@@ -1683,7 +1789,7 @@ class Installer:
 		info(f'rEFInd EFI partition: {efi_partition.dev_path}')
 
 		try:
-			self.arch_chroot('refind-install')
+			self._chroot_run('refind-install')
 		except SysCallError as err:
 			raise DiskError(f'Could not install rEFInd to {self.target}{efi_partition.mountpoint}: {err}')
 
@@ -1777,8 +1883,8 @@ class Installer:
 			else:
 				self._hooks.append('plymouth')
 
-		self.arch_chroot(f'plymouth-set-default-theme {plymouth.value}')
-		self.mkinitcpio(['-P'])
+		self._chroot_run('plymouth-set-default-theme', plymouth.value)
+		self.request_initramfs()
 
 	def _config_uki(
 		self,
@@ -1827,9 +1933,8 @@ class Installer:
 		uki_dir = self.target / efi_partition.relative_mountpoint / 'EFI/Linux'
 		uki_dir.mkdir(parents=True, exist_ok=True)
 
-		# Build the UKIs
-		if not self.mkinitcpio(['-P']):
-			error('Error generating initramfs (continuing anyway)')
+		# The UKIs are built together with any other pending initramfs changes
+		self.request_initramfs()
 
 	def add_bootloader(
 		self, bootloader: Bootloader, uki_enabled: bool = False, bootloader_removable: bool = False, plymouth: PlymouthTheme | None = None
@@ -1894,21 +1999,42 @@ class Installer:
 			)
 			self._config_uki(root, efi_partition, keep_initramfs)
 
-		match bootloader:
-			case Bootloader.Systemd:
-				self._add_systemd_bootloader(boot_partition, root, efi_partition, uki_enabled)
-			case Bootloader.Grub:
-				self._add_grub_bootloader(boot_partition, root, efi_partition, uki_enabled, bootloader_removable)
-			case Bootloader.Efistub:
-				self._add_efistub_bootloader(boot_partition, root, uki_enabled)
-			case Bootloader.Limine:
-				self._add_limine_bootloader(boot_partition, efi_partition, root, uki_enabled, bootloader_removable)
-			case Bootloader.Refind:
-				self._add_refind_bootloader(boot_partition, efi_partition, root, uki_enabled)
+		# the bootloader installers run several chroot commands, e.g. bootctl
+		# with its fallback or the initramfs and grub-mkconfig for GRUB
+		with self.chroot:
+			match bootloader:
+				case Bootloader.Systemd:
+					self._add_systemd_bootloader(boot_partition, root, efi_partition, uki_enabled)
+				case Bootloader.Grub:
+					self._add_grub_bootloader(boot_partition, root, efi_partition, uki_enabled, bootloader_removable)
+				case Bootloader.Efistub:
+					self._add_efistub_bootloader(boot_partition, root, uki_enabled)
+				case Bootloader.Limine:
+					self._add_limine_bootloader(boot_partition, efi_partition, root, uki_enabled, bootloader_removable)
+				case Bootloader.Refind:
+					self._add_refind_bootloader(boot_partition, efi_partition, root, uki_enabled)
 
 	def add_additional_packages(self, packages: str | list[str]) -> None:
 		return self.pacman.strap(packages)
 
+	def plan_packages(self, packages: str | list[str]) -> None:
+		"""
+		Registers packages to be installed together with the base system in a single
+		pacstrap transaction. Once the base is installed they are installed right away.
+		Later calls to :py:func:`add_additional_packages` for planned packages are no-ops.
+		"""
+		if self._helper_flags.get('base-strapped', False) is True:
+			self.add_additional_packages(packages)
+		else:
+			self.pacman.plan(packages)
+
+	def import_package_cache(self, prefetcher: PackagePrefetcher) -> None:
+		"""
+		Moves the packages downloaded by the prefetcher into the package
+		cache of the target, which is where pacstrap looks for them.
+		"""
+		prefetcher.import_into(self.target / 'var/cache/pacman/pkg')
+
 	def enable_sudo(self, user: User, group: bool = False) -> None:
 		info(f'Enabling sudo permissions for {user.username}')
 
@@ -1943,8 +2069,11 @@ class Installer:
 		if not isinstance(users, list):
 			users = [users]
 
-		for user in users:
-			self._create_user(user)
+		# creating users runs several chroot commands per user,
+		# so keep a single chroot alive for all of them
+		with self.chroot:
+			for user in users:
+				self._create_user(user)
 
 	def _create_user(self, user: User) -> None:
 		# This plugin hook allows for the plugin to handle the creation of the user.
@@ -1958,7 +2087,7 @@ class Installer:
 		if not handled_by_plugin:
 			info(f'Creating user {user.username}')
 
-			cmd = self._chroot_argv('useradd', '-m')
+			cmd = ['useradd', '-m']
 
 			if user.sudo:
 				cmd += ['-G', 'wheel']
@@ -1966,8 +2095,8 @@ class Installer:
 			cmd += ['--', user.username]
 
 			try:
-				run(cmd)
-			except CalledProcessError as err:
+				self._chroot_run(*cmd)
+			except SysCallError as err:
 				debug(f'Error creating user {user.username}: {err}')
 				raise SystemError(f'Could not create user inside installation: {err}')
 
@@ -1979,10 +2108,9 @@ class Installer:
 		self.set_user_password(user)
 
 		for group in user.groups:
-			cmd = self._chroot_argv('gpasswd', '-a', user.username, group)
 			try:
-				run(cmd)
-			except CalledProcessError as err:
+				self._chroot_run('gpasswd', '-a', user.username, group)
+			except SysCallError as err:
 				warn(f'Failed to add {user.username} to group {group}: {err}')
 
 		if user.sudo:
@@ -1998,33 +2126,30 @@ class Installer:
 			return False
 
 		input_data = f'{user.username}:{enc_password}'.encode()
-		cmd = self._chroot_argv('chpasswd', '--encrypted')
 
 		try:
-			run(cmd, input_data=input_data)
+			self._chroot_run('chpasswd', '--encrypted', input_data=input_data)
 			return True
-		except CalledProcessError as err:
+		except SysCallError as err:
 			debug(f'Error setting user password: {err}')
 			return False
 
 	def user_set_shell(self, user: str, shell: str) -> bool:
 		info(f'Setting shell for {user} to {shell}')
 
-		cmd = self._chroot_argv('chsh', '-s', shell, user)
 		try:
-			run(cmd)
+			self._chroot_run('chsh', '-s', shell, user)
 			return True
-		except CalledProcessError as err:
+		except SysCallError as err:
 			debug(f'Error setting user shell: {err}')
 			return False
 
 	def chown(self, owner: str, path: str, options: list[str] | None = None) -> bool:
 		options = options or []
-		cmd = self._chroot_argv('chown', *options, '--', owner, path)
 		try:
-			run(cmd)
+			self._chroot_run('chown', *options, '--', owner, path)
 			return True
-		except CalledProcessError as err:
+		except SysCallError as err:
 			debug(f'Error changing ownership of {path}: {err}')
 			return False
 
@@ -2034,7 +2159,7 @@ class Installer:
 		font_vconsole = locale_config.console_font
 
 		if font_vconsole.startswith('ter-'):
-			self.pacman.strap(['terminus-font'])
+			self.plan_packages('terminus-font')
 
 		# Ensure /etc exists
 		vconsole_dir: Path = self.target / 'etc'
@@ -2097,39 +2222,14 @@ class Installer:
 
 		return True
 
-	def _service_started(self, service_name: str) -> str | None:
-		if os.path.splitext(service_name)[1] not in ('.service', '.target', '.timer'):
-			service_name += '.service'  # Just to be safe
-
-		last_execution_time = (
-			SysCommand(
-				f'systemctl show --property=ActiveEnterTimestamp --no-pager {service_name}',
-				environment_vars={'SYSTEMD_COLORS': '0'},
-			)
-			.decode()
-			.removeprefix('ActiveEnterTimestamp=')
-		)
-
-		if not last_execution_time:
-			return None
-
-		return last_execution_time
-
-	def _service_state(self, service_name: str) -> str:
-		if os.path.splitext(service_name)[1] not in ('.service', '.target', '.timer'):
-			service_name += '.service'  # Just to be safe
-
-		return SysCommand(
-			f'systemctl show --no-pager -p SubState --value {service_name}',
-			environment_vars={'SYSTEMD_COLORS': '0'},
-		).decode()
-
 
 def accessibility_tools_in_use() -> bool:
 	return os.system('systemctl is-active --quiet espeakup.service') == 0  # type: ignore[deprecated]
 
 
 def run_custom_user_commands(commands: list[str], installation: Installer) -> None:
+	# each command gets a fresh arch-chroot with a pty, the commands
+	# can be interactive and don't run in the persistent chroot session
 	for index, command in enumerate(commands):
 		script_path = f'/var/tmp/user-command.{index}.sh'
 		chroot_path = f'{installation.target}/{script_path}'
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import socket
+import struct
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Self
+
+from archinstall.lib.log import debug
+from archinstall.lib.networking import fetch_modified_data
+
+MIRROR_CACHE_DIR = Path('/var/cache/archinstall/mirrors')
+# the mirror status is regenerated by archweb every few minutes, but the
+# scores and the measured speeds of a network don't change that quickly
+DEFAULT_TTL = 6 * 60 * 60
+
+_STATUS_FILE = 'status.json'
+_STATUS_META_FILE = 'status.meta.json'
+
+
+@dataclass
+class MirrorBenchmark:
+	# time to the response headers in seconds
+	latency: float
+	# bytes per second, mirrors which couldn't be reached aren't stored
+	speed: float
+	measured_at: float
+
+	@classmethod
+	def parse_arg(cls, arg: dict[str, Any]) -> Self:
+		return cls(
+			latency=arg['latency'],
+			speed=arg['speed'],
+			measured_at=arg['measured_at'],
+		)
+
+
+def _default_gateway() -> tuple[str, str] | None:
+	try:
+		routes = Path('/proc/net/route').read_text().splitlines()[1:]
+	except OSError:
+		return None
+
+	for route in routes:
+		fields = route.split()
+
+		# the default route has the destination and mask 0.0.0.0
+		if len(fields) >= 8 and fields[1] == '00000000' and fields[7] == '00000000':
+			gateway = socket.inet_ntoa(struct.pack('<L', int(fields[2], 16)))
+			return fields[0], gateway
+
+	return None
+
+
+def _neighbour_mac(interface: str, address: str) -> str | None:
+	try:
+		entries = Path('/proc/net/arp').read_text().splitlines()[1:]
+	except OSError:
+		return None
+
+	for entry in entries:
+		fields = entry.split()
+
+		if len(fields) >= 6 and fields[0] == address and fields[5] == interface and fields[3] != '00:00:00:00:00:00':
+			return fields[3]
+
+	return None
+
+
+def network_identity() -> str:
+	"""
+	Identifies the network the machine is in by the MAC address of the default
+	gateway, or the gateway address if it isn't in the neighbour table yet.
+	The measured mirror speeds are only reused within the same network.
+	"""
+	if (gateway := _default_gateway()) is None:
+		return 'unknown'
+
+	interface, address = gateway
+	identity = _neighbour_mac(interface, address) or f'{interface}-{address}'
+
+	return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+
+class MirrorCache:
+	"""
+	Keeps the mirror status of archlinux.org and the measured mirror speeds
+	on disk, so repeated installations from the same network don't download
+	the status or probe the mirrors again until the entries expire.
+
+	The directory can be copied to machines without network access, where
+	the entries are used regardless of their age.
+	"""
+
+	def __init__(self, cache_dir: Path = MIRROR_CACHE_DIR, ttl: int = DEFAULT_TTL) -> None:
+		self.cache_dir = cache_dir
+		self.ttl = ttl
+		self._identity: str | None = None
+
+	@property
+	def identity(self) -> str:
+		if self._identity is None:
+			self._identity = network_identity()
+			debug(f'Mirror cache network identity: {self._identity}')
+		return self._identity
+
+	@property
+	def _benchmarks_file(self) -> Path:
+		return self.cache_dir / f'benchmarks-{self.identity}.json'
+
+	def _expired(self, timestamp: float) -> bool:
+		return time.time() - timestamp > self.ttl
+
+	def _read_json(self, path: Path) -> Any:
+		try:
+			return json.loads(path.read_text())
+		except FileNotFoundError:
+			return None
+		except (OSError, ValueError) as err:
+			debug(f'Ignoring the mirror cache {path}: {err}')
+			return None
+
+	def _write(self, path: Path, data: str) -> None:
+		try:
+			self.cache_dir.mkdir(parents=True, exist_ok=True)
+			# written next to the file and renamed, so an interrupted write never leaves a truncated cache
+			tmp_path = path.with_suffix('.tmp')
+			tmp_path.write_text(data)
+			tmp_path.replace(path)
+		except OSError as err:
+			debug(f'Unable to write the mirror cache {path}: {err}')
+
+	def _write_json(self, path: Path, data: Any) -> None:
+		self._write(path, json.dumps(data))
+
+	def load_status(self, offline: bool = False) -> str | None:
+		"""
+		Returns the cached mirror status if it hasn't expired yet, or in any case when offline
+		"""
+		meta = self._read_json(self.cache_dir / _STATUS_META_FILE) or {}
+
+		if not offline and self._expired(meta.get('fetched_at', 0)):
+			return None
+
+		try:
+			return (self.cache_dir / _STATUS_FILE).read_text()
+		except OSError:
+			return None
+
+	def fetch_status(self, url: str) -> str:
+		"""
+		Fetches the mirror status unless the cached one is still valid. An expired
+		status is revalidated with its ETag and Last-Modified date, the server then
+		only sends the status again if it has changed.
+		"""
+		if (status := self.load_status()) is not None:
+			debug('Using the cached mirror status')
+			return status
+
+		meta = self._read_json(self.cache_dir / _STATUS_META_FILE) or {}
+		cached = self.load_status(offline=True)
+
+		if cached is None:
+			meta = {}
+
+		data, headers = fetch_modified_data(url, meta.get('etag'), meta.get('last_modified'))
+
+		if data is None:
+			assert cached is not None
+			debug('The mirror status has not changed since it was cached')
+			data = cached
+		else:
+			self._write(self.cache_dir / _STATUS_FILE, data)
+
+		meta = {
+			'etag': headers.get('ETag', meta.get('etag')),
+			'last_modified': headers.get('Last-Modified', meta.get('last_modified')),
+			'fetched_at': time.time(),
+		}
+		self._write_json(self.cache_dir / _STATUS_META_FILE, meta)
+
+		return data
+
+	def load_benchmarks(self, offline: bool = False) -> dict[str, MirrorBenchmark]:
+		"""
+		Returns the measurements of the mirrors in the current network by their url,
+		without the expired ones unless offline
+		"""
+		data = self._read_json(self._benchmarks_file) or {}
+
+		# an air-gapped machine is in a network of its own, the
+		# measurements of all networks are better than none
+		if not data and offline:
+			for path in sorted(self.cache_dir.glob('benchmarks-*.json')):
+				data.update(self._read_json(path) or {})
+
+		benchmarks: dict[str, MirrorBenchmark] = {}
+
+		for url, entry in data.items():
+			try:
+				benchmark = MirrorBenchmark.parse_arg(entry)
+			except KeyError, TypeError:
+				continue
+
+			if offline or not self._expired(benchmark.measured_at):
+				benchmarks[url] = benchmark
+
+		return benchmarks
+
+	def store_benchmarks(self, benchmarks: dict[str, MirrorBenchmark]) -> None:
+		# measurements of other regions are kept
+		data = self._read_json(self._benchmarks_file) or {}
+		data.update({url: asdict(benchmark) for url, benchmark in benchmarks.items()})
+
+		self._write_json(self._benchmarks_file, data)
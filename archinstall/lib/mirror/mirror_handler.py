@@ -1,8 +1,11 @@
+import threading
 import time
 import urllib.parse
 from pathlib import Path
 
 from archinstall.lib.log import debug, info
+from archinstall.lib.mirror.mirror_cache import MirrorCache
+from archinstall.lib.mirror.mirror_ranking import MirrorRanker
 from archinstall.lib.models import MirrorRegion
 from archinstall.lib.models.mirrors import MirrorStatusEntryV3, MirrorStatusListV3
 from archinstall.lib.networking import fetch_data_from_url
@@ -15,10 +18,16 @@ class MirrorListHandler:
 		local_mirrorlist: Path = MIRRORLIST,
 		offline: bool = False,
 		verbose: bool = False,
+		cache: MirrorCache | None = None,
 	) -> None:
 		self._local_mirrorlist = local_mirrorlist
+		self._cache = cache
 		self._status_mappings: dict[str, list[MirrorStatusEntryV3]] | None = None
 		self._fetched_remote: bool = False
+		self._ranked: dict[str, list[MirrorStatusEntryV3]] = {}
+		# the package prefetch ranks the mirrors in the background, the
+		# installation then waits for that ranking instead of starting another
+		self._lock = threading.Lock()
 		self.offline = offline
 		self.verbose = verbose
 
@@ -42,8 +51,9 @@ class MirrorListHandler:
 
 	def load_mirrors(self) -> None:
 		if self.offline:
-			self._fetched_remote = False
-			self.load_local_mirrors()
+			self._fetched_remote = self.load_cached_mirrors()
+			if not self._fetched_remote:
+				self.load_local_mirrors()
 		else:
 			self._fetched_remote = self.load_remote_mirrors()
 			debug(f'load mirrors: {self._fetched_remote}')
@@ -56,7 +66,11 @@ class MirrorListHandler:
 
 		for attempt_nr in range(attempts):
 			try:
-				mirrorlist = fetch_data_from_url(url)
+				if self._cache is not None:
+					mirrorlist = self._cache.fetch_status(url)
+				else:
+					mirrorlist = fetch_data_from_url(url)
+
 				self._status_mappings = self._parse_remote_mirror_list(mirrorlist)
 				return True
 			except Exception as e:
@@ -66,24 +80,57 @@ class MirrorListHandler:
 		debug('Unable to fetch mirror list remotely, falling back to local mirror list')
 		return False
 
+	def load_cached_mirrors(self) -> bool:
+		if self._cache is None or (mirrorlist := self._cache.load_status(offline=True)) is None:
+			return False
+
+		try:
+			self._status_mappings = self._parse_remote_mirror_list(mirrorlist)
+		except ValueError as e:
+			debug(f'Error while parsing the cached mirror list: {e}')
+			return False
+
+		debug(f'Loaded the cached mirror list from {self._cache.cache_dir}')
+		return True
+
 	def load_local_mirrors(self) -> None:
 		with self._local_mirrorlist.open('r') as fp:
 			mirrorlist = fp.read()
 			self._status_mappings = self._parse_local_mirrors(mirrorlist)
 
 	def get_status_by_region(self, region: str, speed_sort: bool) -> list[MirrorStatusEntryV3]:
-		mappings = self._mappings()
-		region_list = mappings[region]
+		with self._lock:
+			mappings = self._mappings()
+			region_list = mappings[region]
+
+			# Only sort if we have remote mirror data with score/speed info
+			# Local mirrors lack this data and can be modified manually before-hand
+			# Or reflector potentially ran already
+			if self._fetched_remote and speed_sort:
+				if region not in self._ranked:
+					self._ranked[region] = self._rank(region_list)
 
-		# Only sort if we have remote mirror data with score/speed info
-		# Local mirrors lack this data and can be modified manually before-hand
-		# Or reflector potentially ran already
-		if self._fetched_remote and speed_sort:
+				return self._ranked[region]
+			# just return as-is without sorting?
+			return region_list
+
+	def _rank(self, mirrors: list[MirrorStatusEntryV3]) -> list[MirrorStatusEntryV3]:
+		known = self._cache.load_benchmarks(offline=self.offline) if self._cache else {}
+		ranker = MirrorRanker()
+
+		if self.offline:
+			# the mirrors can't be reached, only the measurements of earlier runs are used
+			return ranker.rank(mirrors, known, measure=False)
+
+		if any(mirror.url not in known for mirror in mirrors):
 			info('Sorting your selected mirror list based on the speed between you and the individual mirrors (this might take a while)')
-			# Sort by speed descending (higher is better in bitrate form core.db download)
-			return sorted(region_list, key=lambda mirror: -mirror.speed)
-		# just return as-is without sorting?
-		return region_list
+
+		ranked = ranker.rank(mirrors, known)
+
+		if self._cache is not None and ranker.measured:
+			self._cache.store_benchmarks(ranker.measured)
+
+		return ranked
 
 	def _parse_remote_mirror_list(self, mirrorlist: str) -> dict[str, list[MirrorStatusEntryV3]]:
 		context = {'verbose': self.verbose}
@@ -0,0 +1,234 @@
+import math
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Self
+
+from archinstall.lib.log import debug
+from archinstall.lib.mirror.mirror_cache import MirrorBenchmark
+from archinstall.lib.models.mirrors import MirrorStatusEntryV3
+
+# the sync database of extra is large enough to measure the
+# throughput, only the first bytes of it are requested
+_PROBE_PATH = 'extra/os/x86_64/extra.db'
+_CHUNK_SIZE = 64 * 1024
+
+# the download the mirrors are compared on, roughly an average package
+_REFERENCE_SIZE = 2 * 1024 * 1024
+# archweb's score is in hours (sync delay plus check duration, divided by
+# the completion), a mirror that is often out of date costs this much more
+_SCORE_WEIGHT = 0.1
+# the check duration measured by archweb in seconds, which also reflects
+# how responsive the mirror is from elsewhere
+_DURATION_WEIGHT = 0.5
+# the relative error assumed for a mirror that was only measured once
+_SINGLE_SAMPLE_ERROR = 0.5
+# the width of the confidence intervals, in standard errors
+_CONFIDENCE = 2.0
+
+
+@dataclass
+class MirrorProbe:
+	mirror: MirrorStatusEntryV3
+	# time to the response headers in seconds
+	latencies: list[float] = field(default_factory=list)
+	# bytes per second
+	throughputs: list[float] = field(default_factory=list)
+	# measured in this run rather than taken from the cache
+	probed: bool = False
+
+	@property
+	def failed(self) -> bool:
+		return not self.throughputs
+
+	def _sample_costs(self) -> list[float]:
+		return [latency + _REFERENCE_SIZE / throughput for latency, throughput in zip(self.latencies, self.throughputs)]
+
+	def _score_factor(self) -> float:
+		return 1 + _SCORE_WEIGHT * (self.mirror.score or 0)
+
+	@property
+	def cost(self) -> float:
+		"""
+		The expected seconds to download the reference size from the mirror, combining
+		the measured latency and throughput with the score and check duration of archweb
+		"""
+		if self.failed:
+			return math.inf
+
+		costs = self._sample_costs()
+		measured = sum(costs) / len(costs) + _DURATION_WEIGHT * (self.mirror.duration_avg or 0)
+
+		return measured * self._score_factor()
+
+	@property
+	def error(self) -> float:
+		"""
+		The standard error of the cost
+		"""
+		costs = self._sample_costs()
+
+		if len(costs) < 2:
+			return self.cost * _SINGLE_SAMPLE_ERROR
+
+		mean = sum(costs) / len(costs)
+		variance = sum((cost - mean) ** 2 for cost in costs) / (len(costs) - 1)
+
+		return math.sqrt(variance / len(costs)) * self._score_factor()
+
+	@property
+	def latency(self) -> float:
+		if not self.latencies:
+			return 0
+		return sum(self.latencies) / len(self.latencies)
+
+	@property
+	def speed(self) -> float:
+		if not self.throughputs:
+			return 0
+		return sum(self.throughputs) / len(self.throughputs)
+
+	@classmethod
+	def from_benchmark(cls, mirror: MirrorStatusEntryV3, benchmark: MirrorBenchmark | None) -> Self:
+		probe = cls(mirror)
+
+		if benchmark and benchmark.speed > 0:
+			probe.latencies.append(benchmark.latency)
+			probe.throughputs.append(benchmark.speed)
+
+		return probe
+
+	def benchmark(self) -> MirrorBenchmark:
+		return MirrorBenchmark(latency=self.latency, speed=self.speed, measured_at=time.time())
+
+
+class MirrorRanker:
+	"""
+	Ranks mirrors by probing them concurrently. Every probe is a Range
+	request for a fixed number of bytes, which is enough to tell the
+	latency and throughput apart without downloading a whole database.
+
+	After the first round only the mirrors around the top N are probed
+	again, until the confidence intervals of the top N and the rest don't
+	overlap anymore or the rounds run out.
+	"""
+
+	def __init__(
+		self,
+		top_n: int = 10,
+		workers: int = 16,
+		byte_budget: int = 512 * 1024,
+		max_rounds: int = 3,
+		timeout: float = 5,
+	) -> None:
+		self.top_n = top_n
+		self.workers = workers
+		self.byte_budget = byte_budget
+		self.max_rounds = max_rounds
+		self.timeout = timeout
+		# the successful measurements of the last ranking by url, without the known ones
+		self.measured: dict[str, MirrorBenchmark] = {}
+
+	def _measure(self, probe: MirrorProbe) -> None:
+		url = f'{probe.mirror.url}{_PROBE_PATH}'
+		req = urllib.request.Request(url, headers={'Range': f'bytes=0-{self.byte_budget - 1}'})
+		probe.probed = True
+
+		try:
+			start = time.monotonic()
+
+			with urllib.request.urlopen(req, None, self.timeout) as handle:
+				latency = time.monotonic() - start
+				deadline = start + self.timeout
+				size = 0
+
+				# servers ignoring the range send the whole file, so stop at the budget
+				while size < self.byte_budget and time.monotonic() < deadline:
+					if not (chunk := handle.read(min(_CHUNK_SIZE, self.byte_budget - size))):
+						break
+					size += len(chunk)
+
+			elapsed = time.monotonic() - start - latency
+		except (urllib.error.URLError, OSError, ValueError) as err:
+			debug(f'Probing {url} failed: {err}')
+			return
+
+		if size == 0:
+			return
+
+		probe.latencies.append(latency)
+		probe.throughputs.append(size / max(elapsed, 1e-3))
+
+	def _probe_all(self, probes: list[MirrorProbe]) -> None:
+		with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(probes)))) as executor:
+			list(executor.map(self._measure, probes))
+
+	def _undecided(self, ranked: list[MirrorProbe]) -> list[MirrorProbe]:
+		"""
+		Returns the mirrors whose confidence interval crosses the boundary between
+		the top N and the rest, an empty list once the top N are separated
+		"""
+		top, rest = ranked[: self.top_n], [probe for probe in ranked[self.top_n :] if not probe.failed]
+
+		if not rest:
+			return []
+
+		top_upper = max(probe.cost + _CONFIDENCE * probe.error for probe in top)
+		rest_lower = min(probe.cost - _CONFIDENCE * probe.error for probe in rest)
+
+		if top_upper < rest_lower:
+			return []
+
+		return [
+			probe
+			for probe in ranked
+			if not probe.failed and probe.cost - _CONFIDENCE * probe.error <= top_upper and probe.cost + _CONFIDENCE * probe.error >= rest_lower
+		]
+
+	def rank(
+		self,
+		mirrors: list[MirrorStatusEntryV3],
+		known: dict[str, MirrorBenchmark] | None = None,
+		measure: bool = True,
+	) -> list[MirrorStatusEntryV3]:
+		"""
+		Ranks the mirrors, the known measurements are used in place of the first
+		round of probes. Without measuring, the mirrors are ranked by the known
+		measurements alone, unknown mirrors last.
+		"""
+		if not mirrors:
+			return []
+
+		# a mirror which couldn't be reached is probed again rather than left out until the entry expires
+		known = {url: benchmark for url, benchmark in (known or {}).items() if benchmark.speed > 0}
+		probes = [MirrorProbe.from_benchmark(mirror, known.get(mirror.url)) for mirror in mirrors]
+		start = time.monotonic()
+
+		if measure:
+			self._probe_all([probe for probe in probes if probe.mirror.url not in known])
+
+		ranked = sorted(probes, key=lambda probe: probe.cost)
+
+		for round_nr in range(1, self.max_rounds if measure else 1):
+			if not (undecided := self._undecided(ranked)):
+				debug(f'Top {self.top_n} mirrors separated after {round_nr} rounds')
+				break
+
+			debug(f'Probing {len(undecided)} mirrors again (round {round_nr + 1})')
+			self._probe_all(undecided)
+			ranked = sorted(probes, key=lambda probe: probe.cost)
+
+		debug(f'Ranked {len(mirrors)} mirrors in {time.monotonic() - start:.1f}s')
+
+		self.measured = {probe.mirror.url: probe.benchmark() for probe in probes if probe.probed and not probe.failed}
+
+		for probe in ranked:
+			# the measured speed replaces the serial download of core.db
+			probe.mirror._speed = probe.speed
+			# in milliseconds like the ICMP latency
+			probe.mirror._latency = probe.latency * 1000 if probe.latencies else None
+			debug(f'	{probe.mirror.url}: {probe.cost:.2f}s ({probe.speed / 1024 / 1024:.2f} MiB/s)')
+
+		return [probe.mirror for probe in ranked]
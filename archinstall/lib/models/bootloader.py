@@ -33,6 +33,19 @@ class Bootloader(Enum):
 			case _:
 				return False
 
+	def packages(self, uefi: bool) -> list[str]:
+		match self:
+			case Bootloader.Systemd | Bootloader.Efistub:
+				return ['efibootmgr']
+			case Bootloader.Grub:
+				return ['grub', 'efibootmgr'] if uefi else ['grub']
+			case Bootloader.Limine:
+				return ['limine', 'efibootmgr'] if uefi else ['limine']
+			case Bootloader.Refind:
+				return ['refind']
+			case _:
+				return []
+
 	def json(self) -> str:
 		return self.value
 
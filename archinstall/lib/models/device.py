@@ -1,6 +1,7 @@
 import builtins
 import math
 import uuid
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from enum import Enum, StrEnum, auto
 from pathlib import Path
@@ -157,6 +158,8 @@ class DiskLayoutConfiguration(SubConfig):
 			device_modification = DeviceModification(
 				wipe=entry.get('wipe', False),
 				device=device,
+				wipe_mode=WipeMode(entry.get('wipe_mode', WipeMode.SIGNATURES.value)),
+				verify_wipe=entry.get('verify_wipe', False),
 			)
 
 			device_partitions: list[PartitionModification] = []
@@ -180,6 +183,7 @@ class DiskLayoutConfiguration(SubConfig):
 					type=PartitionType(partition['type']),
 					flags=flags,
 					btrfs_subvols=SubvolumeModification.parse_args(partition.get('btrfs', [])),
+					fs_profile=FsProfile(partition.get('fs_profile', FsProfile.DEFAULT.value)),
 				)
 				# special 'invisible' attr to internally identify the part mod
 				device_partition._obj_id = partition['obj_id']
@@ -461,6 +465,13 @@ class Size:
 		src_norm = self._normalize()
 		return self - Size(abs(src_norm % align_norm), Unit.B, self.sector_size)
 
+	def sectors(self, sector_size: SectorSize) -> int:
+		"""
+		The size in sectors, rounded up like convert(Unit.sectors) but without
+		creating intermediate Size objects
+		"""
+		return -(-self._normalize() // sector_size.normalize())
+
 	def gpt_end(self) -> Size:
 		return self - Size(1, Unit.MiB, self.sector_size)
 
@@ -514,6 +525,24 @@ class BtrfsMountOption(Enum):
 	nodatacow = 'nodatacow'
 
 
+class FsProfile(StrEnum):
+	# the defaults of mkfs, only adjusted to the RAID geometry
+	DEFAULT = auto()
+	# large sequential transfers, e.g. compression and larger metadata nodes
+	THROUGHPUT = auto()
+	# small synchronous writes, e.g. a fast commit journal
+	LATENCY = auto()
+
+	def display_msg(self) -> str:
+		match self:
+			case FsProfile.DEFAULT:
+				return tr('Default')
+			case FsProfile.THROUGHPUT:
+				return tr('Throughput')
+			case FsProfile.LATENCY:
+				return tr('Latency')
+
+
 @dataclass
 class _BtrfsSubvolumeInfo:
 	name: Path
@@ -535,7 +564,17 @@ class _PartitionInfo:
 	uuid: str | None
 	disk: Disk
 	mountpoints: list[Path]
-	btrfs_subvol_infos: list[_BtrfsSubvolumeInfo] = field(default_factory=list)
+	_btrfs_subvol_infos: list[_BtrfsSubvolumeInfo] | None = field(default=None, repr=False, compare=False)
+	_btrfs_loader: Callable[[], list[_BtrfsSubvolumeInfo]] | None = field(default=None, repr=False, compare=False)
+
+	@property
+	def btrfs_subvol_infos(self) -> list[_BtrfsSubvolumeInfo]:
+		# listing the subvolumes may require mounting the partition,
+		# so it's only done once the information is actually needed
+		if self._btrfs_subvol_infos is None:
+			self._btrfs_subvol_infos = self._btrfs_loader() if self._btrfs_loader else []
+
+		return self._btrfs_subvol_infos
 
 	@property
 	def sector_size(self) -> SectorSize:
@@ -567,7 +606,8 @@ class _PartitionInfo:
 		partition: Partition,
 		lsblk_info: LsblkInfo,
 		fs_type: FilesystemType | None,
-		btrfs_subvol_infos: list[_BtrfsSubvolumeInfo] = [],
+		btrfs_subvol_infos: list[_BtrfsSubvolumeInfo] | None = None,
+		btrfs_loader: Callable[[], list[_BtrfsSubvolumeInfo]] | None = None,
 	) -> Self:
 		partition_type = PartitionType.get_type_from_code(partition.type)
 		flags = [f for f in PartitionFlag if partition.getFlag(f.flag_id)]
@@ -598,7 +638,8 @@ class _PartitionInfo:
 			uuid=lsblk_info.uuid,
 			disk=partition.disk,
 			mountpoints=lsblk_info.mountpoints,
-			btrfs_subvol_infos=btrfs_subvol_infos,
+			_btrfs_subvol_infos=btrfs_subvol_infos,
+			_btrfs_loader=btrfs_loader,
 		)
 
 
@@ -655,6 +696,61 @@ class _DeviceInfo:
 		)
 
 
+@dataclass
+class DeviceSummary:
+	"""
+	Overview of a block device that is built from lsblk and sysfs only,
+	without opening the device and reading its partition table
+	"""
+
+	model: str
+	path: Path
+	type: str
+	total_size: Size
+	sector_size: SectorSize
+	rotational: bool
+	transport: str | None
+	read_only: bool
+
+	@override
+	def __hash__(self) -> int:
+		return hash(self.path)
+
+	def table_data(self) -> dict[str, str | int | bool]:
+		return {
+			'Model': self.model,
+			'Path': str(self.path),
+			'Type': self.type,
+			'Size': self.total_size.format_highest(),
+			'Transport': self.transport or '',
+			'Rotational': self.rotational,
+			'Sector size': self.sector_size.value,
+			'Read only': self.read_only,
+		}
+
+	@staticmethod
+	def _read_sysfs(path: Path) -> str:
+		try:
+			return path.read_text().strip()
+		except OSError:
+			return ''
+
+	@classmethod
+	def from_lsblk(cls, lsblk_info: LsblkInfo) -> Self:
+		sysfs = Path('/sys/class/block') / lsblk_info.name
+
+		return cls(
+			model=cls._read_sysfs(sysfs / 'device/model'),
+			path=lsblk_info.path,
+			type=lsblk_info.type or 'unknown',
+			total_size=lsblk_info.size,
+			sector_size=SectorSize(lsblk_info.log_sec, Unit.B),
+			rotational=lsblk_info.rota,
+			transport=lsblk_info.tran,
+			read_only=cls._read_sysfs(sysfs / 'ro') == '1',
+		)
+
+
 class _SubvolumeModificationSerialization(TypedDict):
 	name: str
 	mountpoint: str
@@ -809,6 +905,12 @@ class PartitionGUID(Enum):
 	"""
 
 	LINUX_ROOT_X86_64 = '4F68BCE3-E8CD-4DB1-96E7-FBCAF984B709'
+	LINUX_HOME = '933AC7E1-2EB4-4F13-B844-0E14E2AEF915'
+	LINUX_SWAP = '0657FD6D-A4AB-43C4-84E5-0933C84B4F4F'
+	LINUX_FILESYSTEM = '0FC63DAF-8483-4772-8E79-3D69D8477DE4'
+	EFI_SYSTEM = 'C12A7328-F81F-11D2-BA4B-00A0C93EC93B'
+	XBOOTLDR = 'BC13C2FF-59E6-4262-A352-B275FD6F7172'
+	BASIC_DATA = 'EBD0A0A2-B9E5-4433-87C0-68B6B72699C7'
 
 	@property
 	def bytes(self) -> builtins.bytes:
@@ -874,6 +976,7 @@ class _PartitionModificationSerialization(TypedDict):
 	flags: list[str]
 	btrfs: list[_SubvolumeModificationSerialization]
 	dev_path: str | None
+	fs_profile: NotRequired[str]
 
 
 @dataclass
@@ -887,6 +990,7 @@ class PartitionModification:
 	mount_options: list[str] = field(default_factory=list)
 	flags: list[PartitionFlag] = field(default_factory=list)
 	btrfs_subvols: list[SubvolumeModification] = field(default_factory=list)
+	fs_profile: FsProfile = FsProfile.DEFAULT
 
 	# only set if the device was created or exists
 	dev_path: Path | None = None
@@ -1051,6 +1155,7 @@ class PartitionModification:
 			'flags': [f.description for f in self.flags],
 			'dev_path': str(self.dev_path) if self.dev_path else None,
 			'btrfs': [vol.json() for vol in self.btrfs_subvols],
+			'fs_profile': self.fs_profile.value,
 		}
 
 	def table_data(self) -> dict[str, str]:
@@ -1070,6 +1175,9 @@ class PartitionModification:
 			'Flags': ', '.join(f.description for f in self.flags),
 		}
 
+		if self.fs_profile != FsProfile.DEFAULT:
+			part_mod['FS profile'] = self.fs_profile.value
+
 		if self.btrfs_subvols:
 			part_mod['Btrfs vol.'] = f'{len(self.btrfs_subvols)} subvolumes'
 
@@ -1388,9 +1496,20 @@ class BtrfsOptions:
 		return None
 
 
+class WipeMode(StrEnum):
+	# zero the known metadata locations at the start and end of the device
+	SIGNATURES = auto()
+	# additionally discard all blocks, e.g. on SSDs and NVMe drives
+	DISCARD = auto()
+	# zero the entire device
+	ZERO = auto()
+
+
 class _DeviceModificationSerialization(TypedDict):
 	device: str
 	wipe: bool
+	wipe_mode: NotRequired[str]
+	verify_wipe: NotRequired[bool]
 	partitions: list[_PartitionModificationSerialization]
 
 
@@ -1399,6 +1518,8 @@ class DeviceModification:
 	device: BDevice
 	wipe: bool
 	partitions: list[PartitionModification] = field(default_factory=list)
+	wipe_mode: WipeMode = WipeMode.SIGNATURES
+	verify_wipe: bool = False
 
 	@property
 	def device_path(self) -> Path:
@@ -1432,6 +1553,8 @@ class DeviceModification:
 		return {
 			'device': str(self.device.device_info.path),
 			'wipe': self.wipe,
+			'wipe_mode': self.wipe_mode.value,
+			'verify_wipe': self.verify_wipe,
 			'partitions': [p.json() for p in self.partitions],
 		}
 
@@ -1462,12 +1585,116 @@ class EncryptionType(StrEnum):
 		return type_to_text[self]
 
 
+class _DmCryptPerfSerialization(TypedDict):
+	no_read_workqueue: bool
+	no_write_workqueue: bool
+	allow_discards: bool
+	sector_size: NotRequired[int]
+
+
+@dataclass
+class DmCryptPerf:
+	"""
+	Performance options of dm-crypt. By default dm-crypt queues all reads and
+	writes to its own workqueues, which only pays off on slow rotational disks,
+	and hides the free blocks from the device. The sector size is the unit of
+	the encryption, larger sectors mean fewer cipher operations.
+	"""
+
+	no_read_workqueue: bool = False
+	no_write_workqueue: bool = False
+	allow_discards: bool = False
+	# None lets cryptsetup choose
+	sector_size: int | None = None
+
+	@classmethod
+	def from_lsblk(cls, lsblk_info: LsblkInfo) -> Self:
+		"""
+		Selects the options for a device: the workqueues are bypassed and discards
+		are passed through on SSDs and NVMe drives, and 4 KiB sectors are used on
+		everything that doesn't emulate 512 byte sectors on a rotational disk
+		"""
+		solid_state = not lsblk_info.rota or lsblk_info.tran == 'nvme'
+
+		return cls(
+			no_read_workqueue=solid_state,
+			no_write_workqueue=solid_state,
+			allow_discards=solid_state,
+			sector_size=4096 if solid_state or lsblk_info.log_sec >= 4096 else None,
+		)
+
+	def format_args(self) -> list[str]:
+		if self.sector_size:
+			return ['--sector-size', str(self.sector_size)]
+		return []
+
+	def open_args(self) -> list[str]:
+		args = []
+
+		if self.no_read_workqueue:
+			args.append('--perf-no_read_workqueue')
+		if self.no_write_workqueue:
+			args.append('--perf-no_write_workqueue')
+		if self.allow_discards:
+			args.append('--allow-discards')
+
+		return args
+
+	def crypttab_options(self) -> list[str]:
+		"""
+		The options in the syntax of crypttab, which is also used by rd.luks.options
+		"""
+		options = []
+
+		if self.allow_discards:
+			options.append('discard')
+		if self.no_read_workqueue:
+			options.append('no-read-workqueue')
+		if self.no_write_workqueue:
+			options.append('no-write-workqueue')
+
+		return options
+
+	def cryptdevice_options(self) -> list[str]:
+		"""
+		The options in the syntax of the cryptdevice parameter of the encrypt hook
+		"""
+		return [option.replace('discard', 'allow-discards') for option in self.crypttab_options()]
+
+	def json(self) -> _DmCryptPerfSerialization:
+		obj: _DmCryptPerfSerialization = {
+			'no_read_workqueue': self.no_read_workqueue,
+			'no_write_workqueue': self.no_write_workqueue,
+			'allow_discards': self.allow_discards,
+		}
+
+		if self.sector_size:
+			obj['sector_size'] = self.sector_size
+
+		return obj
+
+	@classmethod
+	def parse_arg(cls, arg: _DmCryptPerfSerialization) -> Self:
+		sector_size = arg.get('sector_size', None)
+
+		if sector_size is not None and sector_size not in (512, 1024, 2048, 4096):
+			raise ValueError(f'Invalid dm-crypt sector size: {sector_size}')
+
+		return cls(
+			no_read_workqueue=arg.get('no_read_workqueue', False),
+			no_write_workqueue=arg.get('no_write_workqueue', False),
+			allow_discards=arg.get('allow_discards', False),
+			sector_size=sector_size,
+		)
+
+
 class _DiskEncryptionSerialization(TypedDict):
 	encryption_type: str
 	partitions: list[str]
 	lvm_volumes: list[str]
 	hsm_device: NotRequired[_Fido2DeviceSerialization]
 	iter_time: NotRequired[int]
+	perf: NotRequired[_DmCryptPerfSerialization]
 
 
 @dataclass
@@ -1478,6 +1705,8 @@ class DiskEncryption:
 	lvm_volumes: list[LvmVolume] = field(default_factory=list)
 	hsm_device: Fido2Device | None = None
 	iter_time: int = DEFAULT_ITER_TIME
+	# dm-crypt options for all devices, None selects them for each device
+	perf: DmCryptPerf | None = None
 
 	def __post_init__(self) -> None:
 		if self.encryption_type in [EncryptionType.LUKS, EncryptionType.LVM_ON_LUKS] and not self.partitions:
@@ -1505,6 +1734,9 @@ class DiskEncryption:
 		if self.iter_time != DEFAULT_ITER_TIME:  # Only include if not default
 			obj['iter_time'] = self.iter_time
 
+		if self.perf:
+			obj['perf'] = self.perf.json()
+
 		return obj
 
 	@staticmethod
@@ -1562,6 +1794,9 @@ class DiskEncryption:
 		if iter_time := disk_encryption.get('iter_time', None):
 			enc.iter_time = iter_time
 
+		if perf := disk_encryption.get('perf', None):
+			enc.perf = DmCryptPerf.parse_arg(perf)
+
 		return enc
 
 
@@ -161,29 +161,6 @@ class PackageGroup:
 		packages = [line.split()[1].strip() for line in data if line.strip()]
 		return cls(name, packages)
 
-	@classmethod
-	def from_available_packages(
-		cls,
-		packages: dict[str, AvailablePackage],
-	) -> dict[str, Self]:
-		pkg_groups: dict[str, Self] = {}
-
-		for pkg in packages.values():
-			if 'None' in pkg.groups:
-				continue
-
-			groups = pkg.groups.split(' ')
-
-			for group in groups:
-				# same group names have multiple spaces in between
-				if len(group) == 0:
-					continue
-
-				pkg_groups.setdefault(group, cls(group))
-				pkg_groups[group].packages.append(pkg.name)
-
-		return pkg_groups
-
 	def info(self) -> str:
 		output = tr('Package group:') + '\n  - '
 		output += '\n  - '.join(self.packages)
@@ -6,11 +6,12 @@ import socket
 import ssl
 import struct
 import time
+from email.message import Message
 from types import FrameType, TracebackType
 from typing import Self
-from urllib.error import URLError
+from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
-from urllib.request import urlopen
+from urllib.request import Request, urlopen
 
 from archinstall.lib.exceptions import DownloadTimeout, SysCallError
 from archinstall.lib.log import debug, error, info
@@ -121,10 +122,15 @@ def enrich_iface_types(interfaces: list[str]) -> dict[str, str]:
 	return result
 
 
-def fetch_data_from_url(url: str, params: dict[str, str] | None = None, timeout: int = 30) -> str:
+def _ssl_context() -> ssl.SSLContext:
 	ssl_context = ssl.create_default_context()
 	ssl_context.check_hostname = False
 	ssl_context.verify_mode = ssl.CERT_NONE
+	return ssl_context
+
+
+def fetch_data_from_url(url: str, params: dict[str, str] | None = None, timeout: int = 30) -> str:
+	ssl_context = _ssl_context()
 
 	if params is not None:
 		encoded = urlencode(params)
@@ -142,6 +148,36 @@ def fetch_data_from_url(url: str, params: dict[str, str] | None = None, timeout:
 		raise ValueError(f'Unexpected error when parsing response: {e}')
 
 
+def fetch_modified_data(
+	url: str,
+	etag: str | None = None,
+	last_modified: str | None = None,
+	timeout: int = 30,
+) -> tuple[str | None, Message]:
+	"""
+	Fetches the data of an url unless it wasn't modified since the given ETag or
+	Last-Modified header, in which case None is returned with the response headers
+	"""
+	headers = {}
+
+	if etag:
+		headers['If-None-Match'] = etag
+	if last_modified:
+		headers['If-Modified-Since'] = last_modified
+
+	try:
+		with urlopen(Request(url, headers=headers), context=_ssl_context(), timeout=timeout) as response:
+			return response.read().decode('UTF-8'), response.headers
+	except HTTPError as e:
+		if e.code == 304:
+			return None, e.headers
+		raise ValueError(f'Unable to fetch data from url: {url}\n{e}')
+	except URLError as e:
+		raise ValueError(f'Unable to fetch data from url: {url}\n{e}')
+	except Exception as e:
+		raise ValueError(f'Unexpected error when parsing response: {e}')
+
+
 def calc_checksum(icmp_packet: bytes) -> int:
 	# Calculate the ICMP checksum
 	checksum = 0
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Any
+
+from archinstall.lib.log import debug
+from archinstall.lib.models.packages import Repository
+from archinstall.lib.packages.package_index import PACMAN_SYNC_DIR, PackageIndex
+
+# hidden, so it isn't mistaken for a database of a repository
+INDEX_CACHE_NAME = '.archinstall-package-index'
+
+_MAGIC = b'AIPKGIDX'
+_VERSION = 1
+# magic, version and the length of the JSON header
+_PREAMBLE = struct.Struct(f'<{len(_MAGIC)}sII')
+# the string ids of the columns
+_ID_TYPE = 'I'
+
+
+def _database_key(repositories: list[Repository], sync_dir: Path, with_hash: bool) -> list[dict[str, Any]]:
+	"""
+	Identifies the state of the sync databases by their modification time and
+	size, and optionally by the hash of their content
+	"""
+	key: list[dict[str, Any]] = []
+
+	for repository in repositories:
+		path = sync_dir / f'{repository.value}.db'
+		entry: dict[str, Any] = {'repository': repository.value}
+
+		try:
+			stat = path.stat()
+			entry |= {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+			if with_hash:
+				with path.open('rb') as fp:
+					entry['sha256'] = hashlib.file_digest(fp, 'sha256').hexdigest()
+		except OSError:
+			entry['missing'] = True
+
+		key.append(entry)
+
+	return key
+
+
+def _pack_ids(ids: list[int]) -> bytes:
+	return array(_ID_TYPE, ids).tobytes()
+
+
+def _unpack_ids(data: bytes | memoryview) -> list[int]:
+	ids = array(_ID_TYPE)
+	ids.frombytes(data)
+	return ids.tolist()
+
+
+def save_index(index: PackageIndex, repositories: list[Repository], sync_dir: Path = PACMAN_SYNC_DIR) -> None:
+	"""
+	Writes the index as a string table and one array of string ids per column,
+	preceded by a JSON header with the key of the sync databases
+	"""
+	path = sync_dir / INDEX_CACHE_NAME
+	strings: dict[str, int] = {}
+
+	def string_ids(values: list[str]) -> bytes:
+		return _pack_ids([strings.setdefault(value, len(strings)) for value in values])
+
+	fields = list(index.columns)
+	columns = [string_ids(index.columns[field]) for field in fields]
+	repositories_column = string_ids(index.repositories)
+	order = _pack_ids(index.sorted_numbers)
+
+	# the values never contain a null byte, so it separates the strings
+	string_table = '\0'.join(strings).encode()
+
+	sections: dict[str, list[int]] = {}
+	body = bytearray()
+
+	for name, data in [('strings', string_table), ('repositories', repositories_column), ('order', order)] + list(zip(fields, columns)):
+		sections[name] = [len(body), len(data)]
+		body += data
+		# keeps the arrays aligned to their item size
+		body += b'\0' * (-len(body) % array(_ID_TYPE).itemsize)
+
+	header = json.dumps(
+		{
+			'key': _database_key(repositories, sync_dir, with_hash=True),
+			'byteorder': sys.byteorder,
+			'count': len(index),
+			'fields': fields,
+			'sections': sections,
+		}
+	).encode()
+
+	try:
+		tmp_path = path.with_name(f'{path.name}.tmp')
+
+		with tmp_path.open('wb') as fp:
+			fp.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+			fp.write(header)
+			fp.write(body)
+
+		tmp_path.replace(path)
+		debug(f'Saved the package index to {path}')
+	except OSError as err:
+		debug(f'Unable to save the package index to {path}: {err}')
+
+
+def _valid_key(cached: list[dict[str, Any]], repositories: list[Repository], sync_dir: Path) -> bool:
+	def without_hash(key: list[dict[str, Any]]) -> list[dict[str, Any]]:
+		return [{name: value for name, value in entry.items() if name != 'sha256'} for entry in key]
+
+	# the hashes are only computed if the modification times and sizes match
+	if without_hash(cached) != _database_key(repositories, sync_dir, with_hash=False):
+		return False
+
+	return cached == _database_key(repositories, sync_dir, with_hash=True)
+
+
+def load_cached_index(repositories: list[Repository], sync_dir: Path = PACMAN_SYNC_DIR) -> PackageIndex | None:
+	"""
+	Returns the cached index if it was created from the current sync databases
+	"""
+	path = sync_dir / INDEX_CACHE_NAME
+
+	try:
+		data = memoryview(path.read_bytes())
+	except OSError:
+		return None
+
+	try:
+		magic, version, header_size = _PREAMBLE.unpack_from(data)
+
+		if magic != _MAGIC or version != _VERSION:
+			return None
+
+		header = json.loads(bytes(data[_PREAMBLE.size : _PREAMBLE.size + header_size]))
+		fields = header['fields']
+
+		if header['byteorder'] != sys.byteorder or sorted(fields) != sorted(PackageIndex().columns):
+			return None
+
+		if not _valid_key(header['key'], repositories, sync_dir):
+			debug('The sync databases changed since the package index was cached')
+			return None
+
+		body = data[_PREAMBLE.size + header_size :]
+
+		def section(name: str) -> memoryview:
+			offset, size = header['sections'][name]
+			return body[offset : offset + size]
+
+		strings = bytes(section('strings')).decode().split('\0')
+
+		def column(name: str) -> list[str]:
+			values = list(map(strings.__getitem__, _unpack_ids(section(name))))
+
+			if len(values) != header['count']:
+				raise ValueError(f'Column {name} has {len(values)} values instead of {header["count"]}')
+
+			return values
+
+		return PackageIndex.from_columns(
+			repositories=column('repositories'),
+			columns={field: column(field) for field in fields},
+			order=_unpack_ids(section('order')),
+		)
+	except (KeyError, IndexError, ValueError, struct.error) as err:
+		debug(f'Ignoring the package index cache {path}: {err}')
+		return None
+
+
+def load_index(repositories: list[Repository], sync_dir: Path = PACMAN_SYNC_DIR) -> PackageIndex:
+	"""
+	Returns the index of the sync databases, from the cache if it's still valid
+	"""
+	start = time.monotonic()
+
+	if (index := load_cached_index(repositories, sync_dir)) is not None:
+		debug(f'Loaded {len(index)} packages from the package index cache in {time.monotonic() - start:.3f}s')
+		return index
+
+	index = PackageIndex.load(repositories, sync_dir)
+	save_index(index, repositories, sync_dir)
+
+	return index
@@ -0,0 +1,354 @@
+import bz2
+import gzip
+import lzma
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from compression import zstd
+from io import BufferedIOBase
+from pathlib import Path
+from typing import Self
+
+from archinstall.lib.log import debug
+from archinstall.lib.models.packages import AvailablePackage, PackageGroup, Repository
+
+PACMAN_SYNC_DIR = Path('/var/lib/pacman/sync')
+
+# the fields of the desc files in the sync databases which are kept, multiple values are separated by newlines
+_FIELDS = (
+	'NAME',
+	'VERSION',
+	'DESC',
+	'ARCH',
+	'URL',
+	'LICENSE',
+	'GROUPS',
+	'DEPENDS',
+	'OPTDEPENDS',
+	'PROVIDES',
+	'REPLACES',
+	'CSIZE',
+	'ISIZE',
+	'BUILDDATE',
+	'PACKAGER',
+	'VALIDATION',
+)
+# values which repeat across many packages share one string
+_INTERNED = {'ARCH', 'LICENSE', 'PACKAGER', 'VALIDATION'}
+_SIZE_UNITS = ('B', 'KiB', 'MiB', 'GiB', 'TiB')
+_TAR_BLOCK = 512
+
+
+def _parse_desc(desc: str) -> dict[str, str]:
+	"""
+	Parses the desc file of a package, which consists of blocks
+	of a %FIELD% line followed by the values, one per line
+	"""
+	fields: dict[str, str] = {}
+
+	for block in desc.split('\n\n'):
+		header, _, values = block.strip('\n').partition('\n')
+
+		if header.startswith('%') and header.endswith('%'):
+			fields[header[1:-1]] = values
+
+	# the same as "Validated By" of pacman
+	validation = [name for field, name in (('SHA256SUM', 'SHA-256 Sum'), ('PGPSIG', 'Signature')) if field in fields]
+	fields['VALIDATION'] = '\n'.join(validation)
+
+	return fields
+
+
+def _format_list(value: str) -> str:
+	return '  '.join(value.splitlines()) or 'None'
+
+
+def _format_size(value: str) -> str:
+	size = float(value or 0)
+
+	for unit in _SIZE_UNITS:
+		if size < 1024 or unit == _SIZE_UNITS[-1]:
+			break
+		size /= 1024
+
+	return f'{size:.2f} {unit}'
+
+
+def _open_compressed(path: Path) -> BufferedIOBase:
+	with path.open('rb') as fp:
+		magic = fp.read(6)
+
+	if magic.startswith(b'\x1f\x8b'):
+		return gzip.open(path, 'rb')
+	if magic.startswith(b'\x28\xb5\x2f\xfd'):
+		return zstd.open(path, 'rb')
+	if magic.startswith(b'\xfd7zXZ'):
+		return lzma.open(path, 'rb')
+	if magic.startswith(b'BZh'):
+		return bz2.open(path, 'rb')
+
+	return path.open('rb')
+
+
+def _tar_members(fp: BufferedIOBase) -> Iterator[tuple[str, bytes]]:
+	"""
+	Yields the name and content of the regular files in a tar stream. The sync
+	databases only contain small files, walking the headers directly is several
+	times faster than tarfile, which builds a TarInfo with every field per member.
+	"""
+	long_name: str | None = None
+
+	while len(header := fp.read(_TAR_BLOCK)) == _TAR_BLOCK and header.strip(b'\0'):
+		size = int(header[124:136].rstrip(b'\0 ') or b'0', 8)
+		data = fp.read(size)
+		fp.read(-size % _TAR_BLOCK)
+
+		type_flag = header[156:157]
+
+		match type_flag:
+			case b'L':
+				# GNU long name of the next member
+				long_name = data.rstrip(b'\0').decode()
+				continue
+			case b'x':
+				# pax extended header of the next member, "<length> path=<name>\n"
+				for record in data.decode(errors='replace').splitlines():
+					if (field := record.partition(' ')[2]).startswith('path='):
+						long_name = field.removeprefix('path=')
+				continue
+
+		if long_name is not None:
+			name, long_name = long_name, None
+		else:
+			name = header[0:100].rstrip(b'\0').decode()
+
+			# the ustar prefix of long names
+			if header[257:262] == b'ustar' and (prefix := header[345:500].rstrip(b'\0')):
+				name = f'{prefix.decode()}/{name}'
+
+		if type_flag in (b'0', b'\0'):
+			yield name, data
+
+
+class PackageEntry:
+	"""
+	A package of the index, the full package is only created
+	when it is needed, e.g. when the package is previewed
+	"""
+
+	__slots__ = ('_index', '_nr', '_package')
+
+	def __init__(self, index: PackageIndex, nr: int) -> None:
+		self._index = index
+		self._nr = nr
+		self._package: AvailablePackage | None = None
+
+	@property
+	def name(self) -> str:
+		return self._index.names[self._nr]
+
+	@property
+	def package(self) -> AvailablePackage:
+		if self._package is None:
+			self._package = self._index.package(self._nr)
+		return self._package
+
+	def info(self) -> str:
+		return self.package.info()
+
+	def __repr__(self) -> str:
+		return f'PackageEntry({self.name})'
+
+
+class PackageIndex:
+	"""
+	The packages of the sync databases of pacman, read directly from the database
+	files into one list per field. The names are indexed for prefix searches and
+	the names and descriptions for substring searches.
+	"""
+
+	def __init__(self) -> None:
+		self.repositories: list[str] = []
+		self.columns: dict[str, list[str]] = {field: [] for field in _FIELDS}
+		self._numbers: dict[str, int] = {}
+		self._entries: dict[int, PackageEntry] = {}
+		self._sorted_names: list[str] = []
+		self._sorted_numbers: list[int] = []
+		# the lowercase names and descriptions separated by a null byte, one package per line
+		self._text = ''
+		self._offsets: list[int] = []
+
+	@property
+	def names(self) -> list[str]:
+		return self.columns['NAME']
+
+	def __len__(self) -> int:
+		return len(self.names)
+
+	def __contains__(self, name: object) -> bool:
+		return name in self._numbers
+
+	def _add(self, repository: str, fields: dict[str, str]) -> None:
+		# the first repository providing a package wins, like in pacman
+		if not (name := fields.get('NAME')) or name in self._numbers:
+			return
+
+		self._numbers[name] = len(self.names)
+		self.repositories.append(sys.intern(repository))
+
+		for field, column in self.columns.items():
+			value = fields.get(field, '')
+			column.append(sys.intern(value) if field in _INTERNED else value)
+
+	def read_database(self, repository: str, path: Path) -> None:
+		"""
+		Reads a sync database in a single pass over the compressed tarball
+		"""
+		with _open_compressed(path) as fp:
+			for name, data in _tar_members(fp):
+				if name.endswith('/desc'):
+					self._add(repository, _parse_desc(data.decode(errors='replace')))
+
+	@property
+	def sorted_numbers(self) -> list[int]:
+		return self._sorted_numbers
+
+	def build_search_index(self, order: list[int] | None = None) -> None:
+		"""
+		Builds the search index, the order of the packages by name can be passed if it's already known
+		"""
+		names = self.names
+
+		if order is None:
+			order = sorted(range(len(names)), key=lambda nr: names[nr].lower())
+
+		self._sorted_names = [names[nr].lower() for nr in order]
+		self._sorted_numbers = order
+
+		# a null byte between the name and the description, so a pattern can't match across them
+		lines = [f'{name}\0{desc}'.lower().replace('\n', ' ') for name, desc in zip(names, self.columns['DESC'])]
+		self._offsets = []
+		offset = 0
+
+		for line in lines:
+			self._offsets.append(offset)
+			offset += len(line) + 1
+
+		self._text = '\n'.join(lines)
+
+	def entry(self, name: str) -> PackageEntry | None:
+		if (nr := self._numbers.get(name)) is None:
+			return None
+
+		if nr not in self._entries:
+			self._entries[nr] = PackageEntry(self, nr)
+
+		return self._entries[nr]
+
+	def entries(self) -> list[PackageEntry]:
+		return [entry for name in self.names if (entry := self.entry(name))]
+
+	def package(self, nr: int) -> AvailablePackage:
+		column = self.columns
+		build_date = int(column['BUILDDATE'][nr] or 0)
+
+		return AvailablePackage(
+			name=column['NAME'][nr],
+			architecture=column['ARCH'][nr],
+			build_date=time.strftime('%c', time.localtime(build_date)),
+			depends_on=_format_list(column['DEPENDS'][nr]),
+			description=column['DESC'][nr],
+			download_size=_format_size(column['CSIZE'][nr]),
+			groups=_format_list(column['GROUPS'][nr]),
+			installed_size=_format_size(column['ISIZE'][nr]),
+			licenses=_format_list(column['LICENSE'][nr]),
+			optional_deps=_format_list(column['OPTDEPENDS'][nr]),
+			packager=column['PACKAGER'][nr],
+			provides=_format_list(column['PROVIDES'][nr]),
+			replaces=_format_list(column['REPLACES'][nr]),
+			repository=self.repositories[nr],
+			url=column['URL'][nr],
+			validated_by=_format_list(column['VALIDATION'][nr]),
+			version=column['VERSION'][nr],
+		)
+
+	def package_groups(self) -> dict[str, PackageGroup]:
+		groups: dict[str, PackageGroup] = {}
+
+		for name, package_groups in zip(self.names, self.columns['GROUPS']):
+			for group in package_groups.splitlines():
+				groups.setdefault(group, PackageGroup(group)).packages.append(name)
+
+		return groups
+
+	def prefix_search(self, prefix: str) -> list[str]:
+		"""
+		Returns the names starting with the prefix, ignoring the case
+		"""
+		prefix = prefix.lower()
+		start = bisect_left(self._sorted_names, prefix)
+		matches: list[str] = []
+
+		for pos in range(start, len(self._sorted_names)):
+			if not self._sorted_names[pos].startswith(prefix):
+				break
+			matches.append(self.names[self._sorted_numbers[pos]])
+
+		return matches
+
+	def search(self, pattern: str) -> list[str]:
+		"""
+		Returns the names of the packages with the pattern in their name or description,
+		ignoring the case. Names starting with the pattern come first.
+		"""
+		pattern = pattern.lower()
+
+		if not pattern:
+			return list(self.names)
+
+		matches = dict.fromkeys(self.prefix_search(pattern))
+		pos = self._text.find(pattern)
+
+		while pos != -1:
+			nr = bisect_right(self._offsets, pos) - 1
+			matches.setdefault(self.names[nr])
+
+			# continue with the next package
+			next_line = self._offsets[nr + 1] if nr + 1 < len(self._offsets) else len(self._text)
+			pos = self._text.find(pattern, next_line)
+
+		return list(matches)
+
+	@classmethod
+	def from_columns(
+		cls,
+		repositories: list[str],
+		columns: dict[str, list[str]],
+		order: list[int] | None = None,
+	) -> Self:
+		index = cls()
+		index.repositories = repositories
+		index.columns = columns
+		index._numbers = {name: nr for nr, name in enumerate(index.names)}
+		index.build_search_index(order)
+
+		return index
+
+	@classmethod
+	def load(cls, repositories: list[Repository], sync_dir: Path = PACMAN_SYNC_DIR) -> Self:
+		index = cls()
+		start = time.monotonic()
+
+		for repository in repositories:
+			path = sync_dir / f'{repository.value}.db'
+
+			try:
+				index.read_database(repository.value, path)
+			except (OSError, EOFError, ValueError) as err:
+				debug(f'Unable to read the sync database {path}: {err}')
+
+		index.build_search_index()
+		debug(f'Indexed {len(index)} packages in {time.monotonic() - start:.2f}s')
+
+		return index
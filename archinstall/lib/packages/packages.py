@@ -4,6 +4,8 @@ from archinstall.lib.exceptions import SysCallError
 from archinstall.lib.log import debug
 from archinstall.lib.menu.helpers import Loading, Notify, Selection
 from archinstall.lib.models.packages import AvailablePackage, LocalPackage, PackageGroup, Repository
+from archinstall.lib.packages.index_cache import load_index
+from archinstall.lib.packages.package_index import PackageEntry, PackageIndex
 from archinstall.lib.pacman.pacman import Pacman
 from archinstall.lib.translationhandler import tr
 from archinstall.tui.menu_item import MenuItem, MenuItemGroup
@@ -63,33 +65,19 @@ def available_package(package: str) -> AvailablePackage | None:
 
 
 @lru_cache
-def list_available_packages(
-	repositories: tuple[Repository, ...],
-) -> dict[str, AvailablePackage]:
+def load_package_index(repositories: tuple[Repository, ...]) -> PackageIndex:
 	"""
-	Returns a list of all available packages in the database
+	Returns the index of all available packages of the repositories
 	"""
-	packages: dict[str, AvailablePackage] = {}
-	current_package: list[str] = []
-	filtered_repos = [repo.value for repo in repositories]
-
 	try:
 		Pacman.run('-Sy')
 	except Exception as e:
 		debug(f'Failed to sync Arch Linux package database: {e}')
 
-	for line in Pacman.run('-S --info'):
-		dec_line = line.decode().rstrip()
-		current_package.append(dec_line)
-
-		if dec_line.startswith('Validated'):
-			if current_package:
-				avail_pkg = _parse_package_output(current_package, AvailablePackage)
-				if avail_pkg.repository in filtered_repos:
-					packages[avail_pkg.name] = avail_pkg
-				current_package = []
+	# in the order of the enum, core before extra and the testing repositories
+	ordered = sorted(repositories, key=list(Repository).index)
 
-	return packages
+	return load_index(ordered)
 
 
 @lru_cache(maxsize=128)
@@ -128,22 +116,22 @@ async def select_additional_packages(
 	output = tr('Repositories: {}').format(respos_text) + '\n'
 	output += tr('Loading packages...')
 
-	result = await Loading[dict[str, AvailablePackage]](
+	result = await Loading[PackageIndex](
 		header=output,
-		data_callback=lambda: list_available_packages(tuple(repositories)),
+		data_callback=lambda: load_package_index(tuple(repositories)),
 	).show()
 
 	if result.type_ != ResultType.Selection:
 		debug('Error while loading packages')
 		return preset
 
-	packages = result.get_value()
+	index = result.get_value()
 
-	if not packages:
+	if not len(index):
 		await Notify(tr('No packages found')).show()
 		return []
 
-	package_groups = PackageGroup.from_available_packages(packages)
+	package_groups = index.package_groups()
 
 	# Additional packages (with some light weight error handling for invalid package names)
 	header = tr('Only packages such as base, sudo, linux, linux-firmware, efibootmgr and optional profile packages are installed.') + '\n'
@@ -151,20 +139,20 @@ async def select_additional_packages(
 	header += tr('Select any packages from the below list that should be installed additionally') + '\n'
 
 	# there are over 15k packages so this needs to be quick
-	preset_packages: list[AvailablePackage | PackageGroup] = []
+	preset_packages: list[PackageEntry | PackageGroup] = []
 	for p in preset:
-		if p in packages:
-			preset_packages.append(packages[p])
+		if entry := index.entry(p):
+			preset_packages.append(entry)
 		elif p in package_groups:
 			preset_packages.append(package_groups[p])
 
 	items = [
 		MenuItem(
-			name,
-			value=pkg,
+			entry.name,
+			value=entry,
 			preview_action=lambda x: x.value.info() if x.value else None,
 		)
-		for name, pkg in packages.items()
+		for entry in index.entries()
 	]
 
 	items += [
@@ -176,10 +164,15 @@ async def select_additional_packages(
 		for name, group in package_groups.items()
 	]
 
-	menu_group = MenuItemGroup(items, sort_items=True)
+	def filter_items(pattern: str) -> set[str]:
+		# the descriptions of the packages are searched as well
+		groups = [name for name in package_groups if pattern.lower() in name.lower()]
+		return set(index.search(pattern)) | set(groups)
+
+	menu_group = MenuItemGroup(items, sort_items=True, filter_action=filter_items)
 	menu_group.set_selected_by_value(preset_packages)
 
-	pck_result = await Selection[AvailablePackage | PackageGroup](
+	pck_result = await Selection[PackageEntry | PackageGroup](
 		menu_group,
 		header=header,
 		allow_reset=True,
@@ -17,6 +17,23 @@ class Pacman:
 		self.silent = silent
 		self.target = target
 
+		# Packages registered ahead of time which will be installed
+		# together with the next pacstrap transaction
+		self._planned: list[str] = []
+		self._strapped: set[str] = set()
+
+	def plan(self, packages: str | list[str]) -> None:
+		"""
+		Registers packages for the next pacstrap transaction instead of
+		installing them right away, resolving all of them in a single run.
+		"""
+		if isinstance(packages, str):
+			packages = [packages]
+
+		for package in packages:
+			if package not in self._planned and package not in self._strapped:
+				self._planned.append(package)
+
 	@staticmethod
 	def run(args: str, default_cmd: str = 'pacman') -> SysCommand:
 		"""
@@ -93,10 +110,18 @@ class Pacman:
 			debug(f'Keyring reinit failed: {err}')
 
 	def strap(self, packages: str | list[str]) -> None:
-		self.sync()
 		if isinstance(packages, str):
 			packages = [packages]
 
+		# Merge the pending plan and skip anything a previous transaction already installed
+		packages = [pkg for pkg in dict.fromkeys(self._planned + packages) if pkg not in self._strapped]
+
+		if not packages:
+			debug('All requested packages are already installed, skipping pacstrap')
+			return
+
+		self.sync()
+
 		for plugin in plugins.values():
 			if hasattr(plugin, 'on_pacstrap'):
 				if result := plugin.on_pacstrap(packages):
@@ -111,3 +136,6 @@ class Pacman:
 			f'pacstrap -C {PACMAN_CONF} -K {self.target} {" ".join(packages)} --noconfirm --needed',
 			peek_output=True,
 		)
+
+		self._strapped.update(packages)
+		self._planned = []
@@ -0,0 +1,307 @@
+import base64
+import hashlib
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+from archinstall.lib.command import SysCommand
+from archinstall.lib.exceptions import SysCallError
+from archinstall.lib.log import debug, info, warn
+from archinstall.lib.pacman.pacman import Pacman
+
+# e.g. https://mirror.example.org/archlinux/extra/os/x86_64/bash-5.2-1-x86_64.pkg.tar.zst
+_LOCATION_PATTERN = re.compile(r'/(?P<repo>[^/]+)/os/(?P<arch>[^/]+)/(?P<filename>[^/]+)$')
+_CHUNK_SIZE = 256 * 1024
+_MAX_FAILURES = 3
+_SYNC_DB_DIR = Path('/var/lib/pacman/sync')
+
+
+@dataclass
+class PackageFile:
+	repo: str
+	arch: str
+	filename: str
+	size: int
+	sha256: str
+	# base64 encoded detached signature from the sync database
+	signature: str | None = None
+
+	def url(self, server: str) -> str:
+		return f'{server.replace("$repo", self.repo).replace("$arch", self.arch)}/{self.filename}'
+
+	@classmethod
+	def parse_line(cls, line: str) -> Self | None:
+		"""
+		Parses a line of ``pacman -Sp --print-format "%l %s %h %g"``
+		"""
+		if len(fields := line.split()) < 3:
+			return None
+
+		location, size, sha256, *signature = fields
+
+		# packages of local file:// repositories are left to pacstrap
+		if not location.startswith(('http://', 'https://')) or not (match := _LOCATION_PATTERN.search(location)):
+			return None
+
+		return cls(
+			repo=match['repo'],
+			arch=match['arch'],
+			filename=match['filename'],
+			size=int(size),
+			sha256=sha256,
+			signature=signature[0] if signature else None,
+		)
+
+
+class PackagePrefetcher:
+	"""
+	Downloads packages and their dependencies into a cache directory in the
+	background, e.g. while the disks are being formatted. Once the target is
+	mounted the packages are moved into its package cache, which is where
+	pacstrap looks for them, so the installation doesn't wait on the network.
+
+	The cache directory is in memory on the live system, so the prefetch is
+	skipped if the download wouldn't fit.
+
+	With servers (mirrorlist entries containing $repo and $arch) the files are
+	downloaded by archinstall instead of pacman, from all servers at once, and
+	verified against the checksums and signatures of the sync databases. Each
+	server gets a few connections which take the next file from a shared
+	queue, so the fast servers end up downloading most of the files.
+	"""
+
+	def __init__(
+		self,
+		packages: list[str],
+		cache_dir: Path = Path('/tmp/archinstall-pkg-cache'),
+		servers: list[str] | Callable[[], list[str]] | None = None,
+		connections_per_server: int = 2,
+		timeout: float = 30,
+	) -> None:
+		"""
+		:param servers: The servers, or a function returning them which is called
+			by the prefetch thread, e.g. if the mirrors still have to be ranked
+		"""
+		self.packages = list(dict.fromkeys(packages))
+		self.cache_dir = cache_dir
+		self.servers = [] if callable(servers) else list(dict.fromkeys(servers or []))
+		self._servers_source = servers if callable(servers) else None
+		self.connections_per_server = connections_per_server
+		self.timeout = timeout
+		self._thread: threading.Thread | None = None
+		self._success = False
+
+	def start(self) -> None:
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._prefetch, name='archinstall-prefetch', daemon=True)
+			self._thread.start()
+
+	def wait(self) -> bool:
+		if self._thread is None:
+			return False
+
+		if self._thread.is_alive():
+			info('Waiting for the package download to complete...')
+			self._thread.join()
+
+		return self._success
+
+	@staticmethod
+	def _empty_root(root: Path) -> None:
+		"""
+		Sets up a root with the sync databases of the live system but an empty
+		local database, like the target before pacstrap. Against the live system
+		itself every dependency it has installed would be left out.
+		"""
+		db_dir = root / 'db'
+		(db_dir / 'local').mkdir(parents=True)
+		(db_dir / 'sync').symlink_to(_SYNC_DB_DIR)
+
+	@staticmethod
+	def _pacman(root: Path, args: str) -> SysCommand:
+		return Pacman.run(f'--root {root} --dbpath {root / "db"} {args}')
+
+	def _resolve(self, root: Path) -> list[PackageFile]:
+		"""
+		Returns the files of the packages including all their dependencies.
+		Packages unknown to the live system (e.g. from repositories which only
+		get enabled on the target) are dropped and left to pacstrap.
+		"""
+		packages = self.packages
+
+		for _ in range(2):
+			try:
+				output = self._pacman(root, f'-Sp --print-format "%l %s %h %g" {" ".join(packages)}').decode()
+				self.packages = packages
+				return [file for line in output.splitlines() if (file := PackageFile.parse_line(line))]
+			except SysCallError as err:
+				unknown = set(re.findall(r'target not found: (\S+)', err.worker_log.decode(errors='backslashreplace')))
+
+				if not unknown:
+					raise
+
+				debug(f'Not prefetching unknown packages: {unknown}')
+				packages = [pkg for pkg in packages if pkg not in unknown]
+
+		raise SysCallError('Unable to resolve the packages to prefetch')
+
+	def _verify_signature(self, path: Path, file: PackageFile) -> bool:
+		if not file.signature:
+			return True
+
+		sig_path = path.with_name(f'{file.filename}.sig')
+		sig_path.write_bytes(base64.b64decode(file.signature))
+
+		try:
+			SysCommand(['pacman-key', '--verify', str(sig_path), str(path)])
+			return True
+		except SysCallError as err:
+			debug(f'Invalid signature of {file.filename}: {err}')
+			return False
+		finally:
+			sig_path.unlink(missing_ok=True)
+
+	def _download(self, server: str, file: PackageFile) -> bool:
+		url = file.url(server)
+		path = self.cache_dir / file.filename
+		part_path = path.with_name(f'{file.filename}.part')
+		sha256 = hashlib.sha256()
+		size = 0
+
+		try:
+			with urllib.request.urlopen(url, None, self.timeout) as response, part_path.open('wb') as fp:
+				while chunk := response.read(_CHUNK_SIZE):
+					sha256.update(chunk)
+					fp.write(chunk)
+					size += len(chunk)
+		except (urllib.error.URLError, OSError, ValueError) as err:
+			debug(f'Downloading {url} failed: {err}')
+			part_path.unlink(missing_ok=True)
+			return False
+
+		if size != file.size or sha256.hexdigest() != file.sha256:
+			debug(f'Checksum mismatch of {url}')
+			part_path.unlink(missing_ok=True)
+			return False
+
+		if not self._verify_signature(part_path, file):
+			part_path.unlink(missing_ok=True)
+			return False
+
+		part_path.replace(path)
+		return True
+
+	def _worker(self, server: str, pending: queue.Queue[PackageFile], fetched: list[PackageFile]) -> None:
+		failures = 0
+
+		# a server which keeps failing isn't used any further, the other connections take over
+		while failures < _MAX_FAILURES:
+			try:
+				file = pending.get_nowait()
+			except queue.Empty:
+				return
+
+			if self._download(server, file):
+				fetched.append(file)
+				failures = 0
+				continue
+
+			failures += 1
+
+			# the file is tried on the other servers in their order of preference
+			for fallback in self.servers:
+				if fallback != server and self._download(fallback, file):
+					fetched.append(file)
+					break
+
+		debug(f'Not downloading from {server} anymore')
+
+	def _fetch_from_servers(self, files: list[PackageFile]) -> list[PackageFile]:
+		pending: queue.Queue[PackageFile] = queue.Queue()
+
+		# the largest files first, so the last ones don't keep a single connection busy
+		for file in sorted(files, key=lambda f: f.size, reverse=True):
+			if not (self.cache_dir / file.filename).exists():
+				pending.put(file)
+
+		fetched: list[PackageFile] = []
+		threads = [
+			threading.Thread(target=self._worker, args=(server, pending, fetched), name=f'archinstall-prefetch-{nr}', daemon=True)
+			for server in self.servers
+			for nr in range(self.connections_per_server)
+		]
+
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		return fetched
+
+	def _prefetch(self) -> None:
+		try:
+			with tempfile.TemporaryDirectory(prefix='archinstall-prefetch-') as root:
+				self._prefetch_into(Path(root))
+		except Exception as err:
+			# pacstrap downloads whatever is missing, so this is never fatal
+			debug(f'Package prefetch failed: {err}')
+
+	def _prefetch_into(self, root: Path) -> None:
+		self.cache_dir.mkdir(parents=True, exist_ok=True)
+		self._empty_root(root)
+
+		files = self._resolve(root)
+		size = sum(file.size for file in files)
+		free = shutil.disk_usage(self.cache_dir).free
+
+		# leave some room for everything else that lives in memory
+		if size > free * 0.8:
+			debug(f'Skipping package prefetch, {size} bytes to download but only {free} bytes free in {self.cache_dir}')
+			return
+
+		debug(f'Prefetching {size} bytes of packages into {self.cache_dir}: {self.packages}')
+
+		if self._servers_source is not None:
+			self.servers = list(dict.fromkeys(self._servers_source()))
+
+		if not self.servers:
+			self._pacman(root, f'-Sw --noconfirm --cachedir {self.cache_dir} {" ".join(self.packages)}')
+			self._success = True
+			return
+
+		fetched = self._fetch_from_servers(files)
+		debug(f'Prefetched {len(fetched)} of {len(files)} package files from {len(self.servers)} servers')
+
+		# pacstrap downloads the missing files itself
+		self._success = bool(fetched)
+
+	def import_into(self, cache_dir: Path) -> int:
+		"""
+		Waits for the prefetch and moves the downloaded packages into ``cache_dir``.
+		Returns the number of imported files.
+		"""
+		if not self.wait():
+			warn('Packages could not be prefetched, they will be downloaded during the installation')
+			shutil.rmtree(self.cache_dir, ignore_errors=True)
+			return 0
+
+		cache_dir.mkdir(parents=True, exist_ok=True)
+		imported = 0
+
+		for path in self.cache_dir.iterdir():
+			if '.pkg.tar' in path.name and path.suffix != '.part' and not (cache_dir / path.name).exists():
+				shutil.move(path, cache_dir / path.name)
+				imported += 1
+
+		shutil.rmtree(self.cache_dir, ignore_errors=True)
+		debug(f'Imported {imported} prefetched package files into {cache_dir}')
+
+		return imported
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+
+from archinstall.lib.log import debug, info
+
+
+class PreflightStatus(Enum):
+	Passed = 'ok'
+	Failed = 'failed'
+	Skipped = 'skipped'
+
+
+@dataclass
+class PreflightStep:
+	name: str
+	check: Callable[[], bool]
+
+
+@dataclass
+class PreflightResult:
+	name: str
+	status: PreflightStatus
+	elapsed: float = 0.0
+
+
+class PreflightChecks:
+	"""
+	Runs the checks that have to pass before the first menu is shown.
+
+	Checks are grouped into chains, the steps of a chain run in order and
+	the remaining steps of a chain are skipped once one of them fails.
+	Independent chains run concurrently, so the total time is bounded by
+	the slowest chain rather than the sum of all steps. The first chain
+	runs on the calling thread, which allows its steps to show the TUI.
+	"""
+
+	def __init__(self) -> None:
+		self._chains: list[list[PreflightStep]] = []
+		self._results: dict[str, PreflightResult] = {}
+		self._lock = threading.Lock()
+		self._pending: list[str] = []
+		self._owner: int | None = None
+
+	def add_chain(self, *steps: PreflightStep) -> None:
+		if steps:
+			self._chains.append(list(steps))
+
+	@property
+	def _total(self) -> int:
+		return sum(len(chain) for chain in self._chains)
+
+	def _report(self, result: PreflightResult) -> None:
+		with self._lock:
+			self._results[result.name] = result
+			progress = f'[{len(self._results)}/{self._total}]'
+
+			if result.status == PreflightStatus.Skipped:
+				self._pending.append(f'{progress} {result.name}: {result.status.value}')
+			else:
+				self._pending.append(f'{progress} {result.name}: {result.status.value} ({result.elapsed:.2f}s)')
+
+		# only the calling thread prints, as the checks running
+		# there may be showing the TUI at the same time
+		if threading.get_ident() == self._owner:
+			self._flush()
+
+	def _flush(self) -> None:
+		with self._lock:
+			pending, self._pending = self._pending, []
+
+		for line in pending:
+			info(line)
+
+	def _run_chain(self, chain: list[PreflightStep]) -> None:
+		failed = False
+
+		for step in chain:
+			if failed:
+				self._report(PreflightResult(step.name, PreflightStatus.Skipped))
+				continue
+
+			start = time.monotonic()
+
+			try:
+				passed = step.check()
+			except Exception as err:
+				debug(f'Pre-flight check "{step.name}" raised an error: {err}')
+				passed = False
+
+			status = PreflightStatus.Passed if passed else PreflightStatus.Failed
+			self._report(PreflightResult(step.name, status, time.monotonic() - start))
+
+			failed = not passed
+
+	def run(self) -> dict[str, PreflightResult]:
+		if not self._chains:
+			return {}
+
+		start = time.monotonic()
+		self._owner = threading.get_ident()
+		main_chain, *other_chains = self._chains
+
+		with ThreadPoolExecutor(max_workers=max(1, len(other_chains))) as executor:
+			futures = [executor.submit(self._run_chain, chain) for chain in other_chains]
+			self._run_chain(main_chain)
+
+			for future in futures:
+				future.result()
+
+		self._flush()
+		elapsed = time.monotonic() - start
+		summed = sum(result.elapsed for result in self._results.values())
+
+		timings = ', '.join(f'{result.name}: {result.elapsed:.2f}s' for result in self._results.values())
+		debug(f'Pre-flight checks finished in {elapsed:.2f}s (sequentially {summed:.2f}s): {timings}')
+
+		return self._results
+
+	def passed(self, name: str) -> bool:
+		"""
+		Returns False if the step failed or was skipped, steps
+		that were never registered are considered to have passed.
+		"""
+		if (result := self._results.get(name)) is None:
+			return True
+
+		return result.status == PreflightStatus.Passed
@@ -0,0 +1,207 @@
+import os
+import subprocess
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from select import select
+from typing import Self
+
+from archinstall.lib.command import SysCommand, _cmd_history, locate_binary
+from archinstall.lib.exceptions import RequirementError, SysCallError
+from archinstall.lib.log import debug, info, warn
+from archinstall.lib.translationhandler import tr
+
+# created by systemd-timesyncd once the clock got synchronized
+_TIMESYNC_SYNCHRONIZED = Path('/run/systemd/timesync/synchronized')
+
+
+def _unit_name(unit: str) -> str:
+	if os.path.splitext(unit)[1] not in ('.service', '.target', '.timer'):
+		unit += '.service'  # Just to be safe
+
+	return unit
+
+
+def unit_property(unit: str, name: str) -> str:
+	return SysCommand(
+		f'systemctl show --no-pager -p {name} --value {_unit_name(unit)}',
+		environment_vars={'SYSTEMD_COLORS': '0'},
+	).decode()
+
+
+def wait_for_unit(unit: str, done: Callable[[], bool], timeout: float | None = None, recheck: float = 5) -> bool:
+	"""
+	Waits until ``done()`` returns True. Instead of polling, the journal of the unit
+	is followed and ``done()`` is re-evaluated whenever a new entry shows up, as
+	systemd logs every state change of a unit. As a safety net it's also re-evaluated
+	every ``recheck`` seconds. Returns False if the timeout expired first.
+	"""
+	deadline = None if timeout is None else time.monotonic() + timeout
+	cmd = ['journalctl', '--no-pager', '--follow', '--lines=0', '--output=cat', f'--unit={_unit_name(unit)}']
+
+	try:
+		cmd[0] = locate_binary(cmd[0])
+		_cmd_history(cmd)
+		# started before the first check, so no state change can be missed in between
+		journal: subprocess.Popen[bytes] | None = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+	except RequirementError, OSError:
+		debug(f'Unable to follow the journal of {unit}, falling back to polling')
+		journal = None
+
+	try:
+		while not done():
+			wait = recheck if journal else 1
+
+			if deadline is not None:
+				if (remaining := deadline - time.monotonic()) <= 0:
+					return False
+
+				wait = min(wait, remaining)
+
+			if journal and journal.stdout:
+				if select([journal.stdout], [], [], wait)[0] and not os.read(journal.stdout.fileno(), 8192):
+					debug(f'Journal of {unit} stopped, falling back to polling')
+					journal.wait()
+					journal = None
+			else:
+				time.sleep(wait)
+
+		return True
+	finally:
+		if journal:
+			journal.terminate()
+			journal.wait()
+
+
+def _time_synchronized() -> bool:
+	if _TIMESYNC_SYNCHRONIZED.exists():
+		return True
+
+	time_val = SysCommand('timedatectl show --property=NTPSynchronized --value').decode()
+	return time_val.strip() == 'yes'
+
+
+def _unit_finished(unit: str) -> bool:
+	return unit_property(unit, 'SubState') in ('dead', 'failed', 'exited')
+
+
+class _BackgroundWait:
+	def __init__(self, message: str, wait: Callable[[], bool]) -> None:
+		self.message = message
+		self.result: bool | None = None
+		self._wait = wait
+		self._thread = threading.Thread(target=self._run, name=f'archinstall-wait-{message}', daemon=True)
+
+	def _run(self) -> None:
+		try:
+			self.result = self._wait()
+		except SysCallError as err:
+			debug(f'Waiting for "{self.message}" failed: {err}')
+			self.result = False
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def join(self, timeout: float | None = None) -> bool:
+		"""
+		Returns True once the wait is over.
+		"""
+		self._thread.join(timeout)
+		return not self._thread.is_alive()
+
+
+class ServiceWaiter:
+	"""
+	Certain services might be running that affects the system during installation,
+	like "reflector.service" which updates /etc/pacman.d/mirrorlist.
+
+	The waits for these services run in the background from the moment the waiter is
+	started, e.g. while the disks get prepared, and the installation only blocks on
+	them in :py:meth:`wait` at the point the services actually have to be finished.
+	"""
+
+	def __init__(self, offline: bool = False, skip_ntp: bool = False, skip_wkd: bool = False) -> None:
+		self.offline = offline
+		self.skip_ntp = skip_ntp
+		self.skip_wkd = skip_wkd
+
+		self._time_sync: _BackgroundWait | None = None
+		self._reflector: _BackgroundWait | None = None
+		self._keyring: _BackgroundWait | None = None
+
+		if not skip_ntp:
+			self._time_sync = _BackgroundWait(
+				tr('Waiting for time sync (timedatectl show) to complete.'),
+				lambda: wait_for_unit('systemd-timesyncd', _time_synchronized),
+			)
+
+		if not offline:
+			self._reflector = _BackgroundWait(
+				'Waiting for automatic mirror selection (reflector) to complete.',
+				lambda: wait_for_unit('reflector', lambda: _unit_finished('reflector'), timeout=60),
+			)
+
+		if not skip_wkd:
+			self._keyring = _BackgroundWait(
+				tr('Waiting for Arch Linux keyring sync (archlinux-keyring-wkd-sync) to complete.'),
+				self._wait_for_keyring,
+			)
+
+		self._started = False
+
+	@staticmethod
+	def _wait_for_keyring() -> bool:
+		timer = 'archlinux-keyring-wkd-sync.timer'
+		service = 'archlinux-keyring-wkd-sync.service'
+
+		# Wait for the timer to kick in
+		wait_for_unit(timer, lambda: unit_property(timer, 'ActiveEnterTimestamp') != '')
+		# Wait for the service to enter a finished state
+		wait_for_unit(service, lambda: _unit_finished(service))
+
+		return unit_property(service, 'SubState') != 'failed'
+
+	def matches(self, offline: bool, skip_ntp: bool, skip_wkd: bool) -> bool:
+		return (self.offline, self.skip_ntp, self.skip_wkd) == (offline, skip_ntp, skip_wkd)
+
+	def start(self) -> Self:
+		if not self._started:
+			self._started = True
+
+			for background_wait in (self._time_sync, self._reflector, self._keyring):
+				if background_wait:
+					background_wait.start()
+
+		return self
+
+	def wait(self) -> None:
+		self.start()
+
+		if self._time_sync:
+			if not self._time_sync.join(0):
+				info(self._time_sync.message)
+
+				if not self._time_sync.join(5):
+					warn(tr('Time synchronization not completing, while you wait - check the docs for workarounds: https://archinstall.readthedocs.io/'))
+					self._time_sync.join()
+		else:
+			info(tr('Skipping waiting for automatic time sync (this can cause issues if time is out of sync during installation)'))
+
+		if self._reflector:
+			if not self._reflector.join(0):
+				info(self._reflector.message)
+				self._reflector.join()
+
+			if not self._reflector.result:
+				warn('Reflector did not complete within 60 seconds, continuing anyway...')
+		else:
+			info('Skipped reflector...')
+
+		if self._keyring:
+			if not self._keyring.join(0):
+				info(self._keyring.message)
+				self._keyring.join()
+
+			if not self._keyring.result:
+				warn('archlinux-keyring-wkd-sync failed, keyring may need reinit during pacman sync')
@@ -17,14 +17,18 @@ from archinstall.lib.network.wifi_handler import WifiHandler
 from archinstall.lib.networking import ping
 from archinstall.lib.packages.util import check_version_upgrade
 from archinstall.lib.pacman.pacman import Pacman
+from archinstall.lib.preflight import PreflightChecks, PreflightStep
 from archinstall.lib.translationhandler import tr, translation_handler
 from archinstall.lib.utils.util import running_from_iso
 from archinstall.tui.components import tui
 from archinstall.tui.menu_item import MenuItemGroup
 
 
-def _log_sys_info() -> None:
+def _log_sys_info() -> bool:
 	# Log various information about hardware before starting the installation. This might assist in troubleshooting
+	# the probes each spawn a process, so they run side by side
+	SysInfo.probe()
+
 	debug(f'Hardware model detected: {SysInfo.sys_vendor()} {SysInfo.product_name()}; UEFI mode: {SysInfo.has_uefi()}')
 	debug(f'Processor model detected: {SysInfo.cpu_model()}')
 	debug(f'Memory statistics: {SysInfo.mem_available()} available out of {SysInfo.mem_total()} total installed')
@@ -34,6 +38,8 @@ def _log_sys_info() -> None:
 	# For support reasons, we'll log the disk layout pre installation to match against post-installation layout
 	debug(f'Disk states before installing:\n{disk_layouts()}')
 
+	return True
+
 
 def _check_online(wifi_handler: WifiHandler | None = None) -> bool:
 	try:
@@ -65,6 +71,12 @@ def _fetch_arch_db() -> bool:
 	return True
 
 
+def _check_version() -> bool:
+	# an unavailable upgrade information shouldn't prevent the installation
+	check_version_upgrade()
+	return True
+
+
 def _list_scripts() -> str:
 	lines = ['The following are viable --script options:']
 
@@ -138,7 +150,8 @@ def run() -> int:
 
 	translation_handler.save_console_font()
 
-	_log_sys_info()
+	preflight = PreflightChecks()
+	network_steps: list[PreflightStep] = []
 
 	if not arch_config_handler.args.offline:
 		if not arch_config_handler.args.skip_wifi_check:
@@ -146,19 +159,30 @@ def run() -> int:
 		else:
 			wifi_handler = None
 
-		if not _check_online(wifi_handler):
-			return 0
-
-		if not _fetch_arch_db():
-			return 1
+		network_steps += [
+			PreflightStep('network', lambda: _check_online(wifi_handler)),
+			PreflightStep('package database', _fetch_arch_db),
+		]
 
 		if not arch_config_handler.args.skip_version_check:
-			upgrade = check_version_upgrade()
+			network_steps.append(PreflightStep('version check', _check_version))
+
+	# the network checks may have to show the wifi menu, so they run on this thread
+	preflight.add_chain(*network_steps)
+	preflight.add_chain(PreflightStep('system information', _log_sys_info))
+	results = preflight.run()
+
+	if not preflight.passed('network'):
+		return 0
+
+	if not preflight.passed('package database'):
+		return 1
 
-			if upgrade:
-				text = tr('New version available') + f': {upgrade}'
-				info(text)
-				time.sleep(3)
+	# the result of the version check is cached, this only reports it
+	if 'version check' in results and (upgrade := check_version_upgrade()):
+		text = tr('New version available') + f': {upgrade}'
+		info(text)
+		time.sleep(3)
 
 	if running_from_iso():
 		debug('Running from ISO (Live Mode)...')
@@ -1,6 +1,7 @@
 import os
 import sys
 import time
+from functools import partial
 
 from archinstall.lib.applications.application_handler import ApplicationHandler
 from archinstall.lib.args import ArchConfig, ArchConfigHandler
@@ -11,16 +12,20 @@ from archinstall.lib.disk.filesystem import FilesystemHandler
 from archinstall.lib.disk.utils import disk_layouts
 from archinstall.lib.general.general_menu import PostInstallationAction, select_post_installation
 from archinstall.lib.global_menu import GlobalMenu
-from archinstall.lib.installer import Installer, accessibility_tools_in_use, run_custom_user_commands
+from archinstall.lib.hardware import SysInfo
+from archinstall.lib.installer import Installer, __base_packages__, accessibility_tools_in_use, run_custom_user_commands
 from archinstall.lib.log import debug, error, info
 from archinstall.lib.menu.util import delayed_warning
+from archinstall.lib.mirror.mirror_cache import MirrorCache
 from archinstall.lib.mirror.mirror_handler import MirrorListHandler
 from archinstall.lib.models import Bootloader
-from archinstall.lib.models.device import DiskLayoutType, EncryptionType
+from archinstall.lib.models.device import DiskLayoutType, EncryptionType, SnapshotType
 from archinstall.lib.models.users import User
 from archinstall.lib.network.network_handler import install_network_config
 from archinstall.lib.packages.util import check_version_upgrade
+from archinstall.lib.pacman.prefetch import PackagePrefetcher
 from archinstall.lib.profile.profiles_handler import profile_handler
+from archinstall.lib.services import ServiceWaiter
 from archinstall.lib.translationhandler import tr
 from archinstall.tui.components import tui
 
@@ -49,11 +54,115 @@ def show_menu(
 		sys.exit(0)
 
 
+def _config_packages(config: ArchConfig) -> list[str]:
+	"""
+	Returns the packages which are known to be installed from the configuration alone.
+	The packages of the profiles and the additional packages of the user aren't
+	included, a renamed or misspelled one must not fail the pacstrap of the base
+	system. They get transactions of their own.
+	"""
+	packages: list[str] = []
+
+	if (bootloader_config := config.bootloader_config) and bootloader_config.bootloader != Bootloader.NO_BOOTLOADER:
+		packages += bootloader_config.bootloader.packages(SysInfo.has_uefi())
+
+		if bootloader_config.plymouth is not None:
+			packages.append('plymouth')
+
+	if config.swap and config.swap.enabled:
+		packages.append('zram-generator')
+
+	if config.disk_config and config.disk_config.has_default_btrfs_vols():
+		btrfs_options = config.disk_config.btrfs_options
+		snapshot_config = btrfs_options.snapshot_config if btrfs_options else None
+
+		match snapshot_config.snapshot_type if snapshot_config else None:
+			case SnapshotType.Snapper:
+				packages.append('snapper')
+			case SnapshotType.Timeshift:
+				packages += ['cronie', 'timeshift']
+			case None:
+				pass
+
+		if snapshot_config and bootloader_config and bootloader_config.bootloader == Bootloader.Grub:
+			packages += ['grub-btrfs', 'inotify-tools']
+
+	return packages
+
+
+def _plan_packages(config: ArchConfig, installation: Installer) -> None:
+	"""
+	Registers all packages that are known from the configuration up front,
+	so that they get installed together with the base system in a single
+	pacstrap transaction rather than one transaction per installation step.
+	"""
+	packages = _config_packages(config)
+
+	debug(f'Planned packages: {packages}')
+	installation.plan_packages(packages)
+
+
+def _prefetch_packages(config: ArchConfig) -> list[str]:
+	"""
+	The packages to download while the disks are prepared, this covers the base
+	system on top of the configured packages. Anything missed is downloaded by pacstrap.
+	"""
+	packages = __base_packages__ + config.kernels
+
+	if disk_config := config.disk_config:
+		fs_types = [part.fs_type for mod in disk_config.device_modifications for part in mod.partitions]
+
+		if lvm_config := disk_config.lvm_config:
+			packages.append('lvm2')
+			fs_types += [vol.fs_type for vg in lvm_config.vol_groups for vol in vg.volumes]
+
+		packages += [pkg for fs_type in fs_types if fs_type and (pkg := fs_type.installation_pkg)]
+
+		if disk_config.disk_encryption and disk_config.disk_encryption.hsm_device:
+			packages.append('libfido2')
+
+	if not SysInfo.is_vm() and (vendor := SysInfo.cpu_vendor()) and (ucode := vendor.get_ucode()):
+		packages.append(ucode.stem)
+
+	packages += _config_packages(config)
+
+	# unknown packages are dropped by the prefetch, so the profile and additional ones can be included
+	if (profile_config := config.profile_config) and (profile := profile_config.profile):
+		packages += profile.packages
+
+		for sub_profile in profile.current_selection:
+			packages += sub_profile.packages
+
+	if config.packages and config.packages[0] != '':
+		packages += config.packages
+
+	return packages
+
+
+def _prefetch_servers(config: ArchConfig, mirror_list_handler: MirrorListHandler, count: int) -> list[str]:
+	"""
+	The servers to download the prefetched packages from, the custom servers
+	and the fastest mirrors of the selected regions like in the mirrorlist.
+	Called by the prefetch thread, as ranking the mirrors probes them.
+	"""
+	if not (mirror_config := config.mirror_config):
+		return []
+
+	servers = [server.url for server in mirror_config.custom_servers]
+
+	for region in mirror_config.mirror_regions:
+		servers += [status.server_url for status in mirror_list_handler.get_status_by_region(region.name, speed_sort=True)]
+
+	return list(dict.fromkeys(servers))[:count]
+
+
 def perform_installation(
 	arch_config_handler: ArchConfigHandler,
 	mirror_list_handler: MirrorListHandler,
 	auth_handler: AuthenticationHandler,
 	application_handler: ApplicationHandler,
+	service_waiter: ServiceWaiter | None = None,
+	prefetcher: PackagePrefetcher | None = None,
 ) -> None:
 	"""
 	Performs the installation steps on a block device.
@@ -81,6 +190,7 @@ def perform_installation(
 		disk_config,
 		kernels=config.kernels,
 		silent=arch_config_handler.args.silent,
+		parallel_initramfs=arch_config_handler.args.parallel_initramfs,
 	) as installation:
 		# Mount all the drives to the desired mountpoint
 		if disk_config.config_type != DiskLayoutType.Pre_mount:
@@ -90,6 +200,7 @@ def perform_installation(
 			arch_config_handler.args.offline,
 			arch_config_handler.args.skip_ntp,
 			arch_config_handler.args.skip_wkd,
+			service_waiter,
 		)
 
 		if disk_config.config_type != DiskLayoutType.Pre_mount:
@@ -100,6 +211,11 @@ def perform_installation(
 		if mirror_config := config.mirror_config:
 			installation.set_mirrors(mirror_list_handler, mirror_config, on_target=False)
 
+		_plan_packages(config, installation)
+
+		if prefetcher:
+			installation.import_package_cache(prefetcher)
+
 		installation.minimal_installation(
 			optional_repositories=optional_repositories,
 			mkinitcpio=run_mkinitcpio,
@@ -181,6 +297,10 @@ def perform_installation(
 		if cc := config.custom_commands:
 			run_custom_user_commands(cc, installation)
 
+		# Generate the initramfs once, after every step had the chance to change its configuration
+		if not installation.build_initramfs():
+			error('Error generating initramfs (continuing anyway)')
+
 		installation.genfstab()
 
 		debug(f'Disk states after installing:\n{disk_layouts()}')
@@ -208,6 +328,10 @@ def main(arch_config_handler: ArchConfigHandler | None = None) -> None:
 	mirror_list_handler = MirrorListHandler(
 		offline=arch_config_handler.args.offline,
 		verbose=arch_config_handler.args.verbose,
+		cache=MirrorCache(
+			arch_config_handler.args.mirror_cache,
+			arch_config_handler.args.mirror_cache_ttl * 60 * 60,
+		),
 	)
 
 	if not arch_config_handler.args.silent:
@@ -240,12 +364,36 @@ def main(arch_config_handler: ArchConfigHandler | None = None) -> None:
 		if aborted:
 			return main(arch_config_handler)
 
+	# wait for the live system services in the background while the disks are prepared
+	service_waiter = ServiceWaiter(
+		arch_config_handler.args.offline,
+		arch_config_handler.args.skip_ntp,
+		arch_config_handler.args.skip_wkd,
+	)
+
+	prefetcher = None
+
 	if arch_config_handler.config.disk_config:
 		fs_handler = FilesystemHandler(arch_config_handler.config.disk_config)
 
 		if not delayed_warning(tr('Starting device modifications in ')):
 			return main()
 
+		service_waiter.start()
+
+		# the download is network bound while formatting is disk bound, so they can overlap
+		if arch_config_handler.args.prefetch_packages and not arch_config_handler.args.offline:
+			prefetcher = PackagePrefetcher(
+				_prefetch_packages(arch_config_handler.config),
+				servers=partial(
+					_prefetch_servers,
+					arch_config_handler.config,
+					mirror_list_handler,
+					arch_config_handler.args.prefetch_mirrors,
+				),
+			)
+			prefetcher.start()
+
 		fs_handler.perform_filesystem_operations()
 
 	perform_installation(
@@ -253,6 +401,8 @@ def main(arch_config_handler: ArchConfigHandler | None = None) -> None:
 		mirror_list_handler,
 		AuthenticationHandler(),
 		ApplicationHandler(),
+		service_waiter,
+		prefetcher,
 	)
 
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Awaitable, Callable, Iterable
+from collections.abc import Awaitable, Callable, Collection, Iterable
 from dataclasses import dataclass, field
 from enum import Enum, StrEnum, auto
 from functools import cached_property
@@ -118,6 +118,7 @@ class MenuItemGroup:
 		sort_items: bool = False,
 		sort_case_sensitive: bool = True,
 		checkmarks: bool = False,
+		filter_action: Callable[[str], Collection[str]] | None = None,
 	) -> None:
 		if len(menu_items) < 1:
 			raise ValueError('Menu must have at least one item')
@@ -129,6 +130,8 @@ class MenuItemGroup:
 				menu_items = sorted(menu_items, key=lambda x: x.text.lower())
 
 		self._filter_pattern: str = ''
+		# returns the texts of the items matching a filter pattern, in place of the substring match on the text
+		self._filter_action = filter_action
 		self._checkmarks: bool = checkmarks
 
 		self._menu_items: list[MenuItem] = menu_items
@@ -251,7 +254,13 @@ class MenuItemGroup:
 	@cached_property
 	def items(self) -> list[MenuItem]:
 		pattern = self._filter_pattern.lower()
-		items = filter(lambda item: item.is_empty() or pattern in item.text.lower(), self._menu_items)
+
+		if self._filter_action is not None and pattern:
+			matches = self._filter_action(self._filter_pattern)
+			items = filter(lambda item: item.is_empty() or item.text in matches, self._menu_items)
+		else:
+			items = filter(lambda item: item.is_empty() or pattern in item.text.lower(), self._menu_items)
+
 		l_items = sorted(items, key=self._items_score)
 		return l_items
 
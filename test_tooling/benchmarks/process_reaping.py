@@ -0,0 +1,96 @@
+"""
+Counts the processes forked by the host while a command runs through
+SysCommandWorker, compared to the previous poll loop which spawned
+``ps -p <pid>`` on every idle tick to find out if the child was alive.
+
+The fork counter is the ``processes`` field of /proc/stat, so the numbers
+include any unrelated activity on the machine; run it on an idle system.
+
+	python test_tooling/benchmarks/process_reaping.py --duration 5
+"""
+
+import os
+import pty
+import subprocess
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable
+from select import EPOLLHUP, EPOLLIN, epoll
+
+from archinstall.lib.command import SysCommandWorker
+
+
+def _forks_since_boot() -> int:
+	with open('/proc/stat') as fh:
+		for line in fh:
+			if line.startswith('processes '):
+				return int(line.split()[1])
+
+	raise ValueError('No process counter found in /proc/stat')
+
+
+def _legacy_pid_exists(pid: int) -> bool:
+	try:
+		return any(subprocess.check_output(['ps', '--no-headers', '-o', 'pid', '-p', str(pid)]).strip())
+	except subprocess.CalledProcessError:
+		return False
+
+
+def _legacy_run(cmd: list[str]) -> None:
+	pid, child_fd = pty.fork()
+
+	if not pid:
+		os.execv(cmd[0], cmd)
+
+	poll_object = epoll()
+	poll_object.register(child_fd, EPOLLIN | EPOLLHUP)
+	ended = False
+
+	while not ended:
+		got_output = False
+		for _fileno, _event in poll_object.poll(0.1):
+			try:
+				os.read(child_fd, 8192)
+				got_output = True
+			except OSError:
+				ended = True
+				break
+
+		if ended or (not got_output and not _legacy_pid_exists(pid)):
+			ended = True
+			os.waitpid(pid, 0)
+
+	os.close(child_fd)
+
+
+def _worker_run(cmd: list[str]) -> None:
+	worker = SysCommandWorker(cmd)
+
+	while worker.is_alive():
+		worker.poll()
+
+
+def _measure(name: str, runner: Callable[[list[str]], object], cmd: list[str]) -> None:
+	before = _forks_since_boot()
+	start = time.monotonic()
+	runner(cmd)
+	elapsed = time.monotonic() - start
+	# the command itself accounts for one fork
+	forks = _forks_since_boot() - before - 1
+
+	print(f'{name:<8} runtime: {elapsed:6.2f}s  forks: {forks:5d}  forks/s: {forks / elapsed:8.2f}')
+
+
+def main() -> None:
+	parser = ArgumentParser(description='Measure forks per second of child runtime for SysCommandWorker')
+	parser.add_argument('--duration', type=float, default=3.0, help='Runtime of the benchmarked child process in seconds')
+	args = parser.parse_args()
+
+	cmd = ['/usr/bin/sleep', str(args.duration)]
+
+	_measure('before', _legacy_run, cmd)
+	_measure('after', _worker_run, cmd)
+
+
+if __name__ == '__main__':
+	main()
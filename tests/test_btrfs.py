@@ -0,0 +1,203 @@
+import struct
+import uuid
+from pathlib import Path
+
+import pytest
+
+from archinstall.lib.disk import btrfs
+from archinstall.lib.disk.btrfs import BtrfsSubvolume, _subvolume_paths, list_subvolumes, read_superblock
+from archinstall.lib.exceptions import DiskError
+
+FSID = uuid.UUID('6f1b3a38-5d0e-4f6a-9c43-2a8e0e4a1b27')
+NODESIZE = 4096
+GENERATION = 42
+
+# the system chunk holds the chunk tree, the metadata chunk the root and fs trees
+SYSTEM_LOGICAL = 0x1500000
+SYSTEM_PHYSICAL = 0x20000
+METADATA_LOGICAL = 0x2000000
+METADATA_PHYSICAL = 0x40000
+CHUNK_LENGTH = 0x10000
+
+CHUNK_ROOT = SYSTEM_LOGICAL
+ROOT_TREE = METADATA_LOGICAL
+FS_TREE = METADATA_LOGICAL + NODESIZE
+SUBVOL_TREE = METADATA_LOGICAL + 2 * NODESIZE
+
+_Item = tuple[tuple[int, int, int], bytes]
+
+
+def _chunk(physical: int, chunk_type: int) -> bytes:
+	chunk = struct.pack('<QQQQIIIHH', CHUNK_LENGTH, 2, 0x10000, chunk_type, 4096, 4096, 4096, 1, 0)
+	return chunk + struct.pack('<QQ16s', 1, physical, bytes(16))
+
+
+def _leaf(logical: int, items: list[_Item]) -> bytes:
+	header = struct.pack('<32s16sQQ16sQQIB', bytes(32), FSID.bytes, logical, 0, bytes(16), GENERATION, 0, len(items), 0)
+	item_headers = b''
+	data = b''
+
+	# the item data is stored from the end of the node towards the headers
+	for (objectid, key_type, offset), item_data in items:
+		data = item_data + data
+		item_headers += struct.pack('<QBQII', objectid, key_type, offset, NODESIZE - len(header) - len(data), len(item_data))
+
+	return (header + item_headers).ljust(NODESIZE - len(data), b'\0') + data
+
+
+def _root_item(bytenr: int) -> bytes:
+	return bytes(176) + struct.pack('<Q', bytenr) + bytes(256)
+
+
+def _root_ref(dirid: int, name: str) -> bytes:
+	return struct.pack('<QQH', dirid, 0, len(name)) + name.encode()
+
+
+def _inode_ref(name: str) -> bytes:
+	return struct.pack('<QH', 0, len(name)) + name.encode()
+
+
+def _superblock() -> bytes:
+	sys_chunk_array = struct.pack('<QBQ', 256, 228, SYSTEM_LOGICAL) + _chunk(SYSTEM_PHYSICAL, 2)
+	fields = struct.pack(
+		'<32s16sQQ8sQQQQQQQQQIIIIIQQQQHBBB',
+		bytes(32),
+		FSID.bytes,
+		0x10000,
+		0,
+		b'_BHRfS_M',
+		GENERATION,
+		ROOT_TREE,
+		CHUNK_ROOT,
+		0,
+		0,
+		1 << 30,
+		1 << 20,
+		6,
+		1,
+		4096,
+		NODESIZE,
+		NODESIZE,
+		4096,
+		len(sys_chunk_array),
+		GENERATION,
+		0,
+		0,
+		0,
+		0,
+		0,
+		0,
+		0,
+	)
+	superblock = bytearray(fields.ljust(4096, b'\0'))
+	# the device id of the dev item
+	superblock[0xC9 : 0xC9 + 8] = struct.pack('<Q', 1)
+	superblock[0x32B : 0x32B + len(sys_chunk_array)] = sys_chunk_array
+
+	return bytes(superblock)
+
+
+@pytest.fixture
+def btrfs_image(tmp_path: Path) -> Path:
+	"""
+	A single device filesystem with the subvolumes @, @/home
+	and 1 in the directory snapshots/ of the top level subvolume
+	"""
+	chunk_tree = _leaf(
+		CHUNK_ROOT,
+		[
+			((256, 228, SYSTEM_LOGICAL), _chunk(SYSTEM_PHYSICAL, 2)),
+			((256, 228, METADATA_LOGICAL), _chunk(METADATA_PHYSICAL, 4)),
+		],
+	)
+	root_tree = _leaf(
+		ROOT_TREE,
+		[
+			((5, 132, 0), _root_item(FS_TREE)),
+			((256, 132, 0), _root_item(SUBVOL_TREE)),
+			((256, 144, 5), _root_ref(256, '@')),
+			((257, 132, 0), _root_item(SUBVOL_TREE)),
+			((257, 144, 5), _root_ref(258, '1')),
+			((258, 144, 256), _root_ref(256, 'home')),
+		],
+	)
+	# the directory snapshots/ in the top level subvolume
+	fs_tree = _leaf(FS_TREE, [((258, 12, 256), _inode_ref('snapshots'))])
+
+	image = bytearray(0x80000)
+	image[0x10000 : 0x10000 + 4096] = _superblock()
+	image[SYSTEM_PHYSICAL : SYSTEM_PHYSICAL + NODESIZE] = chunk_tree
+	image[METADATA_PHYSICAL : METADATA_PHYSICAL + NODESIZE] = root_tree
+	image[METADATA_PHYSICAL + NODESIZE : METADATA_PHYSICAL + 2 * NODESIZE] = fs_tree
+
+	path = tmp_path / 'btrfs.img'
+	path.write_bytes(bytes(image))
+
+	return path
+
+
+def test_read_superblock(btrfs_image: Path) -> None:
+	superblock = read_superblock(btrfs_image)
+
+	assert superblock.fsid == FSID
+	assert superblock.metadata_uuid == FSID
+	assert superblock.generation == GENERATION
+	assert (superblock.root, superblock.chunk_root) == (ROOT_TREE, CHUNK_ROOT)
+	assert (superblock.nodesize, superblock.num_devices, superblock.devid) == (NODESIZE, 1, 1)
+
+
+def test_logical_to_physical(btrfs_image: Path) -> None:
+	with btrfs_image.open('rb') as fp:
+		reader = btrfs._BtrfsDeviceReader(fp.fileno(), read_superblock(btrfs_image))
+
+		# the system chunk from the superblock and the metadata chunk from the chunk tree
+		assert reader._physical(SYSTEM_LOGICAL) == SYSTEM_PHYSICAL
+		assert reader._physical(METADATA_LOGICAL + 0x1234) == METADATA_PHYSICAL + 0x1234
+		assert reader._physical(METADATA_LOGICAL + CHUNK_LENGTH - 1) == METADATA_PHYSICAL + CHUNK_LENGTH - 1
+
+		for logical in (0, SYSTEM_LOGICAL - 1, METADATA_LOGICAL + CHUNK_LENGTH):
+			with pytest.raises(DiskError):
+				reader._physical(logical)
+
+
+def test_device_subvolumes(btrfs_image: Path) -> None:
+	assert list_subvolumes(btrfs_image) == [
+		BtrfsSubvolume(256, 5, Path('@')),
+		BtrfsSubvolume(257, 5, Path('snapshots/1')),
+		BtrfsSubvolume(258, 256, Path('@/home')),
+	]
+
+
+def test_no_superblock(tmp_path: Path) -> None:
+	path = tmp_path / 'empty.img'
+	path.write_bytes(bytes(0x20000))
+
+	with pytest.raises(DiskError):
+		list_subvolumes(path)
+
+
+def test_subvolume_paths() -> None:
+	backrefs = {
+		256: (5, 256, '@'),
+		257: (256, 300, 'nested'),
+		# the parent doesn't exist
+		258: (1000, 256, 'orphan'),
+		# a loop between the references
+		259: (260, 256, 'a'),
+		260: (259, 256, 'b'),
+	}
+	dirs = {(256, 300): 'var/lib/'}
+
+	assert _subvolume_paths(backrefs, lambda tree, dirid: dirs.get((tree, dirid), '')) == [
+		BtrfsSubvolume(256, 5, Path('@')),
+		BtrfsSubvolume(257, 256, Path('@/var/lib/nested')),
+	]
+
+
+def test_mounted_subvolumes_are_not_cached(btrfs_image: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+	listings = [[BtrfsSubvolume(256, 5, Path('@'))], [BtrfsSubvolume(256, 5, Path('@')), BtrfsSubvolume(257, 5, Path('@home'))]]
+	monkeypatch.setattr(btrfs, '_mounted_subvolumes', lambda mountpoint: listings.pop(0))
+
+	# the superblock on the device is the same, but the kernel sees a new subvolume
+	assert len(list_subvolumes(btrfs_image, Path('/mnt'))) == 1
+	assert len(list_subvolumes(btrfs_image, Path('/mnt'))) == 2
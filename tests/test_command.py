@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from archinstall.lib.command import AsyncSysCommand, TraceLog, run_probes
+from archinstall.lib.exceptions import SysCallError
+
+chunks = st.lists(st.binary(max_size=64), max_size=30)
+
+
+@given(chunks=chunks)
+def test_trace_log_matches_concatenation(chunks: list[bytes]) -> None:
+	# a tiny window forces most of the output to be spilled to disk
+	log = TraceLog(window=16)
+	expected = b''.join(chunks)
+
+	for chunk in chunks:
+		log.append(chunk)
+
+	assert len(log) == len(expected)
+	assert bytes(log) == expected
+	assert log[3:40] == expected[3:40]
+	assert log.last_newline() == expected.rfind(b'\n')
+	assert log.line_count() == expected.count(b'\n')
+
+
+@given(chunks=chunks, key=st.binary(min_size=1, max_size=4), start=st.integers(min_value=0, max_value=100))
+def test_trace_log_find(chunks: list[bytes], key: bytes, start: int) -> None:
+	log = TraceLog(window=16)
+	expected = b''.join(chunks)
+
+	for chunk in chunks:
+		log.append(chunk)
+
+	assert log.find(key, start) == expected.find(key, start)
+
+
+def test_async_sys_command_output() -> None:
+	command = asyncio.run(AsyncSysCommand(['/bin/sh', '-c', 'echo first; printf second']).run())
+
+	assert command.exit_code == 0
+	assert list(command) == [b'first\n', b'second\n']
+
+
+def test_async_sys_command_timeout() -> None:
+	with pytest.raises(SysCallError):
+		asyncio.run(AsyncSysCommand(['/bin/sh', '-c', 'sleep 10'], timeout=0.1).run())
+
+
+def test_async_sys_command_controlling_tty() -> None:
+	# the pty is the controlling terminal, e.g. for prompts which open /dev/tty
+	script = 'test -t 0 && echo stdin; echo tty > /dev/tty'
+	command = asyncio.run(AsyncSysCommand(['/bin/sh', '-c', script]).run())
+
+	assert command.exit_code == 0
+	assert list(command) == [b'stdin\n', b'tty\n']
+
+
+def test_run_probes() -> None:
+	probes = run_probes([AsyncSysCommand(['/bin/sh', '-c', 'sleep 0.1; echo first']), AsyncSysCommand(['/bin/false']), AsyncSysCommand(['/bin/echo', 'third'])])
+
+	# in the order of the commands, a failed probe as its error
+	assert isinstance(probes[0], AsyncSysCommand) and list(probes[0]) == [b'first\n']
+	assert isinstance(probes[1], SysCallError)
+	assert isinstance(probes[2], AsyncSysCommand) and list(probes[2]) == [b'third\n']
@@ -0,0 +1,77 @@
+import io
+import os
+import tarfile
+from pathlib import Path
+
+from archinstall.lib.models.packages import Repository
+from archinstall.lib.packages.index_cache import INDEX_CACHE_NAME, load_cached_index, load_index
+from archinstall.lib.packages.package_index import PackageIndex
+
+REPOSITORIES = [Repository.Core, Repository.Extra]
+
+
+def _write_database(path: Path, packages: dict[str, str]) -> None:
+	# uncompressed, the size of the tarball only changes with the number of blocks
+	with tarfile.open(path, 'w') as tar:
+		for name, version in packages.items():
+			data = f'%NAME%\n{name}\n\n%VERSION%\n{version}\n\n%DESC%\nThe {name} package\n\n%ARCH%\nx86_64\n\n'.encode()
+			info = tarfile.TarInfo(f'{name}-{version}/desc')
+			info.size = len(data)
+			tar.addfile(info, io.BytesIO(data))
+
+
+def _versions(index: PackageIndex) -> dict[str, str]:
+	return dict(zip(index.names, index.columns['VERSION']))
+
+
+def test_round_trip(tmp_path: Path) -> None:
+	_write_database(tmp_path / 'core.db', {'linux': '6.17.1-1', 'base': '3-2'})
+	_write_database(tmp_path / 'extra.db', {'Zsh': '5.9-5', 'firefox': '143.0-1', 'linux': '6.18-1'})
+
+	index = load_index(REPOSITORIES, tmp_path)
+	assert (tmp_path / INDEX_CACHE_NAME).exists()
+
+	cached = load_cached_index(REPOSITORIES, tmp_path)
+	assert cached is not None
+
+	assert cached.repositories == index.repositories == ['core', 'core', 'extra', 'extra']
+	assert cached.columns == index.columns
+	assert cached.sorted_numbers == index.sorted_numbers
+	assert cached.search('package') == index.search('package') == ['linux', 'base', 'Zsh', 'firefox']
+	assert cached.prefix_search('z') == ['Zsh']
+
+	# a cache of other repositories isn't used
+	assert load_cached_index([Repository.Core], tmp_path) is None
+
+
+def test_changed_database(tmp_path: Path) -> None:
+	core = tmp_path / 'core.db'
+	_write_database(core, {'linux': '6.17.1-1'})
+	_write_database(tmp_path / 'extra.db', {'firefox': '143.0-1'})
+
+	load_index(REPOSITORIES, tmp_path)
+	_write_database(core, {'linux': '6.17.1-1', 'base': '3-2'})
+
+	assert load_cached_index(REPOSITORIES, tmp_path) is None
+	assert _versions(load_index(REPOSITORIES, tmp_path)) == {'linux': '6.17.1-1', 'base': '3-2', 'firefox': '143.0-1'}
+
+	# the rebuilt index was cached again
+	cached = load_cached_index(REPOSITORIES, tmp_path)
+	assert cached is not None
+	assert _versions(cached) == {'linux': '6.17.1-1', 'base': '3-2', 'firefox': '143.0-1'}
+
+
+def test_changed_content(tmp_path: Path) -> None:
+	core = tmp_path / 'core.db'
+	_write_database(core, {'linux': '6.17.1-1'})
+	_write_database(tmp_path / 'extra.db', {'firefox': '143.0-1'})
+	load_index(REPOSITORIES, tmp_path)
+
+	# the same size and modification time, only the hash of the content differs
+	stat = core.stat()
+	_write_database(core, {'linux': '6.17.2-1'})
+	os.utime(core, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+	assert core.stat().st_size == stat.st_size
+
+	assert load_cached_index(REPOSITORIES, tmp_path) is None
+	assert _versions(load_index(REPOSITORIES, tmp_path))['linux'] == '6.17.2-1'
@@ -0,0 +1,102 @@
+import json
+import time
+from email.message import Message
+from pathlib import Path
+
+import pytest
+
+from archinstall.lib.mirror.mirror_cache import MirrorBenchmark, MirrorCache
+
+STATUS_URL = 'https://archlinux.org/mirrors/status/json/'
+LAST_MODIFIED = 'Sat, 17 Oct 2026 12:00:00 GMT'
+
+
+class _FakeServer:
+	"""
+	Replaces fetch_modified_data, answering with the next of the given responses
+	"""
+
+	def __init__(self, monkeypatch: pytest.MonkeyPatch) -> None:
+		self.requests: list[tuple[str, str | None, str | None]] = []
+		self.responses: list[tuple[str | None, dict[str, str]]] = []
+		monkeypatch.setattr('archinstall.lib.mirror.mirror_cache.fetch_modified_data', self.fetch)
+
+	def fetch(self, url: str, etag: str | None = None, last_modified: str | None = None) -> tuple[str | None, Message]:
+		self.requests.append((url, etag, last_modified))
+		data, values = self.responses.pop(0)
+		headers = Message()
+
+		for name, value in values.items():
+			headers[name] = value
+
+		return data, headers
+
+
+def test_fetch_status(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+	server = _FakeServer(monkeypatch)
+	server.responses.append(('{"version": 3}', {'ETag': '"v1"', 'Last-Modified': LAST_MODIFIED}))
+
+	assert MirrorCache(tmp_path).fetch_status(STATUS_URL) == '{"version": 3}'
+	assert server.requests == [(STATUS_URL, None, None)]
+
+	# within the TTL the server isn't asked
+	assert MirrorCache(tmp_path).fetch_status(STATUS_URL) == '{"version": 3}'
+	assert len(server.requests) == 1
+
+
+def test_fetch_status_expired(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+	server = _FakeServer(monkeypatch)
+	server.responses += [
+		('{"version": 3}', {'ETag': '"v1"', 'Last-Modified': LAST_MODIFIED}),
+		# not modified
+		(None, {}),
+		('{"version": 3, "urls": []}', {'ETag': '"v2"'}),
+	]
+	expired = MirrorCache(tmp_path, ttl=-1)
+
+	expired.fetch_status(STATUS_URL)
+	assert expired.load_status() is None
+	assert expired.load_status(offline=True) == '{"version": 3}'
+
+	# the expired status is revalidated with its ETag and Last-Modified date
+	assert expired.fetch_status(STATUS_URL) == '{"version": 3}'
+	assert server.requests[1] == (STATUS_URL, '"v1"', LAST_MODIFIED)
+
+	assert expired.fetch_status(STATUS_URL) == '{"version": 3, "urls": []}'
+	assert server.requests[2] == (STATUS_URL, '"v1"', LAST_MODIFIED)
+	assert MirrorCache(tmp_path).load_status() == '{"version": 3, "urls": []}'
+
+	meta = json.loads((tmp_path / 'status.meta.json').read_text())
+	assert (meta['etag'], meta['last_modified']) == ('"v2"', LAST_MODIFIED)
+
+
+def test_fetch_status_without_cached_status(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+	server = _FakeServer(monkeypatch)
+	server.responses += [('{"version": 3}', {'ETag': '"v1"'}), ('{"version": 3}', {'ETag': '"v1"'})]
+	cache = MirrorCache(tmp_path, ttl=-1)
+
+	cache.fetch_status(STATUS_URL)
+	(tmp_path / 'status.json').unlink()
+
+	# a not modified response couldn't be answered without the status
+	cache.fetch_status(STATUS_URL)
+	assert server.requests[1] == (STATUS_URL, None, None)
+
+
+def test_benchmarks(tmp_path: Path) -> None:
+	now = time.time()
+	cache = MirrorCache(tmp_path, ttl=60)
+	cache._identity = 'home'
+
+	cache.store_benchmarks({'https://a.example.org/': MirrorBenchmark(0.1, 1000, now - 120)})
+	cache.store_benchmarks({'https://b.example.org/': MirrorBenchmark(0.2, 2000, now)})
+
+	assert cache.load_benchmarks() == {'https://b.example.org/': MirrorBenchmark(0.2, 2000, now)}
+	assert len(cache.load_benchmarks(offline=True)) == 2
+
+	# another network doesn't see the measurements, unless it's offline
+	other = MirrorCache(tmp_path, ttl=60)
+	other._identity = 'office'
+
+	assert other.load_benchmarks() == {}
+	assert len(other.load_benchmarks(offline=True)) == 2
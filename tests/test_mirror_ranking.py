@@ -0,0 +1,182 @@
+import math
+from collections import Counter
+
+import pytest
+
+from archinstall.lib.mirror.mirror_cache import MirrorBenchmark
+from archinstall.lib.mirror.mirror_ranking import MirrorProbe, MirrorRanker
+from archinstall.lib.models.mirrors import MirrorStatusEntryV3
+
+# the download the costs are based on
+REFERENCE_SIZE = 2 * 1024 * 1024
+
+
+def _mirror(name: str, score: float | None = None, duration: float | None = None) -> MirrorStatusEntryV3:
+	return MirrorStatusEntryV3(
+		url=f'https://{name}.example.org/',
+		protocol='https',
+		active=True,
+		country='Sweden',
+		country_code='SE',
+		isos=True,
+		ipv4=True,
+		ipv6=False,
+		details='',
+		score=score,
+		duration_avg=duration,
+	)
+
+
+def _probe(name: str, costs: list[float], latency: float = 0) -> MirrorProbe:
+	# every sample costs exactly the given seconds
+	probe = MirrorProbe(_mirror(name))
+
+	for cost in costs:
+		probe.latencies.append(latency)
+		probe.throughputs.append(REFERENCE_SIZE / (cost - latency))
+
+	return probe
+
+
+def test_cost() -> None:
+	probe = MirrorProbe(_mirror('a', score=2, duration=0.4), latencies=[0.1], throughputs=[REFERENCE_SIZE])
+
+	# (latency + transfer + weighted check duration) * (1 + weighted score)
+	assert probe.cost == pytest.approx((0.1 + 1 + 0.5 * 0.4) * (1 + 0.1 * 2))
+	# a single sample has a fixed relative error
+	assert probe.error == pytest.approx(probe.cost * 0.5)
+	assert (probe.latency, probe.speed) == (0.1, REFERENCE_SIZE)
+
+
+def test_cost_samples() -> None:
+	probe = _probe('a', [1.0, 1.4], latency=0.2)
+
+	assert probe.cost == pytest.approx(1.2)
+	# the standard error of the mean
+	assert probe.error == pytest.approx(0.2)
+	assert probe.latency == pytest.approx(0.2)
+
+
+def test_failed() -> None:
+	probe = MirrorProbe(_mirror('a'))
+
+	assert probe.failed
+	assert probe.cost == math.inf
+	assert (probe.latency, probe.speed) == (0, 0)
+
+
+def test_from_benchmark() -> None:
+	probe = MirrorProbe.from_benchmark(_mirror('a'), MirrorBenchmark(latency=0.5, speed=REFERENCE_SIZE, measured_at=0))
+	assert probe.cost == pytest.approx(1.5)
+	assert not probe.probed
+
+	# the mirror couldn't be reached when it was measured
+	assert MirrorProbe.from_benchmark(_mirror('a'), MirrorBenchmark(latency=0, speed=0, measured_at=0)).failed
+	assert MirrorProbe.from_benchmark(_mirror('a'), None).failed
+
+
+def test_undecided_separated() -> None:
+	ranked = [_probe('a', [1.0, 1.0]), _probe('b', [1.1, 1.1]), _probe('c', [3.0, 3.0]), _probe('d', [4.0, 4.0]), MirrorProbe(_mirror('e'))]
+
+	assert MirrorRanker(top_n=2)._undecided(ranked) == []
+	# nothing to separate from
+	assert MirrorRanker(top_n=5)._undecided(ranked) == []
+
+
+def test_undecided_overlapping() -> None:
+	a = _probe('a', [1.0, 1.0])
+	# 2.2 +- 0.4
+	b = _probe('b', [2.0, 2.4])
+	# 2.6 +- 0.4
+	c = _probe('c', [2.4, 2.8])
+	d = _probe('d', [5.0, 5.0])
+
+	assert MirrorRanker(top_n=2)._undecided([a, b, c, d, MirrorProbe(_mirror('e'))]) == [b, c]
+
+
+class _FakeRanker(MirrorRanker):
+	"""
+	Measures every mirror with the next of its hand-made costs instead of the network
+	"""
+
+	def __init__(self, costs: dict[str, list[float]], **kwargs: int) -> None:
+		super().__init__(**kwargs)
+		self.costs = costs
+		self.probed: Counter[str] = Counter()
+
+	def _measure(self, probe: MirrorProbe) -> None:
+		name = probe.mirror.url.removeprefix('https://').removesuffix('.example.org/')
+		probe.probed = True
+		self.probed[name] += 1
+
+		if costs := self.costs.get(name):
+			probe.latencies.append(0)
+			probe.throughputs.append(REFERENCE_SIZE / costs.pop(0))
+
+
+def _names(mirrors: list[MirrorStatusEntryV3]) -> list[str]:
+	return [mirror.url.removeprefix('https://').removesuffix('.example.org/') for mirror in mirrors]
+
+
+def test_rank() -> None:
+	ranker = _FakeRanker({'a': [3.0], 'b': [1.0], 'c': [2.0]}, top_n=2, max_rounds=1)
+	mirrors = [_mirror('a'), _mirror('b'), _mirror('c'), _mirror('unreachable')]
+
+	ranked = ranker.rank(mirrors)
+
+	assert _names(ranked) == ['b', 'c', 'a', 'unreachable']
+	assert ranker.probed == {'a': 1, 'b': 1, 'c': 1, 'unreachable': 1}
+	assert ranked[0]._speed == pytest.approx(REFERENCE_SIZE)
+	assert ranked[0]._latency == 0
+	assert (ranked[-1]._speed, ranked[-1]._latency) == (0, None)
+
+
+def test_rank_rounds() -> None:
+	# a single sample has a wide confidence interval, all mirrors are probed again
+	ranker = _FakeRanker({'a': [1.0, 1.0], 'b': [1.2, 5.0], 'c': [10.0, 10.0]}, top_n=1, max_rounds=2)
+
+	ranked = ranker.rank([_mirror('a'), _mirror('b'), _mirror('c'), _mirror('unreachable')])
+
+	assert ranker.probed == {'a': 2, 'b': 2, 'c': 2, 'unreachable': 1}
+	assert _names(ranked) == ['a', 'b', 'c', 'unreachable']
+
+
+def test_rank_known() -> None:
+	known = {
+		_mirror('a').url: MirrorBenchmark(latency=0, speed=REFERENCE_SIZE / 0.5, measured_at=0),
+		_mirror('b').url: MirrorBenchmark(latency=0.1, speed=REFERENCE_SIZE / 4, measured_at=0),
+	}
+	ranker = _FakeRanker({'c': [2.0]}, top_n=1, max_rounds=1)
+
+	ranked = ranker.rank([_mirror('b'), _mirror('c'), _mirror('a')], known)
+
+	# only the unknown mirror is probed
+	assert ranker.probed == {'c': 1}
+	assert _names(ranked) == ['a', 'c', 'b']
+	assert list(ranker.measured) == [_mirror('c').url]
+	assert ranked[0]._speed == REFERENCE_SIZE / 0.5
+
+
+def test_rank_without_measuring() -> None:
+	known = {_mirror('b').url: MirrorBenchmark(latency=0, speed=REFERENCE_SIZE, measured_at=0)}
+	ranker = _FakeRanker({}, top_n=1)
+
+	ranked = ranker.rank([_mirror('a'), _mirror('b')], known, measure=False)
+
+	# the unknown mirrors come last
+	assert _names(ranked) == ['b', 'a']
+	assert not ranker.probed
+	assert ranker.measured == {}
+
+
+def test_rank_failures() -> None:
+	# the mirror couldn't be reached in an earlier run
+	known = {_mirror('b').url: MirrorBenchmark(latency=0, speed=0, measured_at=0)}
+	ranker = _FakeRanker({'b': [1.0]}, top_n=1, max_rounds=1)
+
+	ranked = ranker.rank([_mirror('a'), _mirror('b')], known)
+
+	# the failure is probed again, the mirror which failed now isn't stored
+	assert ranker.probed == {'a': 1, 'b': 1}
+	assert _names(ranked) == ['b', 'a']
+	assert list(ranker.measured) == [_mirror('b').url]
@@ -0,0 +1,157 @@
+import io
+import tarfile
+import time
+from pathlib import Path
+
+import pytest
+
+from archinstall.lib.models.packages import AvailablePackage, PackageGroup, Repository
+from archinstall.lib.packages.package_index import PackageIndex, _parse_desc, _tar_members
+
+LINUX = {
+	'FILENAME': 'linux-6.17.1.arch1-1-x86_64.pkg.tar.zst',
+	'NAME': 'linux',
+	'BASE': 'linux',
+	'VERSION': '6.17.1.arch1-1',
+	'DESC': 'The Linux kernel and modules',
+	'CSIZE': '1572864',
+	'ISIZE': '137438953',
+	'SHA256SUM': '9a2a4f0e1b1d6c5d0f3e7b8a1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d',
+	'PGPSIG': 'iQIzBAABCgAdFiEE',
+	'URL': 'https://github.com/archlinux/linux',
+	'LICENSE': 'GPL-2.0-only',
+	'ARCH': 'x86_64',
+	'BUILDDATE': '1760000000',
+	'PACKAGER': 'Jan Alexander Steffens (heftig) <heftig@archlinux.org>',
+	'DEPENDS': 'coreutils\nkmod\ninitramfs',
+	'OPTDEPENDS': 'wireless-regdb: to set the correct wireless channels of your country\nlinux-firmware: firmware images needed for some devices',
+}
+XFCE4_PANEL = {
+	'NAME': 'xfce4-panel',
+	'VERSION': '4.20.4-1',
+	'DESC': 'Panel for the Xfce desktop environment',
+	'GROUPS': 'xfce4',
+	'ARCH': 'x86_64',
+}
+THUNAR = {
+	'NAME': 'thunar',
+	'VERSION': '4.20.5-1',
+	'DESC': 'Modern, fast and easy-to-use file manager for Xfce',
+	'GROUPS': 'xfce4\nxfce4-goodies',
+	'ARCH': 'x86_64',
+}
+
+
+def _desc(fields: dict[str, str]) -> bytes:
+	return ''.join(f'%{field}%\n{value}\n\n' for field, value in fields.items()).encode()
+
+
+def _tarball(members: dict[str, bytes], tar_format: int = tarfile.GNU_FORMAT) -> bytes:
+	buffer = io.BytesIO()
+
+	with tarfile.open(fileobj=buffer, mode='w', format=tar_format) as tar:
+		for name, data in members.items():
+			directory = tarfile.TarInfo(name.rpartition('/')[0])
+			directory.type = tarfile.DIRTYPE
+			tar.addfile(directory)
+
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			tar.addfile(info, io.BytesIO(data))
+
+	return buffer.getvalue()
+
+
+def _write_database(path: Path, packages: list[dict[str, str]]) -> None:
+	members = {f'{fields["NAME"]}-{fields["VERSION"]}/desc': _desc(fields) for fields in packages}
+
+	with tarfile.open(path, 'w:gz') as tar:
+		for name, data in members.items():
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> PackageIndex:
+	_write_database(tmp_path / 'core.db', [LINUX])
+	# the package of the first repository wins
+	_write_database(tmp_path / 'extra.db', [XFCE4_PANEL, THUNAR, LINUX | {'VERSION': '6.17.2.arch1-1'}])
+
+	# the multilib database doesn't exist
+	return PackageIndex.load([Repository.Core, Repository.Extra, Repository.Multilib], tmp_path)
+
+
+@pytest.mark.parametrize('tar_format', [tarfile.GNU_FORMAT, tarfile.PAX_FORMAT, tarfile.USTAR_FORMAT])
+def test_tar_members(tar_format: int) -> None:
+	# longer than the 100 bytes of the name field, a GNU long name, a pax header or a ustar prefix
+	long_name = f'{"python-" * 15}1.0-1/desc'
+	members = {'linux-6.17.1.arch1-1/desc': b'%NAME%\nlinux\n', long_name: b'', 'a-1-1/files': bytes(1000)}
+
+	assert list(_tar_members(io.BytesIO(_tarball(members, tar_format)))) == list(members.items())
+
+
+def test_parse_desc() -> None:
+	fields = _parse_desc(_desc(LINUX).decode())
+
+	assert fields['NAME'] == 'linux'
+	assert fields['DEPENDS'] == 'coreutils\nkmod\ninitramfs'
+	assert fields['VALIDATION'] == 'SHA-256 Sum\nSignature'
+	assert _parse_desc(_desc(XFCE4_PANEL).decode())['VALIDATION'] == ''
+
+
+def test_package(index: PackageIndex) -> None:
+	entry = index.entry('linux')
+
+	assert entry is not None
+	# the same as the fields of `pacman -S --info`
+	assert entry.package == AvailablePackage(
+		name='linux',
+		architecture='x86_64',
+		build_date=time.strftime('%c', time.localtime(1760000000)),
+		depends_on='coreutils  kmod  initramfs',
+		description='The Linux kernel and modules',
+		download_size='1.50 MiB',
+		groups='None',
+		installed_size='131.07 MiB',
+		licenses='GPL-2.0-only',
+		optional_deps='wireless-regdb: to set the correct wireless channels of your country  linux-firmware: firmware images needed for some devices',
+		packager='Jan Alexander Steffens (heftig) <heftig@archlinux.org>',
+		provides='None',
+		replaces='None',
+		repository='core',
+		url='https://github.com/archlinux/linux',
+		validated_by='SHA-256 Sum  Signature',
+		version='6.17.1.arch1-1',
+	)
+
+
+def test_load(index: PackageIndex) -> None:
+	assert index.names == ['linux', 'xfce4-panel', 'thunar']
+	assert index.repositories == ['core', 'extra', 'extra']
+	assert 'thunar' in index
+	assert 'linux-lts' not in index
+	assert index.entry('linux-lts') is None
+
+
+def test_package_groups(index: PackageIndex) -> None:
+	assert index.package_groups() == {
+		'xfce4': PackageGroup('xfce4', ['xfce4-panel', 'thunar']),
+		'xfce4-goodies': PackageGroup('xfce4-goodies', ['thunar']),
+	}
+
+
+def test_prefix_search(index: PackageIndex) -> None:
+	assert index.prefix_search('XFCE') == ['xfce4-panel']
+	assert index.prefix_search('t') == ['thunar']
+	assert index.prefix_search('z') == []
+
+
+def test_search(index: PackageIndex) -> None:
+	# names starting with the pattern first, then the other matches in the order of the index
+	assert index.search('xfce') == ['xfce4-panel', 'thunar']
+	assert index.search('KERNEL') == ['linux']
+	assert index.search('') == ['linux', 'xfce4-panel', 'thunar']
+	# neither across the name and the description nor across packages
+	assert index.search('linux the') == []
+	assert index.search('modules xfce') == []
@@ -0,0 +1,141 @@
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from archinstall.lib.disk.partition_planner import PartitionPlan, PlannedPartition, plan_partitions
+from archinstall.lib.exceptions import DiskError
+from archinstall.lib.models.device import (
+	BDevice,
+	DeviceModification,
+	FilesystemType,
+	ModificationStatus,
+	PartitionFlag,
+	PartitionGUID,
+	PartitionModification,
+	PartitionTable,
+	PartitionType,
+	SectorSize,
+	Size,
+	Unit,
+	_DeviceInfo,
+)
+
+SECTOR_SIZE = SectorSize(512, Unit.B)
+# 1 GiB
+TOTAL_SECTORS = 2097152
+
+
+def _plan(table: PartitionTable, partitions: list[PlannedPartition]) -> PartitionPlan:
+	return PartitionPlan(
+		dev_path=Path('/dev/nvme0n1'),
+		table=table,
+		sector_size=SECTOR_SIZE.normalize(),
+		total_sectors=TOTAL_SECTORS,
+		partitions=partitions,
+	)
+
+
+def test_script() -> None:
+	plan = _plan(
+		PartitionTable.GPT,
+		[
+			PlannedPartition(2, 526336, 1570816, PartitionGUID.LINUX_ROOT_X86_64.value, name='root "fs"'),
+			PlannedPartition(1, 2048, 524288, PartitionGUID.EFI_SYSTEM.value, uuid='0b1c7d8e-4a4b-4c1a-9d33-3e6a5f6b7c8d'),
+		],
+	)
+	plan.label_id = '5E1B8D3C-0C39-4F0C-9B8B-6B0F4E0A0F2A'
+
+	assert plan.script() == (
+		'label: gpt\n'
+		'label-id: 5E1B8D3C-0C39-4F0C-9B8B-6B0F4E0A0F2A\n'
+		'unit: sectors\n'
+		'\n'
+		f'/dev/nvme0n1p1 : start=2048, size=524288, type={PartitionGUID.EFI_SYSTEM.value}, uuid=0b1c7d8e-4a4b-4c1a-9d33-3e6a5f6b7c8d\n'
+		f'/dev/nvme0n1p2 : start=526336, size=1570816, type={PartitionGUID.LINUX_ROOT_X86_64.value}, name="root \\"fs\\""\n'
+	)
+
+
+def test_script_mbr() -> None:
+	plan = _plan(PartitionTable.MBR, [PlannedPartition(1, 2048, 2048, 'ef', bootable=True)])
+	plan.dev_path = Path('/dev/sda')
+
+	assert plan.script() == 'label: dos\nunit: sectors\n\n/dev/sda1 : start=2048, size=2048, type=ef, bootable\n'
+
+
+def test_validate() -> None:
+	# the last usable sector of GPT is followed by the backup entries and header
+	last_usable = TOTAL_SECTORS - 34
+	plan = _plan(
+		PartitionTable.GPT,
+		[
+			PlannedPartition(1, 34, 2014, PartitionGUID.LINUX_FILESYSTEM.value),
+			PlannedPartition(2, 2048, last_usable - 2047, PartitionGUID.LINUX_FILESYSTEM.value),
+		],
+	)
+
+	plan.validate()
+
+
+@pytest.mark.parametrize(
+	('table', 'partitions'),
+	[
+		# before the GPT partition entries end
+		(PartitionTable.GPT, [PlannedPartition(1, 33, 2048, 'L')]),
+		# into the backup GPT
+		(PartitionTable.GPT, [PlannedPartition(1, 2048, TOTAL_SECTORS - 2048 - 32, 'L')]),
+		(PartitionTable.GPT, [PlannedPartition(1, 2048, 0, 'L')]),
+		(PartitionTable.GPT, [PlannedPartition(1, 2048, 2048, 'L'), PlannedPartition(2, 4095, 2048, 'L')]),
+		(PartitionTable.GPT, [PlannedPartition(1, 2048, 2048, 'L'), PlannedPartition(1, 4096, 2048, 'L')]),
+		(PartitionTable.MBR, [PlannedPartition(nr, nr * 2048, 2048, '83') for nr in range(1, 6)]),
+	],
+)
+def test_validate_invalid(table: PartitionTable, partitions: list[PlannedPartition]) -> None:
+	with pytest.raises(DiskError):
+		_plan(table, partitions).validate()
+
+
+def _size(sectors: int) -> Size:
+	return Size(sectors * SECTOR_SIZE.normalize(), Unit.B, SECTOR_SIZE)
+
+
+def test_plan_partitions_alignment() -> None:
+	device_info = _DeviceInfo(
+		model='',
+		path=Path('/dev/sda'),
+		type='scsi',
+		total_size=_size(TOTAL_SECTORS),
+		free_space_regions=[],
+		sector_size=SECTOR_SIZE,
+		read_only=False,
+		dirty=False,
+	)
+	esp = PartitionModification(
+		status=ModificationStatus.CREATE,
+		type=PartitionType.PRIMARY,
+		start=_size(2048),
+		length=_size(524288),
+		fs_type=FilesystemType.FAT32,
+		flags=[PartitionFlag.BOOT, PartitionFlag.ESP],
+	)
+	# starts 5 sectors after the end of the ESP
+	root = PartitionModification(
+		status=ModificationStatus.CREATE,
+		type=PartitionType.PRIMARY,
+		start=_size(526341),
+		length=_size(1048576),
+		fs_type=FilesystemType.EXT4,
+	)
+	modification = DeviceModification(BDevice(Mock(), device_info, []), wipe=True, partitions=[esp, root])
+
+	plan = plan_partitions(modification, PartitionTable.GPT)
+
+	assert plan is not None
+	plan.validate()
+
+	assert [(part.number, part.start, part.end) for part in plan.partitions] == [
+		(1, 2048, 526336),
+		# aligned to 1 MiB, but it still ends where it was meant to
+		(2, 528384, 526341 + 1048576),
+	]
+	assert plan.partitions[0].type == PartitionGUID.EFI_SYSTEM.value